@@ -4,8 +4,8 @@ from contextlib import redirect_stdout
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 from tokens import TipoToken
-from lexer import Lexer
-from parser import Parser, ErroSintatico, ErroSemantico, ComandoLeitura, ComandoEscrita, ComandoAtribuicao
+from cache import CacheAnalise
+from parser import ErroSintatico, ErroSemantico, ComandoLeitura, ComandoEscrita, ComandoAtribuicao
 from interpreter import InterpretadorPiLang
 
 app = Flask(__name__)
@@ -14,6 +14,13 @@ CORS(app)
 # Armazena sessões de execução ativas
 sessoes_execucao = {}
 
+# Limite de erros léxicos por resposta; o excedente vira um resumo "... e mais N"
+MAX_ERROS_LEXICOS = 100
+
+# Resultados da análise por conteúdo da fonte, compartilhados entre os endpoints
+# e as sessões (ver cache.py): tokens e ASTs vindos dele não devem ser alterados
+cache_analise = CacheAnalise(max_bytes=64 * 1024 * 1024, max_entradas=256, max_erros=MAX_ERROS_LEXICOS)
+
 @app.route('/')
 def index():
     """Serve a página HTML principal"""
@@ -38,12 +45,11 @@ def tokenizar_codigo():
 
     try:
         # Análise Léxica
-        lexer = Lexer(codigo)
-        tokens, erros_lexicos = lexer.tokenizar()
+        tokens, erros_lexicos = cache_analise.lexico(codigo)
         
         if erros_lexicos:
             output = "=== ERROS LÉXICOS ===\n"
-            output += '\n'.join(erros_lexicos)
+            output += '\n'.join(map(str, erros_lexicos))
             output += "\n\n=== TOKENS ENCONTRADOS ATÉ O ERRO ===\n"
             for token in tokens:
                 output += str(token) + '\n'
@@ -72,17 +78,22 @@ def analise_sintatica_codigo():
 
     try:
         # 1. Análise Léxica (necessária para análise sintática)
-        lexer = Lexer(codigo)
-        tokens, erros_lexicos = lexer.tokenizar()
+        _, erros_lexicos = cache_analise.lexico(codigo)
         if erros_lexicos:
             output = "=== ERRO: Não é possível realizar análise sintática com erros léxicos ===\n\n"
             output += "Erros léxicos encontrados:\n"
-            output += '\n'.join(erros_lexicos)
+            output += '\n'.join(map(str, erros_lexicos))
             return jsonify({'status': 'erro', 'output': output})
 
         # 2. Análise Sintática
-        parser = Parser(tokens)
-        ast = parser.parse()
+        ast, erro = cache_analise.sintatico(codigo)
+        if isinstance(erro, ErroSintatico):
+            output = "=== ERRO DE SINTAXE ===\n\n"
+            output += f"Linha: {erro.linha}, Coluna: {erro.coluna}\n"
+            output += f"Mensagem: {erro.mensagem}\n"
+            return jsonify({'status': 'erro', 'output': output})
+        if isinstance(erro, ErroSemantico):
+            return jsonify({'status': 'erro', 'output': _saida_erro_semantico(erro)})
 
         # Formata informações da AST
         output = "=== ANÁLISE SINTÁTICA CONCLUÍDA ===\n\n"
@@ -108,20 +119,26 @@ def analise_sintatica_codigo():
         
         return jsonify({'status': 'sucesso', 'output': output})
 
-    except ErroSintatico as e:
-        output = "=== ERRO DE SINTAXE ===\n\n"
-        output += f"Linha: {e.linha}, Coluna: {e.coluna}\n"
-        output += f"Mensagem: {e.mensagem}\n"
-        return jsonify({'status': 'erro', 'output': output})
-    except ErroSemantico as e:
-        output = "=== ERRO SEMÂNTICO ===\n\n"
-        if e.linha is not None and e.coluna is not None:
-            output += f"Linha: {e.linha}, Coluna: {e.coluna}\n"
-        output += f"Mensagem: {e.mensagem}\n"
-        return jsonify({'status': 'erro', 'output': output})
     except Exception as e:
         return jsonify({'status': 'erro', 'output': f"Erro durante análise sintática:\n{str(e)}"})
 
+def _saida_erro_semantico(erro):
+    """Texto de um ErroSemantico para /analise_sintatica e /executar"""
+    output = "=== ERRO SEMÂNTICO ===\n\n"
+    if erro.linha is not None and erro.coluna is not None:
+        output += f"Linha: {erro.linha}, Coluna: {erro.coluna}\n"
+    output += f"Mensagem: {erro.mensagem}\n"
+    return output
+
+def _diagnostico(tipo, erro):
+    """Um erro de análise no formato JSON usado por /analisar"""
+    return {
+        'tipo': tipo,
+        'mensagem': getattr(erro, 'mensagem', str(erro)),
+        'linha': getattr(erro, 'linha', None),
+        'coluna': getattr(erro, 'coluna', None),
+    }
+
 @app.route('/analisar', methods=['POST'])
 def analisar_codigo():
     data = request.get_json()
@@ -132,36 +149,32 @@ def analisar_codigo():
 
     try:
         # 1. Análise Léxica
-        lexer = Lexer(codigo)
-        tokens, erros_lexicos = lexer.tokenizar()
+        _, erros_lexicos = cache_analise.lexico(codigo)
         if erros_lexicos:
-            # Se houver erros léxicos, retorna o primeiro deles
-            return jsonify({'status': 'erro', 'tipo': 'lexico', 'mensagem': erros_lexicos[0]})
+            # Campos do primeiro erro, como antes, e a lista completa em 'erros'
+            return jsonify({
+                'status': 'erro',
+                'tipo': 'lexico',
+                'mensagem': str(erros_lexicos[0]),
+                'erros': [{'tipo': 'lexico', 'mensagem': str(erro), 'linha': getattr(erro, 'linha', None),
+                           'coluna': getattr(erro, 'coluna', None)} for erro in erros_lexicos]
+            })
+
+        # 2. Análise Sintática, recuperando-se dos erros para reportar todos de uma vez
+        erros_analise, principal = cache_analise.recuperado(codigo)
+        if not erros_analise:
+            return jsonify({'status': 'sucesso', 'mensagem': 'Sintaxe válida!'})
+
+        erros = [_diagnostico('sintatico' if isinstance(erro, ErroSintatico) else 'semantico', erro)
+                 for erro in erros_analise]
+        # Os campos de antes descrevem o erro que a análise sem recuperação reportaria
+        resposta = _diagnostico('sintatico' if isinstance(principal, ErroSintatico) else 'semantico', principal)
+        if resposta['tipo'] == 'semantico':
+            resposta['linha'] = resposta['linha'] or None
+            resposta['coluna'] = resposta['coluna'] or None
+        resposta.update(status='erro', erros=erros)
+        return jsonify(resposta)
 
-        # 2. Análise Sintática
-        parser = Parser(tokens)
-        parser.parse() # Se houver erro, vai lançar ErroSintatico
-
-        return jsonify({'status': 'sucesso', 'mensagem': 'Sintaxe válida!'})
-
-    except ErroSintatico as e:
-        # Captura o erro sintático e o formata para o frontend
-        return jsonify({
-            'status': 'erro', 
-            'tipo': 'sintatico',
-            'mensagem': e.mensagem,
-            'linha': e.linha,
-            'coluna': e.coluna
-        })
-    except ErroSemantico as e:
-        # Captura o erro semântico e o formata para o frontend
-        return jsonify({
-            'status': 'erro',
-            'tipo': 'semantico',
-            'mensagem': e.mensagem,
-            'linha': e.linha if e.linha else None,
-            'coluna': e.coluna if e.coluna else None
-        })
     except Exception as e:
         # Captura qualquer outro erro inesperado
         return jsonify({'status': 'erro', 'tipo': 'desconhecido', 'mensagem': str(e)})
@@ -219,14 +232,17 @@ def executar_codigo():
 
     try:
         # 1. Análise Léxica
-        lexer = Lexer(codigo)
-        tokens, erros_lexicos = lexer.tokenizar()
+        _, erros_lexicos = cache_analise.lexico(codigo)
         if erros_lexicos:
-            return jsonify({'status': 'erro', 'output': '\n'.join(erros_lexicos)})
+            return jsonify({'status': 'erro', 'output': '\n'.join(map(str, erros_lexicos))})
 
-        # 2. Análise Sintática
-        parser = Parser(tokens)
-        ast = parser.parse()
+        # 2. Análise Sintática (a AST do cache é compartilhada: a sessão só a lê)
+        ast, erro = cache_analise.sintatico(codigo)
+        if isinstance(erro, ErroSintatico):
+            output = f"Erro de Sintaxe na linha {erro.linha}, coluna {erro.coluna}:\n{erro.mensagem}"
+            return jsonify({'status': 'erro', 'output': output})
+        if isinstance(erro, ErroSemantico):
+            return jsonify({'status': 'erro', 'output': _saida_erro_semantico(erro)})
 
         # 3. Execução (Interpretador Interativo)
         interpretador = InterpretadorInterativo()
@@ -236,7 +252,7 @@ def executar_codigo():
         sessoes_execucao[session_id] = {
             'interpretador': interpretador,
             'ast': ast,
-            'comandos_restantes': ast.comandos.copy(),
+            'comandos_restantes': list(ast.comandos),
             'indice_comando': 0
         }
         
@@ -257,18 +273,14 @@ def executar_codigo():
         dados['output'] = output_inicial + dados.get('output', '')
         return jsonify(dados)
 
-    except ErroSintatico as e:
-        output = f"Erro de Sintaxe na linha {e.linha}, coluna {e.coluna}:\n{e.mensagem}"
-        return jsonify({'status': 'erro', 'output': output})
-    except ErroSemantico as e:
-        output = "=== ERRO SEMÂNTICO ===\n\n"
-        if e.linha is not None and e.coluna is not None:
-            output += f"Linha: {e.linha}, Coluna: {e.coluna}\n"
-        output += f"Mensagem: {e.mensagem}\n"
-        return jsonify({'status': 'erro', 'output': output})
     except Exception as e:
         return jsonify({'status': 'erro', 'output': f"Erro de execução:\n{str(e)}"})
 
+@app.route('/estatisticas_cache', methods=['GET'])
+def estatisticas_cache():
+    """Entradas, bytes, acertos, falhas e descartes do cache da análise"""
+    return jsonify(cache_analise.estatisticas())
+
 @app.route('/continuar_execucao', methods=['POST'])
 def continuar_execucao():
     """Continua a execução de um programa que estava aguardando entrada."""
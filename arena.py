@@ -0,0 +1,407 @@
+"""AST em arena (struct-of-arrays) para programas muito grandes.
+
+Mesmo com a AST compacta, um script gerado com centenas de milhares de comandos
+vira milhões de objetos pequenos que o coletor de lixo precisa percorrer a cada
+coleta. No ProgramaArena os nós das expressões ficam em arranjos tipados
+paralelos — tipo, operador, filho esquerdo, filho direito, índice do valor e
+posição na fonte — e os comandos em outros quatro; constantes e nomes ficam em
+tabelas à parte, sem repetição. Um nó é só um índice: nenhum objeto é criado
+por nó nem por comando.
+
+NoArena e ComandoArena são vistas somente leitura sobre um índice, para quem
+precisa navegar na árvore; InterpretadorPiLang.executar_programa executa o
+ProgramaArena direto dos arranjos.
+"""
+
+from array import array
+from typing import Iterator, List, Union
+
+from parser import (Parser, Programa, Personagem, Expressao, NoCompacto, Binario, Literal, Nome,
+                    Comando, ComandoLeitura, ComandoEscrita, ComandoAtribuicao, ErroSintatico, ErroSemantico,
+                    _ErroComPosicao, _PRECEDENCIA, _PRECEDENCIA_POTENCIA, compactar_expressao)
+from tokens import TipoToken
+
+# Tipos de nó
+BINARIO, NOME, NUM_INTEIRO, NUM_REAL, STRING = range(5)
+_NOMES_TIPOS = ('BINARIO', 'IDENTIFICADOR', 'NUM_INTEIRO', 'NUM_REAL', 'STRING')
+_TIPO_LITERAL = {'NUM_INTEIRO': NUM_INTEIRO, 'NUM_REAL': NUM_REAL, 'STRING': STRING}
+
+# Tipos de comando
+LEIA, DIZ, ATRIBUICAO = range(3)
+_NOMES_COMANDOS = ('LEIA', 'DIZ', 'ATRIBUICAO')
+
+OPERADORES = ('', '+', '-', '*', '/', '^')  # Código do operador -> lexema
+_CODIGO_OPERADOR = {operador: codigo for codigo, operador in enumerate(OPERADORES)}
+
+
+class ProgramaArena:
+    """Programa com expressões e comandos em arranjos paralelos.
+
+    Nós: tipos, operadores, esquerdas, direitas (-1 nas folhas), valores (índice
+    em constantes para literais, em nomes para identificadores, -1 em BINARIO) e
+    posicoes (-1 quando não há). Os filhos sempre têm índice menor que o pai.
+    Comandos: comandos_tipos, comandos_nomes (variável ou personagem, em nomes),
+    comandos_expressoes (raiz ou -1 no LEIA) e comandos_posicoes."""
+
+    def __init__(self, nome_cena: str = None, personagem: Personagem = None):
+        self.nome_cena = nome_cena
+        self.personagem = personagem
+        self.tipos = array('b')
+        self.operadores = array('b')
+        self.esquerdas = array('i')
+        self.direitas = array('i')
+        self.valores = array('i')
+        self.posicoes = array('q')
+        self.comandos_tipos = array('b')
+        self.comandos_nomes = array('i')
+        self.comandos_expressoes = array('i')
+        self.comandos_posicoes = array('q')
+        self.constantes = []  # int, float e STRING (com as aspas, como em Literal)
+        self.nomes = []
+        self._indice_constantes = {}  # (tipo, valor) -> índice; 1 e 1.0 são constantes diferentes
+        self._indice_nomes = {}
+
+    def _constante(self, tipo: int, valor) -> int:
+        chave = (tipo, valor)
+        indice = self._indice_constantes.get(chave)
+        if indice is None:
+            indice = self._indice_constantes[chave] = len(self.constantes)
+            self.constantes.append(valor)
+        return indice
+
+    def _nome(self, nome: str) -> int:
+        indice = self._indice_nomes.get(nome)
+        if indice is None:
+            indice = self._indice_nomes[nome] = len(self.nomes)
+            self.nomes.append(nome)
+        return indice
+
+    def _no(self, tipo: int, operador: int, esquerda: int, direita: int, valor: int, posicao) -> int:
+        tipos = self.tipos
+        tipos.append(tipo)
+        self.operadores.append(operador)
+        self.esquerdas.append(esquerda)
+        self.direitas.append(direita)
+        self.valores.append(valor)
+        self.posicoes.append(-1 if posicao is None else posicao)
+        return len(tipos) - 1
+
+    def adicionar_literal(self, valor: Union[int, float, str], tipo: str, posicao: int = None) -> int:
+        codigo = _TIPO_LITERAL[tipo]
+        return self._no(codigo, 0, -1, -1, self._constante(codigo, valor), posicao)
+
+    def adicionar_nome(self, nome: str, posicao: int = None) -> int:
+        return self._no(NOME, 0, -1, -1, self._nome(nome), posicao)
+
+    def adicionar_binario(self, operador: str, esquerda: int, direita: int) -> int:
+        return self._no(BINARIO, _CODIGO_OPERADOR[operador], esquerda, direita, -1, None)
+
+    def adicionar_comando(self, tipo: int, nome: str, expressao: int = -1, posicao: int = None) -> int:
+        self.comandos_tipos.append(tipo)
+        self.comandos_nomes.append(self._nome(nome))
+        self.comandos_expressoes.append(expressao)
+        self.comandos_posicoes.append(-1 if posicao is None else posicao)
+        return len(self.comandos_tipos) - 1
+
+    def _truncar(self, nos: int):
+        """Descarta os nós a partir do índice `nos` (de um comando incompleto)"""
+        for arranjo in (self.tipos, self.operadores, self.esquerdas, self.direitas,
+                        self.valores, self.posicoes):
+            del arranjo[nos:]
+
+    def adicionar_expressao(self, expressao: Expressao) -> int:
+        """Copia uma expressão (tradicional ou compacta) para a arena; retorna a raiz"""
+        raiz = compactar_expressao(expressao)
+        indices = {}
+        pendentes = [raiz]
+        while pendentes:
+            no = pendentes[-1]
+            if isinstance(no, Binario):
+                if id(no.direita) not in indices:
+                    pendentes += (no.direita, no.esquerda)
+                    continue
+                indices[id(no)] = self.adicionar_binario(no.operador, indices[id(no.esquerda)],
+                                                         indices[id(no.direita)])
+            elif isinstance(no, Nome):
+                indices[id(no)] = self.adicionar_nome(no.nome, no.posicao)
+            else:
+                indices[id(no)] = self.adicionar_literal(no.valor, no.tipo, no.posicao)
+            pendentes.pop()
+        return indices[id(raiz)]
+
+    @classmethod
+    def de_programa(cls, programa: Programa) -> 'ProgramaArena':
+        """Converte um Programa (AST tradicional ou compacta) para a arena"""
+        arena = cls(programa.nome_cena, programa.personagem)
+        for comando in programa.comandos:
+            if isinstance(comando, ComandoLeitura):
+                arena.adicionar_comando(LEIA, comando.variavel, -1, comando.posicao)
+            elif isinstance(comando, ComandoEscrita):
+                arena.adicionar_comando(DIZ, comando.personagem, arena.adicionar_expressao(comando.expressao))
+            else:
+                arena.adicionar_comando(ATRIBUICAO, comando.variavel,
+                                        arena.adicionar_expressao(comando.expressao), comando.posicao)
+        return arena
+
+    def __len__(self) -> int:
+        """Número de nós de expressão"""
+        return len(self.tipos)
+
+    @property
+    def total_comandos(self) -> int:
+        return len(self.comandos_tipos)
+
+    def no(self, indice: int) -> 'NoArena':
+        if not -len(self.tipos) <= indice < len(self.tipos):
+            raise IndexError("índice de nó fora da arena")
+        return NoArena(self, indice % len(self.tipos))
+
+    def comando(self, indice: int) -> 'ComandoArena':
+        if not -len(self.comandos_tipos) <= indice < len(self.comandos_tipos):
+            raise IndexError("índice de comando fora da arena")
+        return ComandoArena(self, indice % len(self.comandos_tipos))
+
+    def comandos(self) -> Iterator['ComandoArena']:
+        for indice in range(len(self.comandos_tipos)):
+            yield ComandoArena(self, indice)
+
+    def para_compacta(self, raiz: int) -> NoCompacto:
+        """Expressão da arena como Binario/Literal/Nome"""
+        tipos, operadores, esquerdas, direitas = self.tipos, self.operadores, self.esquerdas, self.direitas
+        valores, posicoes, constantes, nomes = self.valores, self.posicoes, self.constantes, self.nomes
+        # Os filhos vêm antes do pai: basta visitar a subárvore em ordem crescente de índice
+        subarvore = []
+        pendentes = [raiz]
+        while pendentes:
+            indice = pendentes.pop()
+            subarvore.append(indice)
+            if tipos[indice] == BINARIO:
+                pendentes += (esquerdas[indice], direitas[indice])
+        subarvore.sort()
+        nos = {}
+        for indice in subarvore:
+            tipo = tipos[indice]
+            posicao = posicoes[indice]
+            posicao = None if posicao < 0 else posicao
+            if tipo == BINARIO:
+                nos[indice] = Binario(OPERADORES[operadores[indice]], nos.pop(esquerdas[indice]),
+                                      nos.pop(direitas[indice]))
+            elif tipo == NOME:
+                nos[indice] = Nome(nomes[valores[indice]], posicao)
+            else:
+                nos[indice] = Literal(constantes[valores[indice]], _NOMES_TIPOS[tipo], posicao)
+        return nos[raiz]
+
+    def para_programa(self) -> Programa:
+        """Programa equivalente com a AST compacta, para consumidores antigos"""
+        return Programa(self.nome_cena, self.personagem, [comando.para_comando() for comando in self.comandos()])
+
+
+class NoArena:
+    """Vista somente leitura de um nó de expressão da arena"""
+    __slots__ = ('arena', 'indice')
+
+    def __init__(self, arena: ProgramaArena, indice: int):
+        self.arena = arena
+        self.indice = indice
+
+    def __eq__(self, outro):
+        return isinstance(outro, NoArena) and outro.arena is self.arena and outro.indice == self.indice
+
+    def __hash__(self):
+        return hash((id(self.arena), self.indice))
+
+    def __repr__(self):
+        return f"NoArena({self.indice}, {self.tipo})"
+
+    @property
+    def tipo(self) -> str:
+        """'BINARIO', 'IDENTIFICADOR', 'NUM_INTEIRO', 'NUM_REAL' ou 'STRING'"""
+        return _NOMES_TIPOS[self.arena.tipos[self.indice]]
+
+    @property
+    def operador(self) -> Union[str, None]:
+        codigo = self.arena.operadores[self.indice]
+        return OPERADORES[codigo] if codigo else None
+
+    @property
+    def esquerda(self) -> Union['NoArena', None]:
+        filho = self.arena.esquerdas[self.indice]
+        return NoArena(self.arena, filho) if filho >= 0 else None
+
+    @property
+    def direita(self) -> Union['NoArena', None]:
+        filho = self.arena.direitas[self.indice]
+        return NoArena(self.arena, filho) if filho >= 0 else None
+
+    @property
+    def valor(self) -> Union[int, float, str, None]:
+        """Valor do literal ou nome da variável (None em BINARIO)"""
+        arena = self.arena
+        tipo = arena.tipos[self.indice]
+        if tipo == BINARIO:
+            return None
+        tabela = arena.nomes if tipo == NOME else arena.constantes
+        return tabela[arena.valores[self.indice]]
+
+    @property
+    def posicao(self) -> Union[int, None]:
+        posicao = self.arena.posicoes[self.indice]
+        return posicao if posicao >= 0 else None
+
+    def para_compacta(self) -> NoCompacto:
+        return self.arena.para_compacta(self.indice)
+
+
+class ComandoArena:
+    """Vista somente leitura de um comando da arena"""
+    __slots__ = ('arena', 'indice')
+
+    def __init__(self, arena: ProgramaArena, indice: int):
+        self.arena = arena
+        self.indice = indice
+
+    def __repr__(self):
+        return f"ComandoArena({self.indice}, {self.tipo})"
+
+    @property
+    def tipo(self) -> str:
+        """'LEIA', 'DIZ' ou 'ATRIBUICAO'"""
+        return _NOMES_COMANDOS[self.arena.comandos_tipos[self.indice]]
+
+    @property
+    def nome(self) -> str:
+        """Variável do LEIA e da atribuição, ou personagem do DIZ"""
+        return self.arena.nomes[self.arena.comandos_nomes[self.indice]]
+
+    @property
+    def expressao(self) -> Union[NoArena, None]:
+        raiz = self.arena.comandos_expressoes[self.indice]
+        return NoArena(self.arena, raiz) if raiz >= 0 else None
+
+    @property
+    def posicao(self) -> Union[int, None]:
+        posicao = self.arena.comandos_posicoes[self.indice]
+        return posicao if posicao >= 0 else None
+
+    def para_comando(self) -> Comando:
+        """Comando equivalente com a expressão na AST compacta"""
+        tipo = self.arena.comandos_tipos[self.indice]
+        if tipo == LEIA:
+            return ComandoLeitura(self.nome, self.posicao)
+        expressao = self.arena.para_compacta(self.arena.comandos_expressoes[self.indice])
+        if tipo == DIZ:
+            return ComandoEscrita(self.nome, expressao)
+        return ComandoAtribuicao(self.nome, expressao, self.posicao)
+
+
+class ParserArena(Parser):
+    """Parser que constrói um ProgramaArena em vez de objetos Comando/expressão.
+    Aceita as mesmas entradas e lança os mesmos erros que Parser(tokens).parse();
+    no modo de recuperação os nós de um comando com erro são descartados."""
+
+    def __init__(self, tokens, recuperar_erros: bool = False):
+        super().__init__(tokens, recuperar_erros=recuperar_erros)
+        self.arena = ProgramaArena()
+
+    def parser_programa(self) -> ProgramaArena:
+        """<programa> ::= CENA IDENTIFICADOR : <personagem> <comandos> FIM_CENA"""
+        self.arena.nome_cena, self.arena.personagem = self.parser_cabecalho()
+        self.parser_comandos()
+        self._esperar(TipoToken.FIM_CENA, "Esperado 'FIM_CENA' no final do programa")
+        self.nivel_cena -= 1
+        return self.arena
+
+    def parser_comandos(self) -> List[int]:
+        """Como Parser.parser_comandos; os comandos vão para a arena (retorna [])"""
+        while (not self.verificar(TipoToken.EOF) and
+               not self.verificar(TipoToken.FIM_CENA)):
+            inicio = len(self.arena.tipos)
+            try:
+                self.parser_item_comando()
+            except _ErroComPosicao as erro:
+                if not self.recuperar_erros:
+                    raise
+                self.arena._truncar(inicio)
+                self._recuperar(erro, dentro_memoria=False)
+        return []
+
+    def parser_comando_leitura(self) -> int:
+        """<comando_leitura> ::= LEIA IDENTIFICADOR ;"""
+        self.consumir(TipoToken.LEIA, "Esperado 'LEIA'")
+        variavel_token = self.consumir(TipoToken.IDENTIFICADOR, "Esperado identificador após LEIA")
+        if variavel_token.lexema not in self.variaveis_declaradas:
+            self._registrar_nao_declarada(variavel_token, "no comando LEIA")
+        self.consumir(TipoToken.PONTO_VIRGULA, "Esperado ';' após comando LEIA")
+        return self.arena.adicionar_comando(LEIA, variavel_token.lexema, -1, variavel_token.posicao)
+
+    def parser_comando_escrita(self) -> int:
+        """<comando_escrita> ::= IDENTIFICADOR DIZ <expressao> ;"""
+        personagem_token = self.consumir(TipoToken.IDENTIFICADOR, "Esperado nome do personagem")
+        if self.nome_personagem and personagem_token.lexema != self.nome_personagem:
+            raise ErroSemantico(
+                f"Personagem '{personagem_token.lexema}' usado no comando DIZ não corresponde ao personagem declarado '{self.nome_personagem}'",
+                posicao=personagem_token.posicao,
+                mapa_linhas=personagem_token.mapa_linhas
+            )
+        self.consumir(TipoToken.DIZ, "Esperado 'DIZ' após nome do personagem")
+        raiz = self.parser_expressao()
+        self.consumir(TipoToken.PONTO_VIRGULA, "Esperado ';' após comando DIZ")
+        return self.arena.adicionar_comando(DIZ, personagem_token.lexema, raiz)
+
+    def parser_comando_atribuicao(self) -> int:
+        """<comando_atribuicao> ::= IDENTIFICADOR = <expressao> ;"""
+        variavel_token = self.consumir(TipoToken.IDENTIFICADOR, "Esperado identificador")
+        if variavel_token.lexema not in self.variaveis_declaradas:
+            self._registrar_nao_declarada(variavel_token, "na atribuição")
+        self.consumir(TipoToken.OP_ATRIBUICAO, "Esperado '=' após identificador")
+        raiz = self.parser_expressao()
+        self.consumir(TipoToken.PONTO_VIRGULA, "Esperado ';' após expressão")
+        return self.arena.adicionar_comando(ATRIBUICAO, variavel_token.lexema, raiz, variavel_token.posicao)
+
+    def parser_expressao(self) -> int:
+        """parser_expressao_compacta com os nós na arena; retorna o índice da raiz"""
+        arena = self.arena
+        operandos = []
+        operadores = []  # (precedência, lexema); None marca um '(' aberto
+        while True:
+            token = self.token_atual
+            tipo = token.tipo
+            if tipo == TipoToken.PARENTESE_ESQ:
+                operadores.append(None)
+                self.avancar()
+                continue
+            if tipo == TipoToken.IDENTIFICADOR:
+                operandos.append(arena.adicionar_nome(token.lexema, token.posicao))
+                if token.lexema not in self.variaveis_declaradas:
+                    self._registrar_nao_declarada(token, "na expressão")
+            elif tipo == TipoToken.NUM_INTEIRO:
+                operandos.append(arena.adicionar_literal(int(token.lexema), "NUM_INTEIRO", token.posicao))
+            elif tipo == TipoToken.NUM_REAL:
+                operandos.append(arena.adicionar_literal(float(token.lexema), "NUM_REAL", token.posicao))
+            elif tipo == TipoToken.STRING:
+                operandos.append(arena.adicionar_literal(token.lexema, "STRING", token.posicao))
+            else:
+                raise ErroSintatico(
+                    "Esperado identificador, número, string ou expressão entre parênteses",
+                    posicao=token.posicao,
+                    mapa_linhas=token.mapa_linhas
+                )
+            self.avancar()
+
+            while True:
+                token = self.token_atual
+                precedencia = _PRECEDENCIA.get(token.tipo)
+                while operadores and operadores[-1] is not None and (
+                        precedencia is None or operadores[-1][0] > precedencia or
+                        (operadores[-1][0] == precedencia and precedencia != _PRECEDENCIA_POTENCIA)):
+                    direita = operandos.pop()
+                    operandos[-1] = arena.adicionar_binario(operadores.pop()[1], operandos[-1], direita)
+                if precedencia is not None:
+                    operadores.append((precedencia, token.lexema))
+                    self.avancar()
+                    break
+                if not operadores:
+                    return operandos[0]
+                self.consumir(TipoToken.PARENTESE_DIR, "Esperado ')' após expressão")
+                operadores.pop()
@@ -0,0 +1,727 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmarks do compilador DRAMATICA.
+
+Uso:
+    python benchmark.py            # executa todos os benchmarks
+    python benchmark.py lexer      # executa apenas os benchmarks indicados
+"""
+
+import contextlib
+import gc
+import importlib.util
+import io
+import os
+import py_compile
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from arena import ParserArena
+from cache import caminho_do_cache, carregar_programa
+from lexer import Lexer, LexerRegex, relexar, tokenizar_arquivo, tokenizar_paralelo
+from interpreter import InterpretadorPiLang
+from parser import Parser, ParserIncremental
+from slr import Grammar, ParserSLR, SLRAnalyzer, analisador_padrao
+
+
+def gerar_script(tamanho_alvo):
+    """Gera um script DRAMATICA válido com aproximadamente tamanho_alvo caracteres"""
+    cabecalho = (
+        "// Cena gerada automaticamente para benchmark\n"
+        "CENA Benchmark:\n"
+        "    PERSONAGEM Ator:\n"
+        "        MEMORIA:\n"
+        "            contador: INT;\n"
+        "            media: FLOAT;\n"
+        "            nome: VARCHAR;\n"
+        "        FIM_MEMORIA\n"
+    )
+    bloco = (
+        "    LEIA contador;\n"
+        "    media = (contador + 2.5) * 3 / 4 ^ 2 - 1; // atualiza a média\n"
+        "    nome = \"Ator principal\" + contador;\n"
+        "    Ator DIZ nome;\n"
+    )
+    repeticoes = max(1, (tamanho_alvo - len(cabecalho)) // len(bloco))
+    return cabecalho + bloco * repeticoes + "FIM_CENA\n"
+
+
+def _cronometrar(funcao, repeticoes=3):
+    """Retorna o menor tempo (em segundos) entre as repetições"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def benchmark_lexer():
+    """Compara Lexer e LexerRegex em scripts de 256 KB a 4 MB"""
+    print("=== Lexer: autômato caractere a caractere x padrão mestre ===")
+    print(f"{'tamanho':>10} {'tokens':>9} {'Lexer (s)':>10} {'Regex (s)':>10} {'Regex s/MB':>11} {'ganho':>7}")
+    for tamanho in (256 * 1024, 1024 * 1024, 2 * 1024 * 1024, 4 * 1024 * 1024):
+        codigo = gerar_script(tamanho)
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        tempo_regex = _cronometrar(lambda: LexerRegex(codigo).tokenizar())
+        # O autômato original é lento demais para repetir nos tamanhos maiores
+        if tamanho <= 1024 * 1024:
+            tempo_classico = _cronometrar(lambda: Lexer(codigo).tokenizar(), repeticoes=1)
+            texto_classico = f"{tempo_classico:10.3f}"
+            ganho = f"{tempo_classico / tempo_regex:6.1f}x"
+        else:
+            texto_classico = f"{'-':>10}"
+            ganho = f"{'-':>7}"
+        megabytes = len(codigo) / (1024 * 1024)
+        print(f"{len(codigo):>10} {len(tokens):>9} {texto_classico} {tempo_regex:10.3f} "
+              f"{tempo_regex / megabytes:11.3f} {ganho}")
+    print()
+
+
+def _pico_memoria(funcao):
+    """Executa funcao() e retorna (tempo em s, pico de memória alocada em MB)"""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcao()
+    decorrido = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return decorrido, pico / (1024 * 1024)
+
+
+def benchmark_streaming():
+    """Compara memória de pico entre lista de tokens e Lexer.iter_tokens + Parser"""
+    print("=== Validação de arquivo: lista de tokens x fluxo de tokens ===")
+    codigo = gerar_script(4 * 1024 * 1024)
+    with tempfile.NamedTemporaryFile('w', suffix='.dramatica', delete=False, encoding='utf-8') as f:
+        f.write(codigo)
+        caminho = f.name
+    del codigo
+
+    def em_lista():
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            tokens, _ = LexerRegex(arquivo.read()).tokenizar()
+        Parser(tokens).parse()
+
+    def em_fluxo():
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            erros = []
+            Parser(Lexer.iter_tokens(arquivo, erros)).parse()
+
+    try:
+        print(f"arquivo: {os.path.getsize(caminho) / (1024 * 1024):.1f} MB")
+        for nome, funcao in (("lista", em_lista), ("fluxo", em_fluxo)):
+            decorrido, pico = _pico_memoria(funcao)
+            print(f"{nome:>6}: {decorrido:6.2f} s, pico {pico:8.1f} MB")
+    finally:
+        os.remove(caminho)
+    print()
+
+
+def _memoria_retida(funcao):
+    """Retorna (resultado, MB ainda alocados após funcao())"""
+    tracemalloc.start()
+    resultado = funcao()
+    atual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, atual / (1024 * 1024)
+
+
+def benchmark_comentarios():
+    """Tempo de um cabeçalho de comentários longo: deve crescer linearmente com as linhas"""
+    print("=== Cabeçalho de comentários: tempo por número de linhas ===")
+    print(f"{'linhas':>9} {'Lexer (s)':>10} {'Regex (s)':>10}")
+    for linhas in (10_000, 100_000, 200_000):
+        codigo = "// linha de cabeçalho gerada\n" * linhas + "CENA Fim: FIM_CENA"
+        tempo_classico = _cronometrar(lambda: Lexer(codigo, manter_comentarios=True).tokenizar(), repeticoes=1)
+        tempo_regex = _cronometrar(lambda: LexerRegex(codigo, manter_comentarios=True).tokenizar())
+        print(f"{linhas:>9} {tempo_classico:10.3f} {tempo_regex:10.3f}")
+    print()
+
+
+def benchmark_memoria_tokens():
+    """Memória retida pela lista de Token x TokenBuffer colunar"""
+    print("=== Memória dos tokens (tracemalloc) ===")
+    codigo = gerar_script(4 * 1024 * 1024)
+    print(f"fonte: {len(codigo) / (1024 * 1024):.1f} MB")
+
+    (tokens, _), memoria = _memoria_retida(lambda: LexerRegex(codigo).tokenizar())
+    print(f"lista de Token: {len(tokens):>8} tokens, {memoria:8.1f} MB "
+          f"({memoria * 1024 * 1024 / len(tokens):5.1f} bytes/token)")
+    del tokens
+
+    lexer = LexerRegex(codigo)
+    if hasattr(lexer, 'tokenizar_buffer'):
+        (buffer, _), memoria = _memoria_retida(lexer.tokenizar_buffer)
+        print(f"TokenBuffer:    {len(buffer):>8} tokens, {memoria:8.1f} MB "
+              f"({memoria * 1024 * 1024 / len(buffer):5.1f} bytes/token)")
+    print()
+
+
+def benchmark_relexar():
+    """Latência de uma edição: reanálise completa x relexar"""
+    print("=== Edição de um caractere: tokenizar_buffer x relexar ===")
+    print(f"{'linhas':>8} {'tokens':>9} {'completo (ms)':>14} {'relexar (ms)':>13}")
+    for tamanho in (64 * 1024, 512 * 1024, 4 * 1024 * 1024):
+        codigo = gerar_script(tamanho)
+        buffer, _ = LexerRegex(codigo).tokenizar_buffer()
+        posicao = codigo.index("contador", len(codigo) // 2)
+
+        tempo_completo = _cronometrar(
+            lambda: LexerRegex(codigo[:posicao] + "x" + codigo[posicao:]).tokenizar_buffer())
+        tempo_incremental = _cronometrar(lambda: relexar(buffer, posicao, 0, "x"), repeticoes=20)
+        print(f"{codigo.count(chr(10)):>8} {len(buffer):>9} {tempo_completo * 1000:14.2f} "
+              f"{tempo_incremental * 1000:13.3f}")
+    print()
+
+
+def benchmark_paralelo():
+    """tokenizar_buffer em um núcleo x tokenizar_paralelo"""
+    print(f"=== Tokenização em paralelo ({os.cpu_count()} núcleos) ===")
+    codigo = gerar_script(16 * 1024 * 1024)
+    print(f"fonte: {len(codigo) / (1024 * 1024):.1f} MB")
+    tempo_serial = _cronometrar(lambda: LexerRegex(codigo).tokenizar_buffer(), repeticoes=1)
+    print(f"{'serial':>10}: {tempo_serial:6.2f} s")
+    for workers in (2, 4, 8):
+        tempo = _cronometrar(lambda: tokenizar_paralelo(codigo, workers), repeticoes=1)
+        print(f"{workers:>2} workers: {tempo:6.2f} s ({tempo_serial / tempo:4.1f}x)")
+    print()
+
+
+def benchmark_erros():
+    """Entrada de lixo: quantidade e tamanho dos erros léxicos, com e sem limite"""
+    print("=== Erros léxicos em entrada binária (2 MB) ===")
+    aleatorio = random.Random(0)
+    lixo = bytes(aleatorio.randrange(1, 256) for _ in range(2 * 1024 * 1024)).decode('latin-1')
+    for max_erros in (None, 100):
+        lexer = LexerRegex(lixo, max_erros=max_erros)
+        (_, erros), memoria = _memoria_retida(lexer.tokenizar_buffer)
+        inicio = time.perf_counter()
+        saida = '\n'.join(map(str, erros))
+        formatacao = time.perf_counter() - inicio
+        print(f"max_erros={str(max_erros):>5}: {len(erros):>7} erros, {memoria:6.1f} MB retidos, "
+              f"saída {len(saida) / 1024:8.1f} KB formatada em {formatacao * 1000:7.1f} ms")
+    print()
+
+
+def benchmark_arquivo():
+    """Leitura para str + tokenizar_buffer x tokenizar_arquivo (mmap)"""
+    print("=== Tokenização de arquivos: leitura completa x mapeamento em memória ===")
+    diretorio = tempfile.mkdtemp()
+    grande = os.path.join(diretorio, 'grande.dramatica')
+    with open(grande, 'w', encoding='utf-8') as f:
+        f.write(gerar_script(16 * 1024 * 1024).replace("Ator principal", "Atriz coração"))
+    pequenos = []
+    for i in range(2000):
+        pequenos.append(os.path.join(diretorio, f'cena{i}.dramatica'))
+        with open(pequenos[-1], 'w', encoding='utf-8') as f:
+            f.write(gerar_script(4 * 1024))
+
+    def lendo(caminhos):
+        for caminho in caminhos:
+            with open(caminho, 'r', encoding='utf-8') as arquivo:
+                LexerRegex(arquivo.read()).tokenizar_buffer()
+
+    def mapeando(caminhos):
+        for caminho in caminhos:
+            tokens, _ = tokenizar_arquivo(caminho)
+            tokens.fechar()
+
+    try:
+        for rotulo, caminhos in ((f"1 x {os.path.getsize(grande) / (1024 * 1024):.0f} MB", [grande]),
+                                 (f"{len(pequenos)} x 4 KB", pequenos)):
+            for nome, funcao in (("leitura", lendo), ("mmap", mapeando)):
+                tempo = _cronometrar(lambda: funcao(caminhos), repeticoes=1)
+                _, pico = _pico_memoria(lambda: funcao(caminhos))
+                print(f"{rotulo:>12} {nome:>8}: {tempo:6.2f} s, pico {pico:7.2f} MB")
+    finally:
+        for caminho in [grande] + pequenos:
+            os.remove(caminho)
+        os.rmdir(diretorio)
+    print()
+
+
+def benchmark_expressoes():
+    """parser_expressao (pilha explícita) x descida recursiva"""
+    print("=== Expressões: pilha explícita x descida recursiva ===")
+    profundidade = 10000
+    casos = (
+        ("aninhada 10k", "(" * profundidade + "x + 1" + ")" * profundidade),
+        ("plana 100k", " + ".join(f"x * {i} ^ 2" for i in range(100000))),
+        ("típica x 20k", " + ".join(["(contador + 2.5) * 3 / 4 ^ 2 - 1"] * 20000)),
+    )
+    print(f"{'expressão':>14} {'tokens':>9} {'iterativa (s)':>14} {'recursiva (s)':>14}")
+    for nome, expressao in casos:
+        tokens, _ = LexerRegex(expressao + ";").tokenizar()
+        # Cada lado começa com o coletor de lixo no mesmo estado
+        gc.collect()
+        tempo_iterativo = _cronometrar(lambda: Parser(tokens).parser_expressao())
+        gc.collect()
+        try:
+            tempo_recursivo = f"{_cronometrar(lambda: Parser(tokens).parser_expressao_simples()):14.3f}"
+        except RecursionError:
+            tempo_recursivo = f"{'RecursionError':>14}"
+        print(f"{nome:>14} {len(tokens):>9} {tempo_iterativo:14.3f} {tempo_recursivo}")
+    print()
+
+
+def benchmark_ast_compacta():
+    """Memória e vazão do parser: AST tradicional x AST compacta"""
+    print("=== AST: ExpressaoSimples/Termo/Fator/Elemento x Binario/Literal/Nome ===")
+    codigo = gerar_script(1024 * 1024)
+    tokens, _ = LexerRegex(codigo).tokenizar()
+    print(f"fonte: {len(codigo) / (1024 * 1024):.1f} MB, {len(tokens)} tokens")
+    print(f"{'AST':>12} {'nós':>9} {'MB':>7} {'bytes/nó':>9} {'bytes/operando':>15} {'tokens/s':>10}")
+    for nome, compacta in (("tradicional", False), ("compacta", True)):
+        gc.collect()
+        programa, memoria = _memoria_retida(lambda: Parser(tokens, ast_compacta=compacta).parse())
+        # Nós das expressões (listas e tuplas de operadores da AST tradicional à parte)
+        nos = operandos = 0
+        pendentes = [comando.expressao for comando in programa.comandos if hasattr(comando, 'expressao')]
+        while pendentes:
+            no = pendentes.pop()
+            nos += 1
+            if hasattr(no, 'termos'):
+                pendentes.extend(termo for _, termo in no.termos)
+            elif hasattr(no, 'fatores'):
+                pendentes.extend(fator for _, fator in no.fatores)
+            elif hasattr(no, 'elementos'):
+                pendentes.extend(elemento for _, elemento in no.elementos)
+            elif hasattr(no, 'esquerda'):
+                pendentes += (no.esquerda, no.direita)
+            elif getattr(no, 'tipo', None) == 'EXPRESSAO':
+                pendentes.append(no.valor)
+            else:
+                operandos += 1
+        del programa
+        gc.collect()
+        tempo = _cronometrar(lambda: Parser(tokens, ast_compacta=compacta).parse())
+        print(f"{nome:>12} {nos:>9} {memoria:7.1f} {memoria * 1024 * 1024 / nos:9.1f} "
+              f"{memoria * 1024 * 1024 / operandos:15.1f} {len(tokens) / tempo:10.0f}")
+    print()
+
+
+def benchmark_validacao():
+    """Custo da segunda passada de validar_semantica, hoje feita durante a análise"""
+    print("=== Validação semântica: durante a análise x passada extra ===")
+    codigo = gerar_script(1024 * 1024)
+    tokens, _ = LexerRegex(codigo).tokenizar()
+    parser = Parser(tokens)
+    programa = parser.parse()
+    tempo_parse = _cronometrar(lambda: Parser(tokens).parse())
+    tempo_passada = _cronometrar(lambda: parser.validar_semantica(programa))
+    print(f"parse() com verificação embutida: {tempo_parse:6.3f} s")
+    print(f"passada extra de validar_semantica: {tempo_passada:6.3f} s "
+          f"({tempo_passada / (tempo_parse + tempo_passada) * 100:.0f}% do total antigo)")
+    print()
+
+
+def benchmark_incremental():
+    """Latência de uma tecla: relexar + análise completa x ParserIncremental"""
+    print("=== Edição de um caractere: análise completa x ParserIncremental ===")
+    print(f"{'linhas':>8} {'comandos':>9} {'completo (ms)':>14} {'incremental (ms)':>17} "
+          f"{'+ parse() (ms)':>15} {'reanalisados':>13}")
+    for tamanho in (64 * 1024, 512 * 1024, 4 * 1024 * 1024):
+        codigo = gerar_script(tamanho)
+        incremental = ParserIncremental(codigo)
+        comandos = len(incremental.parse().comandos)
+        posicao = codigo.index("2.5", len(codigo) // 2)
+
+        def completo():
+            buffer, _ = LexerRegex(codigo).tokenizar_buffer()
+            relexar(buffer, posicao, 1, "3")
+            Parser(buffer).parse()
+
+        def tecla():
+            # Troca o dígito e desfaz, sempre analisando o resultado
+            incremental.editar(posicao, 1, "3")
+            incremental.erro
+            incremental.editar(posicao, 1, "2")
+            incremental.erro
+
+        def tecla_e_programa():
+            incremental.editar(posicao, 1, "3")
+            incremental.parse()
+            incremental.editar(posicao, 1, "2")
+            incremental.parse()
+
+        tempo_completo = _cronometrar(completo, repeticoes=1)
+        tempo_tecla = _cronometrar(tecla, repeticoes=20) / 2
+        tempo_programa = _cronometrar(tecla_e_programa, repeticoes=5) / 2
+        print(f"{codigo.count(chr(10)):>8} {comandos:>9} {tempo_completo * 1000:14.2f} "
+              f"{tempo_tecla * 1000:17.3f} {tempo_programa * 1000:15.3f} {incremental.comandos_reanalisados:>13}")
+    print()
+
+
+def benchmark_cache_disco():
+    """Carregar um script do cache em disco x analisá-lo do zero"""
+    print("=== Cache em disco: Lexer/LexerRegex + Parser x carregar_programa ===")
+    print(f"{'tamanho':>10} {'Lexer+Parser':>13} {'Regex+Parser':>13} {'1ª carga':>9} {'do cache':>9} "
+          f"{'ganho':>12} {'cache (KB)':>11}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for tamanho in (64 * 1024, 1024 * 1024, 4 * 1024 * 1024):
+            codigo = gerar_script(tamanho)
+            caminho = os.path.join(diretorio, f"cena_{tamanho}.dramatica")
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(codigo)
+
+            def completo(lexer):
+                with open(caminho, encoding='utf-8') as arquivo:
+                    tokens, _ = lexer(arquivo.read()).tokenizar()
+                Parser(tokens).parse()
+
+            tempo_lexer = _cronometrar(lambda: completo(Lexer), repeticoes=1)
+            tempo_regex = _cronometrar(lambda: completo(LexerRegex))
+            tempo_primeira = _cronometrar(lambda: carregar_programa(caminho), repeticoes=1)
+            tempo_cache = _cronometrar(lambda: carregar_programa(caminho), repeticoes=5)
+            tamanho_cache = os.path.getsize(caminho_do_cache(caminho)) / 1024
+            print(f"{len(codigo) // 1024:>8}KB {tempo_lexer:12.3f}s {tempo_regex:12.3f}s {tempo_primeira:8.3f}s "
+                  f"{tempo_cache:8.3f}s {tempo_lexer / tempo_cache:5.0f}x/{tempo_regex / tempo_cache:4.0f}x "
+                  f"{tamanho_cache:11.0f}")
+    print()
+
+
+def _pausas_gc(funcao):
+    """Executa funcao() e retorna (resultado, tempo total em s, coletas, segundos em coletas)"""
+    pausas = []
+
+    def callback(fase, _):
+        if fase == 'start':
+            pausas.append(-time.perf_counter())
+        else:
+            pausas[-1] += time.perf_counter()
+
+    gc.collect()
+    gc.callbacks.append(callback)
+    inicio = time.perf_counter()
+    try:
+        resultado = funcao()
+    finally:
+        decorrido = time.perf_counter() - inicio
+        gc.callbacks.remove(callback)
+    return resultado, decorrido, len(pausas), sum(pausas)
+
+
+def benchmark_arena():
+    """Parse e execução de um script gerado grande: AST tradicional, compacta e em arena"""
+    print("=== AST: objetos x arena (struct-of-arrays) ===")
+    codigo = gerar_script(4 * 1024 * 1024)
+    tokens, _ = LexerRegex(codigo).tokenizar_buffer()
+    print(f"fonte: {len(codigo) / (1024 * 1024):.1f} MB, {len(tokens)} tokens (TokenBuffer)")
+    print(f"{'AST':>12} {'parse (s)':>10} {'coletas':>8} {'em GC (s)':>10} {'objetos GC':>11} "
+          f"{'MB retidos':>11} {'execução (s)':>13}")
+    modos = (
+        ("tradicional", lambda: Parser(tokens).parse()),
+        ("compacta", lambda: Parser(tokens, ast_compacta=True).parse()),
+        ("arena", lambda: ParserArena(tokens).parse()),
+    )
+    for nome, analisar in modos:
+        objetos = len(gc.get_objects())
+        programa, tempo, coletas, em_gc = _pausas_gc(analisar)
+        objetos = len(gc.get_objects()) - objetos
+        del programa
+        gc.collect()
+        programa, memoria = _memoria_retida(analisar)
+
+        def executar():
+            with contextlib.redirect_stdout(io.StringIO()):
+                InterpretadorPiLang().executar_programa(programa)
+
+        tempo_execucao = _cronometrar(executar, repeticoes=1)
+        del programa
+        gc.collect()
+        print(f"{nome:>12} {tempo:10.3f} {coletas:8} {em_gc:10.3f} {objetos:11} {memoria:11.1f} "
+              f"{tempo_execucao:13.3f}")
+    print()
+
+
+def benchmark_slr():
+    """Parser recursivo x ParserSLR dirigido por tabela, sobre os mesmos tokens"""
+    print("=== Análise sintática: descida recursiva x tabelas SLR ===")
+    analisador_padrao()  # Tabelas construídas fora da medição
+    print(f"{'tamanho':>10} {'tokens':>9} {'Parser (s)':>11} {'ParserSLR (s)':>14} {'SLR tokens/s':>13} {'razão':>7}")
+    for tamanho in (256 * 1024, 1024 * 1024, 4 * 1024 * 1024):
+        codigo = gerar_script(tamanho)
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        tempo_recursivo = _cronometrar(lambda: Parser(tokens).parse())
+        tempo_slr = _cronometrar(lambda: ParserSLR(tokens).parse())
+        print(f"{len(codigo):>10} {len(tokens):>9} {tempo_recursivo:11.3f} {tempo_slr:14.3f} "
+              f"{len(tokens) / tempo_slr:13.0f} {tempo_slr / tempo_recursivo:6.2f}x")
+    print()
+
+
+class GramaticaSintetica(Grammar):
+    """Gramática gerada com `comandos` tipos de comando (KWi IDENTIFICADOR SEPi
+    Expr, separados por ';') sobre uma pequena gramática de expressões: o
+    número de produções, estados e transições cresce linearmente."""
+
+    def __init__(self, comandos):
+        self.start_symbol = "Programa"
+        self.nonterminals = ["S'", "Programa", "Comandos", "Comando", "Expr", "Termo", "Elem"]
+        self.nonterminals += [f"Comando{i}" for i in range(comandos)]
+        self.terminals = ["IDENTIFICADOR", "NUM_INTEIRO", "OP_ADICAO", "OP_MULTIPLICACAO",
+                          "PARENTESE_ESQ", "PARENTESE_DIR", "PONTO_VIRGULA", "EOF"]
+        self.terminals += [f"KW{i}" for i in range(comandos)] + [f"SEP{i}" for i in range(comandos)]
+        self.productions = []
+        self.actions = []
+        self.error_messages = {}
+        add = self._add
+        add("S'", ["Programa"])
+        add("Programa", ["Comandos"])
+        add("Comandos", ["Comandos", "PONTO_VIRGULA", "Comando"])
+        add("Comandos", ["Comando"])
+        for i in range(comandos):
+            add("Comando", [f"Comando{i}"])
+            add(f"Comando{i}", [f"KW{i}", "IDENTIFICADOR", f"SEP{i}", "Expr"])
+        add("Expr", ["Expr", "OP_ADICAO", "Termo"])
+        add("Expr", ["Termo"])
+        add("Termo", ["Termo", "OP_MULTIPLICACAO", "Elem"])
+        add("Termo", ["Elem"])
+        add("Elem", ["IDENTIFICADOR"])
+        add("Elem", ["NUM_INTEIRO"])
+        add("Elem", ["PARENTESE_ESQ", "Expr", "PARENTESE_DIR"])
+
+
+class GramaticaAtribuicoes(GramaticaSintetica):
+    """GramaticaSintetica em que cada tipo de comando também pode ser uma
+    atribuição a um alvo desreferenciado (o exemplo clássico S -> L = R | R,
+    L -> * R | id, R -> L): a gramática é LALR(1), mas tem um conflito
+    shift/reduce SLR por tipo de comando."""
+
+    def __init__(self, comandos):
+        super().__init__(comandos)
+        self.terminals.append("OP_ATRIBUICAO")
+        add = self._add
+        for i in range(comandos):
+            self.nonterminals += [f"Alvo{i}", f"Valor{i}"]
+            add(f"Comando{i}", [f"KW{i}", f"Alvo{i}", "OP_ATRIBUICAO", f"Valor{i}"])
+            add(f"Comando{i}", [f"KW{i}", f"Valor{i}"])
+            add(f"Alvo{i}", ["OP_MULTIPLICACAO", f"Valor{i}"])
+            add(f"Alvo{i}", ["IDENTIFICADOR"])
+            add(f"Valor{i}", [f"Alvo{i}"])
+
+
+def benchmark_tabelas_slr():
+    """Tempo de construção do SLRAnalyzer por etapa em gramáticas sintéticas grandes"""
+    print("=== Construção das tabelas SLR em gramáticas sintéticas ===")
+    print(f"{'produções':>10} {'estados':>8} {'FIRST/FOLLOW (s)':>17} {'LR(0) (s)':>10} "
+          f"{'tabelas (s)':>12} {'compilação (s)':>15} {'LR(0) µs/estado':>16}")
+    for comandos in (250, 500, 1000, 2000, 4000):
+        analisador = SLRAnalyzer(GramaticaSintetica(comandos))
+        tempos = analisador.build_times
+        print(f"{len(analisador.grammar.productions):>10} {len(analisador.states):>8} "
+              f"{tempos['first_follow']:17.3f} {tempos['lr0']:10.3f} {tempos['tabelas']:12.3f} "
+              f"{tempos['compilacao']:15.3f} "
+              f"{tempos['lr0'] / len(analisador.states) * 1e6:16.1f}")
+    print()
+
+
+def _passos_com_dicionarios(analisador, tipos):
+    """O laço de SLRAnalyzer.analisar antes das tabelas compiladas (dois
+    dicionários por passo e ações em tuplas), sem registrar os passos"""
+    acoes = analisador.action_table
+    desvios = analisador.goto_table
+    producoes = analisador.grammar.productions
+    reducoes_padrao = analisador.default_reductions
+    pilha = [0]
+    indice = 0
+    passos = 0
+    while True:
+        lookahead = tipos[indice] if indice < len(tipos) else "EOF"
+        acao = acoes.get(pilha[-1], {}).get(lookahead)
+        if acao is None and pilha[-1] in reducoes_padrao:
+            acao = ("reduce", reducoes_padrao[pilha[-1]])
+        passos += 1
+        if acao is None:
+            return False, passos
+        if acao[0] == "shift":
+            pilha.append(acao[1])
+            indice += 1
+        elif acao[0] == "reduce":
+            cabeca, corpo = producoes[acao[1]]
+            if corpo:
+                del pilha[-len(corpo):]
+            pilha.append(desvios[pilha[-1]][cabeca])
+        else:
+            return True, passos
+
+
+def benchmark_passos_slr():
+    """Passos por segundo do reconhecedor SLR: dicionários x tabelas densa e comprimida"""
+    print("=== Reconhecedor SLR: tabelas em dicionários x arranjos de inteiros ===")
+    densa = SLRAnalyzer(forma="densa")
+    comprimida = SLRAnalyzer(forma="comprimida")
+    print(f"tabelas: densa {densa.tabelas.tamanho} inteiros, "
+          f"comprimida {comprimida.tabelas.tamanho} inteiros")
+    print(f"{'tokens':>9} {'passos':>9} {'dicionários (passos/s)':>23} "
+          f"{'densa (passos/s)':>17} {'comprimida (passos/s)':>22}")
+    for tamanho in (256 * 1024, 1024 * 1024, 4 * 1024 * 1024):
+        tokens, _ = LexerRegex(gerar_script(tamanho)).tokenizar()
+        tipos = [token.tipo for token in tokens]
+        sucesso, passos = densa.contar_passos(tipos)
+        assert sucesso and _passos_com_dicionarios(densa, tipos) == (True, passos)
+        tempo_dicionarios = _cronometrar(lambda: _passos_com_dicionarios(densa, tipos), repeticoes=5)
+        tempo_densa = _cronometrar(lambda: densa.contar_passos(tipos), repeticoes=5)
+        tempo_comprimida = _cronometrar(lambda: comprimida.contar_passos(tipos), repeticoes=5)
+        print(f"{len(tokens):>9} {passos:>9} {passos / tempo_dicionarios:23.0f} "
+              f"{passos / tempo_densa:17.0f} {passos / tempo_comprimida:22.0f}")
+    print()
+
+
+def benchmark_carga_slr():
+    """Tempo até o analisador SLR ficar pronto: construção x cache em disco x módulo gerado"""
+    print("=== Inicialização do SLRAnalyzer: construção x tabelas persistidas ===")
+    print(f"{'gramática':>22} {'estados':>8} {'construção (ms)':>16} {'cache (ms)':>11} {'módulo (ms)':>12}")
+    gramaticas = [("DRAMATICA", Grammar())]
+    gramaticas += [(f"sintética ({comandos})", GramaticaSintetica(comandos)) for comandos in (1000, 4000)]
+    with tempfile.TemporaryDirectory() as diretorio:
+        for nome, gramatica in gramaticas:
+            tempo_construcao = _cronometrar(lambda: SLRAnalyzer(gramatica))
+            analisador = SLRAnalyzer.carregar(gramatica, diretorio=diretorio)  # Grava o cache
+            tempo_cache = _cronometrar(lambda: SLRAnalyzer.carregar(gramatica, diretorio=diretorio))
+
+            caminho = os.path.join(diretorio, f"tabelas_{len(gramatica.productions)}.py")
+            analisador.gerar_modulo(caminho)
+            py_compile.compile(caminho)  # A importação lê o .pyc, como num processo novo
+
+            def importar_modulo():
+                especificacao = importlib.util.spec_from_file_location("tabelas", caminho)
+                modulo = importlib.util.module_from_spec(especificacao)
+                especificacao.loader.exec_module(modulo)
+                return SLRAnalyzer.do_modulo(modulo, gramatica)
+
+            tempo_modulo = _cronometrar(importar_modulo)
+            print(f"{nome:>22} {len(analisador.states):>8} {tempo_construcao * 1000:16.2f} "
+                  f"{tempo_cache * 1000:11.2f} {tempo_modulo * 1000:12.2f}")
+    print()
+
+
+def benchmark_lalr():
+    """Estados, conflitos e tempo de construção das tabelas SLR e LALR(1)"""
+    print("=== Construção das tabelas: SLR x LALR(1) sobre o mesmo autômato LR(0) ===")
+    print(f"{'gramática':>24} {'estados':>8} {'conflitos SLR':>14} {'conflitos LALR':>15} "
+          f"{'lookaheads SLR (s)':>19} {'lookaheads LALR (s)':>20} {'total SLR (s)':>14} {'total LALR (s)':>15}")
+    gramaticas = [("DRAMATICA", Grammar)]
+    gramaticas += [(f"sintética ({comandos})", lambda comandos=comandos: GramaticaSintetica(comandos))
+                   for comandos in (1000, 4000)]
+    gramaticas += [(f"atribuições ({comandos})", lambda comandos=comandos: GramaticaAtribuicoes(comandos))
+                   for comandos in (1000, 4000)]
+    for nome, gramatica in gramaticas:
+        slr = SLRAnalyzer(gramatica(), algoritmo="slr", tolerar_conflitos=True)
+        lalr = SLRAnalyzer(gramatica(), algoritmo="lalr", tolerar_conflitos=True)
+        assert len(slr.states) == len(lalr.states)
+        print(f"{nome:>24} {len(lalr.states):>8} {len(slr.conflicts):>14} {len(lalr.conflicts):>15} "
+              f"{slr.build_times['lookaheads']:19.3f} {lalr.build_times['lookaheads']:20.3f} "
+              f"{sum(slr.build_times.values()):14.3f} {sum(lalr.build_times.values()):15.3f}")
+    print()
+
+
+def _script_expressoes(tamanho_alvo):
+    """Script gerado só com atribuições de expressões curtas, em que quase
+    todo operando passa pela cadeia Elemento -> Fator -> Termo -> Expressao"""
+    codigo = gerar_script(0)
+    cabecalho = codigo[:codigo.index("    LEIA")]
+    bloco = (
+        "    media = contador;\n"
+        "    media = contador + 1;\n"
+        "    media = (contador) * 2 - media;\n"
+        "    contador = contador + media / 3;\n"
+    )
+    repeticoes = max(1, (tamanho_alvo - len(cabecalho)) // len(bloco))
+    return cabecalho + bloco * repeticoes + "FIM_CENA\n"
+
+
+def benchmark_cadeias():
+    """Passos e tempo do driver SLR com e sem o atalho das reduções unitárias"""
+    print("=== Reduções unitárias: driver SLR com e sem atalhos de cadeia ===")
+    com_cadeias = SLRAnalyzer(forma="comprimida")
+    sem_cadeias = SLRAnalyzer(forma="comprimida", eliminar_cadeias=False)
+    print(f"{'entrada':>12} {'tokens':>9} {'passos sem':>11} {'passos com':>11} {'queda':>7} "
+          f"{'contar sem (s)':>15} {'contar com (s)':>15} {'ParserSLR sem (s)':>18} {'ParserSLR com (s)':>18}")
+    casos = [("misto", gerar_script), ("expressões", _script_expressoes)]
+    for nome, gerador in casos:
+        tokens, _ = LexerRegex(gerador(1024 * 1024)).tokenizar()
+        tipos = [token.tipo for token in tokens]
+        sucesso, passos_sem = sem_cadeias.contar_passos(tipos)
+        assert sucesso and com_cadeias.contar_passos(tipos)[0]
+        passos_com = com_cadeias.contar_passos(tipos)[1]
+        tempo_contar_sem = _cronometrar(lambda: sem_cadeias.contar_passos(tipos), repeticoes=5)
+        tempo_contar_com = _cronometrar(lambda: com_cadeias.contar_passos(tipos), repeticoes=5)
+        tempo_parser_sem = _cronometrar(lambda: ParserSLR(tokens, analisador=sem_cadeias).parse())
+        tempo_parser_com = _cronometrar(lambda: ParserSLR(tokens, analisador=com_cadeias).parse())
+        print(f"{nome:>12} {len(tokens):>9} {passos_sem:>11} {passos_com:>11} "
+              f"{1 - passos_com / passos_sem:6.1%} {tempo_contar_sem:15.3f} {tempo_contar_com:15.3f} "
+              f"{tempo_parser_sem:18.3f} {tempo_parser_com:18.3f}")
+    print()
+
+
+def _rastro_com_copias(analisador, tokens):
+    """O rastro de SLRAnalyzer.analisar antes dos modos de trace: cada passo
+    com uma cópia da pilha e o resto da entrada, tudo em uma lista"""
+    tipos = [token.tipo for token in tokens]
+    return [dict(passo, entrada=tipos[passo["posicao"]:])
+            for passo in analisador.analisar(tokens, trace="stream")]
+
+
+def benchmark_rastro():
+    """Tempo e pico de memória de SLRAnalyzer.analisar em cada modo de trace"""
+    print("=== Rastro do analisador SLR: cópias por passo x off, compact e stream ===")
+    analisador = analisador_padrao()
+    print(f"{'tamanho':>10} {'passos':>9} {'cópias (s)':>11} {'cópias (MB)':>12} {'off (s)':>8} "
+          f"{'compact (s)':>12} {'compact (MB)':>13} {'percorrer (s)':>14} {'stream (s)':>11} {'stream (MB)':>12}")
+    for tamanho in (16 * 1024, 256 * 1024, 1024 * 1024):
+        tokens, _ = LexerRegex(gerar_script(tamanho)).tokenizar()
+        # Memória e tempo quadráticos: só na entrada menor
+        if tamanho <= 16 * 1024:
+            tempo_copias = _cronometrar(lambda: _rastro_com_copias(analisador, tokens), repeticoes=1)
+            _, pico_copias = _pico_memoria(lambda: _rastro_com_copias(analisador, tokens))
+            copias = f"{tempo_copias:11.3f} {pico_copias:12.1f}"
+        else:
+            copias = f"{'-':>11} {'-':>12}"
+        tempo_off = _cronometrar(lambda: analisador.analisar(tokens))
+        resultado = analisador.analisar(tokens, trace="compact")
+        tempo_compact = _cronometrar(lambda: analisador.analisar(tokens, trace="compact"))
+        _, pico_compact = _pico_memoria(lambda: analisador.analisar(tokens, trace="compact"))
+        tempo_percorrer = _cronometrar(lambda: sum(1 for _ in resultado["passos_realizados"]))
+        tempo_stream = _cronometrar(lambda: sum(1 for _ in analisador.analisar(tokens, trace="stream")))
+        _, pico_stream = _pico_memoria(lambda: sum(1 for _ in analisador.analisar(tokens, trace="stream")))
+        print(f"{tamanho:>10} {resultado['passos']:>9} {copias} {tempo_off:8.3f} {tempo_compact:12.3f} "
+              f"{pico_compact:13.1f} {tempo_percorrer:14.3f} {tempo_stream:11.3f} {pico_stream:12.1f}")
+    print()
+
+
+BENCHMARKS = {
+    'lexer': benchmark_lexer,
+    'streaming': benchmark_streaming,
+    'comentarios': benchmark_comentarios,
+    'memoria_tokens': benchmark_memoria_tokens,
+    'relexar': benchmark_relexar,
+    'paralelo': benchmark_paralelo,
+    'erros': benchmark_erros,
+    'arquivo': benchmark_arquivo,
+    'expressoes': benchmark_expressoes,
+    'ast_compacta': benchmark_ast_compacta,
+    'validacao': benchmark_validacao,
+    'incremental': benchmark_incremental,
+    'cache_disco': benchmark_cache_disco,
+    'arena': benchmark_arena,
+    'slr': benchmark_slr,
+    'tabelas_slr': benchmark_tabelas_slr,
+    'passos_slr': benchmark_passos_slr,
+    'carga_slr': benchmark_carga_slr,
+    'lalr': benchmark_lalr,
+    'cadeias': benchmark_cadeias,
+    'rastro': benchmark_rastro,
+}
+
+
+if __name__ == "__main__":
+    nomes = sys.argv[1:] or list(BENCHMARKS)
+    for nome in nomes:
+        if nome not in BENCHMARKS:
+            print(f"Benchmark desconhecido: {nome}. Disponíveis: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        BENCHMARKS[nome]()
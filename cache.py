@@ -0,0 +1,527 @@
+"""Cache dos resultados da análise endereçado pelo conteúdo da fonte.
+
+O frontend costuma mandar o mesmo código para /tokenizar, /analise_sintatica,
+/analisar e /executar em sequência, e o /analisar com debounce reenvia um
+documento inalterado. O CacheAnalise guarda, por hash da fonte, os tokens, os
+erros léxicos, a AST ou o erro lançado por parse() e os diagnósticos do modo de
+recuperação, com descarte LRU limitado em bytes e em entradas.
+
+Os resultados são compartilhados entre requisições e sessões: quem os recebe
+não deve alterá-los (TokenBuffer, Programa, Comando e as listas de erros).
+"""
+
+import gc
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+from typing import List
+
+from lexer import LexerRegex
+from parser import (Parser, Programa, Personagem, Declaracao, ComandoLeitura, ComandoEscrita,
+                    ComandoAtribuicao, ExpressaoSimples, Termo, Fator, Elemento, _ErroComPosicao)
+
+# Estimativas de memória usadas no limite em bytes (medidas com tracemalloc)
+_BYTES_POR_TOKEN_AST = 250  # AST padrão (ExpressaoSimples/Termo/Fator/Elemento)
+_BYTES_POR_ERRO = 300
+_BYTES_POR_ENTRADA = 200
+
+
+def chave_da_fonte(codigo: str) -> bytes:
+    """Hash do conteúdo da fonte, usado como chave"""
+    return hashlib.blake2b(codigo.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def _tamanho_tokens(tokens, erros) -> int:
+    colunas = (tokens.tipos, tokens.inicios, tokens.fins, tokens.linhas)
+    return (len(tokens.fonte) + sum(len(coluna) * coluna.itemsize for coluna in colunas)
+            + len(erros) * _BYTES_POR_ERRO)
+
+
+class _Entrada:
+    __slots__ = ('resultados', 'tamanho')
+
+    def __init__(self):
+        self.resultados = {}  # etapa -> resultado
+        self.tamanho = _BYTES_POR_ENTRADA
+
+
+class CacheAnalise:
+    """Cache LRU, seguro entre threads, dos resultados da análise de uma fonte.
+
+    Cada etapa é calculada na primeira vez que é pedida para uma fonte:
+    - lexico(codigo): (tokens, erros_lexicos), de LexerRegex.tokenizar_buffer();
+    - sintatico(codigo): (programa, erro), de Parser.parse(): um dos dois é None;
+    - recuperado(codigo): (erros, erro_principal), do modo de recuperação.
+    `acertos` e `falhas` contam as consultas; `descartes`, as entradas removidas.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entradas: int = 256, max_erros: int = None):
+        self.max_bytes = max_bytes
+        self.max_entradas = max_entradas
+        self.max_erros = max_erros  # Limite de erros léxicos, como em LexerRegex
+        self._entradas = OrderedDict()  # chave -> _Entrada, da menos para a mais recente
+        self._bytes = 0
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+
+    def _obter(self, codigo: str, etapa: str, calcular, contar: bool = True):
+        chave = chave_da_fonte(codigo)
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                self._entradas.move_to_end(chave)
+                if etapa in entrada.resultados:
+                    if contar:
+                        self.acertos += 1
+                    return entrada.resultados[etapa]
+            if contar:
+                self.falhas += 1
+
+        # Calculado fora da trava: duas threads podem calcular a mesma etapa, e
+        # a segunda só substitui um resultado equivalente
+        resultado, tamanho = calcular()
+
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                entrada = self._entradas[chave] = _Entrada()
+                self._bytes += entrada.tamanho
+            elif etapa in entrada.resultados:
+                return entrada.resultados[etapa]
+            entrada.resultados[etapa] = resultado
+            entrada.tamanho += tamanho
+            self._bytes += tamanho
+            self._descartar()
+        return resultado
+
+    def _descartar(self):
+        """Remove as entradas menos usadas até respeitar os limites (a mais
+        recente fica, mesmo sozinha acima do limite em bytes)"""
+        while len(self._entradas) > 1 and (len(self._entradas) > self.max_entradas or
+                                           self._bytes > self.max_bytes):
+            _, entrada = self._entradas.popitem(last=False)
+            self._bytes -= entrada.tamanho
+            self.descartes += 1
+
+    def lexico(self, codigo: str):
+        """(tokens, erros_lexicos) da fonte"""
+        return self._obter(codigo, 'lexico', self._calcular_lexico(codigo))
+
+    def sintatico(self, codigo: str):
+        """(programa, None) ou (None, erro) com o ErroSintatico/ErroSemantico
+        que Parser.parse() lança"""
+        def calcular():
+            tokens, _ = self._obter(codigo, 'lexico', self._calcular_lexico(codigo), contar=False)
+            try:
+                return (Parser(tokens).parse(), None), len(tokens) * _BYTES_POR_TOKEN_AST
+            except _ErroComPosicao as erro:
+                # O traceback prenderia o parser e os tokens
+                erro.__traceback__ = None
+                return (None, erro), _BYTES_POR_ERRO
+        return self._obter(codigo, 'sintatico', calcular)
+
+    def recuperado(self, codigo: str):
+        """(erros, erro_principal) da análise com recuperar_erros=True"""
+        def calcular():
+            tokens, _ = self._obter(codigo, 'lexico', self._calcular_lexico(codigo), contar=False)
+            parser = Parser(tokens, recuperar_erros=True)
+            parser.parse()
+            for erro in parser.erros:
+                erro.__traceback__ = None
+            # A AST parcial não é guardada: /analisar só usa os erros
+            return (tuple(parser.erros), parser.erro_principal), (len(parser.erros) + 1) * _BYTES_POR_ERRO
+        return self._obter(codigo, 'recuperado', calcular)
+
+    def _calcular_lexico(self, codigo: str):
+        def calcular():
+            tokens, erros = LexerRegex(codigo, max_erros=self.max_erros).tokenizar_buffer()
+            return (tokens, tuple(erros)), _tamanho_tokens(tokens, erros)
+        return calcular
+
+    def estatisticas(self) -> dict:
+        with self._trava:
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'descartes': self.descartes,
+            }
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+            self._bytes = 0
+
+
+# Cache em disco dos programas compilados, no estilo dos .pyc: cada arquivo
+# .dramatica sem erros ganha, em __dramatica_cache__/ ao lado dele (ou em um
+# diretório de cache), a AST validada em um formato binário próprio.
+#
+# O contêiner binário (ler_conteiner/gravar_conteiner, usado também pelas
+# tabelas SLR em slr.py) é o cabeçalho _CONTEINER, os metadados de tamanho fixo
+# de quem grava e as seções, cada uma precedida do seu tamanho em bytes
+# (uint32); o hash do cabeçalho cobre metadados e seções. Aqui os metadados são
+# _METADADOS e as seções, as de _SECOES. A AST é guardada por níveis:
+# todos os Elemento, depois todos os Fator (quantos elementos cada um tem), os
+# Termo e as ExpressaoSimples, cada nível na ordem dos pais. Assim a leitura
+# monta cada nível de uma vez com map() e fatias, sem percorrer a árvore em Python.
+
+# mágico, formato, hash dos metadados e das seções, número de seções
+_CONTEINER = struct.Struct('<4sH16sH')
+_TAMANHO_SECAO = struct.Struct('<I')
+
+_MAGICO = b'DRMC'
+_FORMATO = 2
+# versão do compilador, mtime_ns e tamanho da fonte, hash da fonte
+_METADADOS = struct.Struct('<16sqq16s')
+_SECOES = (
+    'textos',             # str UTF-8 separadas por '\0': nomes, tipos e literais STRING
+    'inteiros',           # literais NUM_INTEIRO em decimal, separados por '\0'
+    'reais',              # array('d'): literais NUM_REAL
+    'cabecalho',          # array('i'): nome da cena, personagem e pares (nome, tipo) das declarações
+    'comandos_tipos',     # bytes: 0 LEIA, 1 DIZ, 2 atribuição
+    'comandos_nomes',     # array('i'): variável ou personagem (índice em textos)
+    'comandos_posicoes',  # array('i'): posição (-1 se o comando não tem)
+    'expressoes_termos',  # array('i'): quantidade de termos de cada ExpressaoSimples
+    'termos_operadores',  # bytes: operador de cada termo (índice em _OPERADORES)
+    'termos_fatores',     # array('i'): quantidade de fatores de cada Termo
+    'fatores_operadores',
+    'fatores_elementos',  # array('i'): quantidade de elementos de cada Fator
+    'elementos_operadores',
+    'elementos_tipos',    # bytes: índice em _TIPOS_ELEMENTO
+    'elementos_valores',  # array('i'): índice no conjunto textos + inteiros + reais + [None]
+    'elementos_posicoes',
+    'subexpressoes',      # array('i'): pares (elemento EXPRESSAO, expressão)
+)
+_OPERADORES = ('', '+', '-', '*', '/', '^')  # '' no primeiro item de cada nível
+_CODIGO_OPERADOR = {operador: codigo for codigo, operador in enumerate(_OPERADORES)}
+_TIPOS_ELEMENTO = ('IDENTIFICADOR', 'NUM_INTEIRO', 'NUM_REAL', 'STRING', 'EXPRESSAO')
+_CODIGO_TIPO_ELEMENTO = {tipo: codigo for codigo, tipo in enumerate(_TIPOS_ELEMENTO)}
+_NOME_DIRETORIO_CACHE = '__dramatica_cache__'
+
+
+def _calcular_versao() -> bytes:
+    """Identifica o compilador: o formato, a plataforma e o código dos módulos que
+    produzem a AST. Qualquer mudança neles invalida os arquivos em cache."""
+    resumo = hashlib.blake2b(digest_size=16)
+    resumo.update(f"{_FORMATO} {sys.byteorder} {array('i').itemsize} {sys.version_info[:2]}".encode())
+    for modulo in ('tokens', 'lexer', 'parser'):
+        with open(sys.modules[modulo].__file__, 'rb') as arquivo:
+            resumo.update(arquivo.read())
+    return resumo.digest()
+
+
+VERSAO_COMPILADOR = _calcular_versao()
+
+
+def codificar_programa(programa: Programa) -> List[bytes]:
+    """Serializa um Programa produzido por Parser.parse() (AST padrão, com as
+    posições preenchidas) nas seções de _SECOES"""
+    textos = {}
+
+    def texto(valor: str) -> int:
+        indice = textos.get(valor)
+        if indice is None:
+            indice = textos[valor] = len(textos)
+        return indice
+
+    inteiros = []
+    reais = array('d')
+    cabecalho = array('i', [texto(programa.nome_cena), texto(programa.personagem.nome)])
+    for declaracao in programa.personagem.declaracoes:
+        cabecalho.extend((texto(declaracao.nome), texto(declaracao.tipo)))
+
+    comandos_tipos = bytearray()
+    comandos_nomes = array('i')
+    comandos_posicoes = array('i')
+    expressoes = []
+    for comando in programa.comandos:
+        if isinstance(comando, ComandoLeitura):
+            comandos_tipos.append(0)
+            comandos_nomes.append(texto(comando.variavel))
+        elif isinstance(comando, ComandoEscrita):
+            comandos_tipos.append(1)
+            comandos_nomes.append(texto(comando.personagem))
+        else:
+            comandos_tipos.append(2)
+            comandos_nomes.append(texto(comando.variavel))
+        posicao = getattr(comando, 'posicao', None)
+        comandos_posicoes.append(-1 if posicao is None else posicao)
+        if not isinstance(comando, ComandoLeitura):
+            expressoes.append(comando.expressao)
+
+    niveis = {nome: array('i') for nome in ('expressoes_termos', 'termos_fatores', 'fatores_elementos',
+                                            'elementos_posicoes', 'subexpressoes')}
+    niveis.update((nome, bytearray()) for nome in ('termos_operadores', 'fatores_operadores',
+                                                   'elementos_operadores'))
+    operador = _CODIGO_OPERADOR.__getitem__
+    elementos_tipos = bytearray()
+    valores = []  # (tipo do valor, índice local)
+    termos, fatores, elementos = [], [], []
+    # Nível a nível; uma subexpressão encontrada entre os elementos entra no fim
+    # da lista de expressões e é processada na próxima volta
+    feitos = [0, 0, 0, 0]
+    while feitos[0] < len(expressoes):
+        for expressao in expressoes[feitos[0]:]:
+            if not isinstance(expressao, ExpressaoSimples):
+                raise TypeError("codificar_programa espera a AST padrão (use expandir_ast)")
+            niveis['expressoes_termos'].append(len(expressao.termos))
+            for simbolo, termo in expressao.termos:
+                niveis['termos_operadores'].append(operador(simbolo))
+                termos.append(termo)
+        feitos[0] = len(expressoes)
+        for termo in termos[feitos[1]:]:
+            niveis['termos_fatores'].append(len(termo.fatores))
+            for simbolo, fator in termo.fatores:
+                niveis['fatores_operadores'].append(operador(simbolo))
+                fatores.append(fator)
+        feitos[1] = len(termos)
+        for fator in fatores[feitos[2]:]:
+            niveis['fatores_elementos'].append(len(fator.elementos))
+            for simbolo, elemento in fator.elementos:
+                niveis['elementos_operadores'].append(operador(simbolo))
+                elementos.append(elemento)
+        feitos[2] = len(fatores)
+        for indice in range(feitos[3], len(elementos)):
+            elemento = elementos[indice]
+            elementos_tipos.append(_CODIGO_TIPO_ELEMENTO[elemento.tipo])
+            niveis['elementos_posicoes'].append(elemento.posicao)
+            if elemento.tipo == 'EXPRESSAO':
+                niveis['subexpressoes'].extend((indice, len(expressoes)))
+                expressoes.append(elemento.valor)
+                valores.append((3, 0))
+            elif elemento.tipo == 'NUM_INTEIRO':
+                valores.append((1, len(inteiros)))
+                inteiros.append(str(elemento.valor))
+            elif elemento.tipo == 'NUM_REAL':
+                valores.append((2, len(reais)))
+                reais.append(elemento.valor)
+            else:
+                valores.append((0, texto(elemento.valor)))
+        feitos[3] = len(elementos)
+
+    # Índices no conjunto textos + inteiros + reais + [None]
+    inicios = (0, len(textos), len(textos) + len(inteiros), len(textos) + len(inteiros) + len(reais))
+    elementos_valores = array('i', [inicios[tipo] + indice for tipo, indice in valores])
+
+    secoes = {
+        'textos': '\0'.join(textos).encode('utf-8', 'surrogatepass'),
+        'inteiros': '\0'.join(inteiros).encode('ascii'),
+        'reais': reais.tobytes(),
+        'cabecalho': cabecalho.tobytes(),
+        'comandos_tipos': bytes(comandos_tipos),
+        'comandos_nomes': comandos_nomes.tobytes(),
+        'comandos_posicoes': comandos_posicoes.tobytes(),
+        'elementos_tipos': bytes(elementos_tipos),
+        'elementos_valores': elementos_valores.tobytes(),
+    }
+    secoes.update((nome, bytes(nivel)) for nome, nivel in niveis.items())
+    return [secoes[nome] for nome in _SECOES]
+
+
+def _inteiros(dados: bytes) -> array:
+    numeros = array('i')
+    numeros.frombytes(dados)
+    return numeros
+
+
+def _fatias(contagens: array):
+    """slices consecutivos com os tamanhos dados"""
+    fins = list(accumulate(contagens))
+    return map(slice, [0] + fins[:-1], fins)
+
+
+def decodificar_programa(secoes: List[bytes]) -> Programa:
+    """Reconstrói o Programa serializado por codificar_programa"""
+    # A AST não tem ciclos: as coletas do gc durante a criação de centenas de
+    # milhares de nós só custariam tempo (mais que a própria montagem)
+    coletor_ativo = gc.isenabled()
+    gc.disable()
+    try:
+        return _montar_programa(dict(zip(_SECOES, secoes)))
+    finally:
+        if coletor_ativo:
+            gc.enable()
+
+
+def _montar_programa(secoes: dict) -> Programa:
+    textos = secoes['textos'].decode('utf-8', 'surrogatepass').split('\0')
+    texto = textos.__getitem__
+    operadores = _OPERADORES.__getitem__
+    reais = array('d')
+    reais.frombytes(secoes['reais'])
+    conjunto = textos + list(map(int, secoes['inteiros'].decode('ascii').split('\0'))) if secoes['inteiros'] else textos[:]
+    conjunto += reais.tolist()
+    conjunto.append(None)
+
+    # Elementos, depois cada nível agrupando as fatias do nível de baixo
+    elementos = list(map(Elemento, map(conjunto.__getitem__, _inteiros(secoes['elementos_valores'])),
+                         map(_TIPOS_ELEMENTO.__getitem__, secoes['elementos_tipos']),
+                         _inteiros(secoes['elementos_posicoes'])))
+    pares = list(zip(map(operadores, secoes['elementos_operadores']), elementos))
+    fatores = list(map(Fator, map(pares.__getitem__, _fatias(_inteiros(secoes['fatores_elementos'])))))
+    pares = list(zip(map(operadores, secoes['fatores_operadores']), fatores))
+    termos = list(map(Termo, map(pares.__getitem__, _fatias(_inteiros(secoes['termos_fatores'])))))
+    pares = list(zip(map(operadores, secoes['termos_operadores']), termos))
+    expressoes = list(map(ExpressaoSimples, map(pares.__getitem__, _fatias(_inteiros(secoes['expressoes_termos'])))))
+    subexpressoes = _inteiros(secoes['subexpressoes'])
+    for indice, expressao in zip(subexpressoes[::2], subexpressoes[1::2]):
+        elementos[indice].valor = expressoes[expressao]
+
+    comandos = []
+    raizes = iter(expressoes)
+    for tipo, nome, posicao in zip(secoes['comandos_tipos'], map(texto, _inteiros(secoes['comandos_nomes'])),
+                                   _inteiros(secoes['comandos_posicoes'])):
+        if posicao < 0:
+            posicao = None
+        if tipo == 0:
+            comandos.append(ComandoLeitura(nome, posicao))
+        elif tipo == 1:
+            comandos.append(ComandoEscrita(nome, next(raizes)))
+        else:
+            comandos.append(ComandoAtribuicao(nome, next(raizes), posicao))
+
+    cabecalho = list(map(texto, _inteiros(secoes['cabecalho'])))
+    declaracoes = list(map(Declaracao, cabecalho[2::2], cabecalho[3::2]))
+    return Programa(cabecalho[0], Personagem(cabecalho[1], declaracoes), comandos)
+
+
+def caminho_do_cache(caminho: str, diretorio_cache: str = None) -> str:
+    """Arquivo de cache de um script: __dramatica_cache__/<nome>.dmc ao lado dele
+    ou, com diretorio_cache, <nome>.<hash do caminho>.dmc nesse diretório"""
+    nome = os.path.basename(caminho)
+    if diretorio_cache is None:
+        return os.path.join(os.path.dirname(caminho), _NOME_DIRETORIO_CACHE, nome + '.dmc')
+    absoluto = os.path.abspath(caminho).encode('utf-8', 'surrogateescape')
+    return os.path.join(diretorio_cache, f"{nome}.{hashlib.blake2b(absoluto, digest_size=8).hexdigest()}.dmc")
+
+
+def ler_conteiner(arquivo_cache: str, magico: bytes, formato: int, tamanho_metadados: int, quantidade: int):
+    """(metadados, seções) de um arquivo no contêiner binário dos caches em
+    disco, se ele tiver o mágico, o formato e o número de seções esperados e o
+    hash conferir; None caso contrário (inclusive se não puder ser lido)."""
+    try:
+        with open(arquivo_cache, 'rb') as arquivo:
+            dados = arquivo.read()
+    except OSError:
+        return None
+    inicio = _CONTEINER.size + tamanho_metadados
+    if len(dados) < inicio:
+        return None
+    magico_arquivo, formato_arquivo, hash_dados, quantidade_arquivo = _CONTEINER.unpack_from(dados)
+    if magico_arquivo != magico or formato_arquivo != formato or quantidade_arquivo != quantidade:
+        return None
+    visao = memoryview(dados)
+    if hashlib.blake2b(visao[_CONTEINER.size:], digest_size=16).digest() != hash_dados:
+        return None  # Arquivo danificado
+    secoes = []
+    posicao = inicio
+    for _ in range(quantidade):
+        if posicao + _TAMANHO_SECAO.size > len(dados):
+            return None
+        tamanho_secao, = _TAMANHO_SECAO.unpack_from(dados, posicao)
+        posicao += _TAMANHO_SECAO.size
+        secoes.append(visao[posicao:posicao + tamanho_secao].tobytes())
+        posicao += tamanho_secao
+    if posicao != len(dados):
+        return None
+    return dados[_CONTEINER.size:inicio], secoes
+
+
+def gravar_conteiner(arquivo_cache: str, magico: bytes, formato: int, metadados: bytes, secoes: List[bytes]):
+    """Grava o contêiner de forma atômica: um arquivo temporário no mesmo
+    diretório renomeado por cima do antigo, para que processos concorrentes
+    nunca leiam um arquivo pela metade. Falhas (ex.: diretório somente
+    leitura) são ignoradas."""
+    partes = [metadados]
+    for secao in secoes:
+        partes.append(_TAMANHO_SECAO.pack(len(secao)))
+        partes.append(secao)
+    dados = b''.join(partes)
+    cabecalho = _CONTEINER.pack(magico, formato, hashlib.blake2b(dados, digest_size=16).digest(), len(secoes))
+    diretorio = os.path.dirname(arquivo_cache) or '.'
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.tmp-',
+                                                 suffix=os.path.splitext(arquivo_cache)[1])
+    except OSError:
+        return
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            arquivo.write(cabecalho)
+            arquivo.write(dados)
+        os.replace(temporario, arquivo_cache)
+    except OSError:
+        try:
+            os.unlink(temporario)
+        except OSError:
+            pass
+
+
+def _ler_cache(arquivo_cache: str, estado: os.stat_result, ler_fonte):
+    """Seções do cache se ele for desta versão do compilador e da fonte atual;
+    None caso contrário. A fonte só é lida (e comparada pelo hash) se o mtime ou
+    o tamanho mudaram."""
+    conteudo = ler_conteiner(arquivo_cache, _MAGICO, _FORMATO, _METADADOS.size, len(_SECOES))
+    if conteudo is None:
+        return None
+    metadados, secoes = conteudo
+    versao, mtime, tamanho, hash_fonte = _METADADOS.unpack(metadados)
+    if versao != VERSAO_COMPILADOR:
+        return None
+    if (mtime, tamanho) != (estado.st_mtime_ns, estado.st_size):
+        if hashlib.blake2b(ler_fonte(), digest_size=16).digest() != hash_fonte:
+            return None
+    return secoes
+
+
+def _gravar_cache(arquivo_cache: str, estado: os.stat_result, fonte: bytes, secoes: List[bytes]):
+    metadados = _METADADOS.pack(VERSAO_COMPILADOR, estado.st_mtime_ns, estado.st_size,
+                                hashlib.blake2b(fonte, digest_size=16).digest())
+    gravar_conteiner(arquivo_cache, _MAGICO, _FORMATO, metadados, secoes)
+
+
+def carregar_programa(caminho: str, diretorio_cache: str = None):
+    """Analisa um script .dramatica usando o cache em disco e retorna
+    (programa, erros_lexicos).
+
+    Se houver um cache desta versão do compilador para a fonte atual, a AST vem
+    dele, sem análise léxica nem sintática (erros_lexicos é vazio: só programas
+    sem erros são gravados). Senão o arquivo é analisado com LexerRegex e
+    Parser.parse(), que lança ErroSintatico/ErroSemantico como de costume, e a
+    AST de um programa sem erros é gravada para a próxima vez.
+    """
+    estado = os.stat(caminho)
+    arquivo_cache = caminho_do_cache(caminho, diretorio_cache)
+    fonte = None
+
+    def ler_fonte() -> bytes:
+        nonlocal fonte
+        if fonte is None:
+            with open(caminho, 'rb') as arquivo:
+                fonte = arquivo.read()
+        return fonte
+
+    secoes = _ler_cache(arquivo_cache, estado, ler_fonte)
+    if secoes is not None:
+        if fonte is not None:
+            # mtime ou tamanho mudaram mas o conteúdo não: atualiza o cabeçalho
+            # para as próximas leituras não precisarem ler a fonte
+            _gravar_cache(arquivo_cache, estado, fonte, secoes)
+        return decodificar_programa(secoes), []
+
+    codigo = ler_fonte().decode('utf-8')
+    tokens_fonte, erros_lexicos = LexerRegex(codigo).tokenizar_buffer()
+    programa = Parser(tokens_fonte).parse()
+    if not erros_lexicos:
+        _gravar_cache(arquivo_cache, estado, fonte, codificar_programa(programa))
+    return programa, erros_lexicos
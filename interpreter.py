@@ -2,6 +2,7 @@
 
 from typing import Dict, Any, Union
 from parser import *
+from arena import ProgramaArena, BINARIO, NOME, STRING, LEIA, DIZ, OPERADORES
 
 class InterpretadorPiLang:
     def __init__(self):
@@ -15,7 +16,7 @@ class InterpretadorPiLang:
         self.entrada_simulada = valores
         self.indice_entrada = 0
     
-    def executar_programa(self, programa: Programa):
+    def executar_programa(self, programa: Union[Programa, ProgramaArena]):
         """Executa um programa DRAMATICA completo"""
         print(f"\n=== EXECUÇÃO DA CENA: {programa.nome_cena} ===")
         print(f"Personagem: {programa.personagem.nome}")
@@ -32,8 +33,11 @@ class InterpretadorPiLang:
             print(f"Declarada: {declaracao.nome}: {declaracao.tipo}")
         
         # Executa os comandos
-        for comando in programa.comandos:
-            self.executar_comando(comando)
+        if isinstance(programa, ProgramaArena):
+            self.executar_arena(programa)
+        else:
+            for comando in programa.comandos:
+                self.executar_comando(comando)
         
         print("\n=== ESTADO FINAL DAS VARIÁVEIS ===")
         for nome, valor in self.variaveis.items():
@@ -48,6 +52,26 @@ class InterpretadorPiLang:
         elif isinstance(comando, ComandoAtribuicao):
             self.executar_atribuicao(comando)
     
+    def executar_arena(self, arena: ProgramaArena):
+        """Executa os comandos de um ProgramaArena direto dos arranjos, com a
+        mesma saída de executar_comando"""
+        nomes = arena.nomes
+        for tipo, nome, raiz, posicao in zip(arena.comandos_tipos, arena.comandos_nomes,
+                                              arena.comandos_expressoes, arena.comandos_posicoes):
+            if tipo == LEIA:
+                self.executar_leia(ComandoLeitura(nomes[nome]))
+                continue
+            try:
+                valor = self.avaliar_arena(arena, raiz)
+            except Exception as e:
+                print(f"Erro ao executar {'diz' if tipo == DIZ else 'atribuição'}: {e}")
+                continue
+            if tipo == DIZ:
+                print(f"{nomes[nome]} diz: {valor}")
+            else:
+                self.variaveis[nomes[nome]] = valor
+                print(f"{nomes[nome]} = {valor}")
+
     def executar_leia(self, comando: ComandoLeitura):
         """Executa comando LEIA com validação de tipos"""
         nome_variavel = comando.variavel
@@ -144,6 +168,8 @@ class InterpretadorPiLang:
         """Avalia uma expressão e retorna seu valor"""
         if isinstance(expressao, ExpressaoSimples):
             return self.avaliar_expressao_simples(expressao)
+        elif isinstance(expressao, NoCompacto):
+            return self.avaliar_compacta(expressao)
         else:
             raise Exception(f"Tipo de expressão não suportado: {type(expressao)}")
     
@@ -251,6 +277,106 @@ class InterpretadorPiLang:
         else:
             raise Exception(f"Tipo de elemento não suportado: {elemento.tipo}")
     
+    def avaliar_compacta(self, no: NoCompacto) -> Union[int, float, str]:
+        """Avalia uma expressão da AST compacta com uma pilha explícita.
+        Os operandos são avaliados na mesma ordem de avaliar_expressao_simples:
+        da esquerda para a direita, exceto em '^', que avalia a direita primeiro."""
+        valores = []
+        pendentes = [no]
+        while pendentes:
+            no = pendentes.pop()
+            if isinstance(no, str):
+                # Operador cujos dois operandos já estão em valores
+                if no == '^':
+                    esquerda = valores.pop()
+                    direita = valores.pop()
+                else:
+                    direita = valores.pop()
+                    esquerda = valores.pop()
+                valores.append(self._aplicar_operador(no, esquerda, direita))
+            elif isinstance(no, Binario):
+                pendentes.append(no.operador)
+                if no.operador == '^':
+                    pendentes.append(no.esquerda)
+                    pendentes.append(no.direita)
+                else:
+                    pendentes.append(no.direita)
+                    pendentes.append(no.esquerda)
+            elif isinstance(no, Nome):
+                if no.nome not in self.variaveis or self.variaveis[no.nome] is None:
+                    raise Exception(f"Variável '{no.nome}' não inicializada")
+                valores.append(self.variaveis[no.nome])
+            elif no.tipo == 'STRING':
+                valores.append(no.valor.strip('"\''))
+            else:
+                valores.append(no.valor)
+        return valores[0]
+    
+    def avaliar_arena(self, arena: ProgramaArena, raiz: int) -> Union[int, float, str]:
+        """avaliar_compacta sobre os arranjos do ProgramaArena: a pilha guarda
+        índices de nós, e ~índice marca um operador com os operandos já avaliados"""
+        tipos, operadores = arena.tipos, arena.operadores
+        esquerdas, direitas, indices = arena.esquerdas, arena.direitas, arena.valores
+        constantes, nomes, variaveis = arena.constantes, arena.nomes, self.variaveis
+        potencia = OPERADORES.index('^')
+        valores = []
+        pendentes = [raiz]
+        while pendentes:
+            no = pendentes.pop()
+            if no < 0:
+                no = ~no
+                operador = operadores[no]
+                if operador == potencia:
+                    esquerda = valores.pop()
+                    direita = valores.pop()
+                else:
+                    direita = valores.pop()
+                    esquerda = valores.pop()
+                valores.append(self._aplicar_operador(OPERADORES[operador], esquerda, direita))
+                continue
+            tipo = tipos[no]
+            if tipo == BINARIO:
+                pendentes.append(~no)
+                if operadores[no] == potencia:
+                    pendentes.append(esquerdas[no])
+                    pendentes.append(direitas[no])
+                else:
+                    pendentes.append(direitas[no])
+                    pendentes.append(esquerdas[no])
+            elif tipo == NOME:
+                nome = nomes[indices[no]]
+                if variaveis.get(nome) is None:
+                    raise Exception(f"Variável '{nome}' não inicializada")
+                valores.append(variaveis[nome])
+            elif tipo == STRING:
+                valores.append(constantes[indices[no]].strip('"\''))
+            else:
+                valores.append(constantes[indices[no]])
+        return valores[0]
+    
+    def _aplicar_operador(self, operador: str, esquerda, direita) -> Union[int, float, str]:
+        """Aplica um operador binário como avaliar_expressao_simples/termo/fator"""
+        if operador == '+':
+            if isinstance(esquerda, str) or isinstance(direita, str):
+                return str(esquerda) + str(direita)
+            esquerda += direita
+        elif operador == '-':
+            if isinstance(esquerda, str) or isinstance(direita, str):
+                raise Exception("Operador '-' não pode ser usado com strings")
+            esquerda -= direita
+        elif operador == '*':
+            esquerda *= direita
+        elif operador == '/':
+            if direita == 0:
+                raise Exception("Divisão por zero")
+            esquerda /= direita
+        elif operador == '^':
+            esquerda = esquerda ** direita
+        else:
+            raise Exception(f"Operador não suportado: {operador}")
+        # Operadores aumentados, como no laço de avaliar_expressao_simples/termo
+        return esquerda
+    
     def limpar(self):
         """Limpa o estado do interpretador"""
         self.variaveis.clear()
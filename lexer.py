@@ -1,12 +1,25 @@
-from tokens import Token, TipoToken, PALAVRAS_RESERVADAS
+import io
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from tokens import Token, TipoToken, TokenBuffer, TokenBufferMapeado, IndiceLinhas, CODIGO_DO_TIPO, PALAVRAS_RESERVADAS
 
 class Lexer:
-    def __init__(self, codigo_fonte):
+    def __init__(self, codigo_fonte, manter_comentarios=False, max_erros=None):
         self.codigo_fonte = codigo_fonte
         self.posicao = 0
-        self.linha = 1
-        self.coluna = 1
+        # Tokens guardam só a posição; linha/coluna são consultadas neste índice
+        self.mapa_linhas = IndiceLinhas(codigo_fonte)
         self.codigo_fonte += '\0'  # Marcador de fim de arquivo
+        # Se ativo, os comentários são anexados ao próximo token como trivia
+        self.manter_comentarios = manter_comentarios
+        # Limite de erros léxicos guardados (None = sem limite)
+        self.max_erros = max_erros
         
     def proximo_caractere(self):
         if self.posicao < len(self.codigo_fonte):
@@ -15,30 +28,39 @@ class Lexer:
     
     def avancar(self):
         if self.posicao < len(self.codigo_fonte) and self.codigo_fonte[self.posicao] != '\0':
-            if self.codigo_fonte[self.posicao] == '\n':
-                self.linha += 1
-                self.coluna = 1
-            else:
-                self.coluna += 1
             self.posicao += 1
     
     def pular_espaco_branco(self):
         while self.proximo_caractere() in ' \t\n\r':
             self.avancar()
     
+    def pular_trivia(self):
+        """Descarta espaços e comentários em um laço, sem recursão.
+        Retorna os intervalos (inicio, fim) dos comentários encontrados."""
+        comentarios = []
+        while True:
+            self.pular_espaco_branco()
+            if (self.proximo_caractere() == '/' and self.posicao + 1 < len(self.codigo_fonte)
+                    and self.codigo_fonte[self.posicao + 1] == '/'):
+                comentarios.append(self.estado_comentario())
+            else:
+                return comentarios
+    
     def estado_q0(self):
         """Estado inicial do autômato - decide qual caminho seguir"""
-        self.pular_espaco_branco()
-        
+        comentarios = self.pular_trivia()
+        token = self.estado_token()
+        if comentarios and self.manter_comentarios:
+            token.trivia = tuple(comentarios)
+        return token
+    
+    def estado_token(self):
+        """Reconhece um token a partir do caractere atual (sem espaços nem comentários)"""
         char = self.proximo_caractere()
         
         # Fim do arquivo
         if char == '\0':
-            return Token(TipoToken.EOF, '', self.linha, self.coluna)
-        
-        # Comentários (maior prioridade)
-        if char == '/':
-            return self.estado_comentario()
+            return Token(TipoToken.EOF, '', self.posicao, self.mapa_linhas)
         
         # Strings (aspas duplas)
         elif char == '"':
@@ -52,43 +74,34 @@ class Lexer:
         elif char.isdigit():
             return self.estado_numero()
         
-        # Operadores e símbolos
+        # Operadores e símbolos ('/' isolado é divisão; '//' já foi consumido como trivia)
         elif char in '+-*/^=:;()[]{}"\'!,.>':
             return self.estado_operador()
         
         # Caractere inválido
         else:
-            token = Token(TipoToken.ERRO, char, self.linha, self.coluna)
+            token = Token(TipoToken.ERRO, char, self.posicao, self.mapa_linhas)
             self.avancar()
             return token
     
     def estado_comentario(self):
-        """Estado para reconhecimento de comentários //"""
-        linha_inicial = self.linha
-        coluna_inicial = self.coluna
+        """Estado para reconhecimento de comentários //.
+        Consome o comentário até o fim da linha e retorna o intervalo (inicio, fim)."""
+        inicio = self.posicao
+        
+        # Consome os dois '/'
+        self.avancar()
+        self.avancar()
         
-        # O caractere atual já é '/', avança para verificar o próximo
-        self.avancar()  # Consome o primeiro '/'
+        # Consome tudo até o fim da linha
+        while self.proximo_caractere() != '\n' and self.proximo_caractere() != '\0':
+            self.avancar()
         
-        # Verifica se o próximo caractere também é '/'
-        if self.proximo_caractere() == '/':
-            self.avancar()  # Consome o segundo '/'
-            
-            # Consome tudo até o fim da linha
-            while self.proximo_caractere() != '\n' and self.proximo_caractere() != '\0':
-                self.avancar()
-            
-            # Retorna ao estado inicial para encontrar o próximo token
-            return self.estado_q0()
-        else:
-            # Era apenas um '/', retorna operador de divisão
-            # O primeiro '/' já foi consumido, então retornamos o token correto
-            return Token(TipoToken.OP_DIVISAO, '/', linha_inicial, coluna_inicial)
+        return (inicio, self.posicao)
     
     def estado_string(self):
         """Estado para reconhecimento de strings entre aspas duplas"""
-        linha_inicial = self.linha
-        coluna_inicial = self.coluna
+        inicio = self.posicao
         lexema = '"'  # Inclui a aspas inicial
         
         # Consome a aspas inicial
@@ -98,7 +111,7 @@ class Lexer:
         while self.proximo_caractere() != '"' and self.proximo_caractere() != '\0':
             # Se encontrar quebra de linha sem fechar aspas, é erro
             if self.proximo_caractere() == '\n':
-                token = Token(TipoToken.ERRO, lexema, linha_inicial, coluna_inicial)
+                token = Token(TipoToken.ERRO, lexema, inicio, self.mapa_linhas)
                 return token
             
             lexema += self.proximo_caractere()
@@ -108,15 +121,14 @@ class Lexer:
         if self.proximo_caractere() == '"':
             lexema += '"'  # Inclui a aspas final
             self.avancar()
-            return Token(TipoToken.STRING, lexema, linha_inicial, coluna_inicial)
+            return Token(TipoToken.STRING, lexema, inicio, self.mapa_linhas)
         else:
             # String não fechada (fim de arquivo)
-            return Token(TipoToken.ERRO, lexema, linha_inicial, coluna_inicial)
+            return Token(TipoToken.ERRO, lexema, inicio, self.mapa_linhas)
     
     def estado_palavra(self):
         """Estado para reconhecimento de palavras reservadas e identificadores"""
-        linha_inicial = self.linha
-        coluna_inicial = self.coluna
+        inicio = self.posicao
         lexema = ''
         
         # Consome letras, números e underscores
@@ -126,14 +138,13 @@ class Lexer:
         
         # Verifica se é palavra reservada
         if lexema in PALAVRAS_RESERVADAS:
-            return Token(PALAVRAS_RESERVADAS[lexema], lexema, linha_inicial, coluna_inicial)
+            return Token(PALAVRAS_RESERVADAS[lexema], lexema, inicio, self.mapa_linhas)
         else:
-            return Token(TipoToken.IDENTIFICADOR, lexema, linha_inicial, coluna_inicial)
+            return Token(TipoToken.IDENTIFICADOR, lexema, inicio, self.mapa_linhas)
     
     def estado_numero(self):
         """Estado para reconhecimento de números inteiros e reais"""
-        linha_inicial = self.linha
-        coluna_inicial = self.coluna
+        inicio = self.posicao
         lexema = ''
         tem_ponto = False
         
@@ -160,64 +171,63 @@ class Lexer:
             else:
                 # Ponto sem dígitos depois - trata como número inteiro
                 # O ponto já foi consumido, então retorna o número inteiro
-                return Token(TipoToken.NUM_INTEIRO, lexema, linha_inicial, coluna_inicial)
+                return Token(TipoToken.NUM_INTEIRO, lexema, inicio, self.mapa_linhas)
         
         # Classifica o token
         if tem_ponto:
-            return Token(TipoToken.NUM_REAL, lexema, linha_inicial, coluna_inicial)
+            return Token(TipoToken.NUM_REAL, lexema, inicio, self.mapa_linhas)
         else:
-            return Token(TipoToken.NUM_INTEIRO, lexema, linha_inicial, coluna_inicial)
+            return Token(TipoToken.NUM_INTEIRO, lexema, inicio, self.mapa_linhas)
     
     def estado_operador(self):
         """Estado para reconhecimento de operadores e símbolos de pontuação"""
         char = self.proximo_caractere()
-        linha_inicial = self.linha
-        coluna_inicial = self.coluna
+        inicio = self.posicao
         
         self.avancar()
         
         if char == '+':
-            return Token(TipoToken.OP_ADICAO, '+', linha_inicial, coluna_inicial)
+            return Token(TipoToken.OP_ADICAO, '+', inicio, self.mapa_linhas)
         elif char == '-':
-            return Token(TipoToken.OP_SUBTRACAO, '-', linha_inicial, coluna_inicial)
+            return Token(TipoToken.OP_SUBTRACAO, '-', inicio, self.mapa_linhas)
         elif char == '*':
-            return Token(TipoToken.OP_MULTIPLICACAO, '*', linha_inicial, coluna_inicial)
+            return Token(TipoToken.OP_MULTIPLICACAO, '*', inicio, self.mapa_linhas)
         elif char == '/':
-            return Token(TipoToken.OP_DIVISAO, '/', linha_inicial, coluna_inicial)
+            return Token(TipoToken.OP_DIVISAO, '/', inicio, self.mapa_linhas)
         elif char == '^':
-            return Token(TipoToken.OP_POTENCIACAO, '^', linha_inicial, coluna_inicial)
+            return Token(TipoToken.OP_POTENCIACAO, '^', inicio, self.mapa_linhas)
         elif char == '=':
-            return Token(TipoToken.OP_ATRIBUICAO, '=', linha_inicial, coluna_inicial)
+            return Token(TipoToken.OP_ATRIBUICAO, '=', inicio, self.mapa_linhas)
         elif char == ':':
-            return Token(TipoToken.DOIS_PONTOS, ':', linha_inicial, coluna_inicial)
+            return Token(TipoToken.DOIS_PONTOS, ':', inicio, self.mapa_linhas)
         elif char == ';':
-            return Token(TipoToken.PONTO_VIRGULA, ';', linha_inicial, coluna_inicial)
+            return Token(TipoToken.PONTO_VIRGULA, ';', inicio, self.mapa_linhas)
         elif char == '(':
-            return Token(TipoToken.PARENTESE_ESQ, '(', linha_inicial, coluna_inicial)
+            return Token(TipoToken.PARENTESE_ESQ, '(', inicio, self.mapa_linhas)
         elif char == ')':
-            return Token(TipoToken.PARENTESE_DIR, ')', linha_inicial, coluna_inicial)
+            return Token(TipoToken.PARENTESE_DIR, ')', inicio, self.mapa_linhas)
         elif char == '[':
-            return Token(TipoToken.COLCHETE_ESQ, '[', linha_inicial, coluna_inicial)
+            return Token(TipoToken.COLCHETE_ESQ, '[', inicio, self.mapa_linhas)
         elif char == ']':
-            return Token(TipoToken.COLCHETE_DIR, ']', linha_inicial, coluna_inicial)
+            return Token(TipoToken.COLCHETE_DIR, ']', inicio, self.mapa_linhas)
         elif char == '{':
-            return Token(TipoToken.CHAVE_ESQ, '{', linha_inicial, coluna_inicial)
+            return Token(TipoToken.CHAVE_ESQ, '{', inicio, self.mapa_linhas)
         elif char == '}':
-            return Token(TipoToken.CHAVE_DIR, '}', linha_inicial, coluna_inicial)
+            return Token(TipoToken.CHAVE_DIR, '}', inicio, self.mapa_linhas)
         elif char == ',':
-            return Token(TipoToken.VIRGULA, ',', linha_inicial, coluna_inicial)
+            return Token(TipoToken.VIRGULA, ',', inicio, self.mapa_linhas)
         elif char == '.':
-            return Token(TipoToken.PONTO, '.', linha_inicial, coluna_inicial)
+            return Token(TipoToken.PONTO, '.', inicio, self.mapa_linhas)
         elif char == '!':
-            return Token(TipoToken.EXCLAMACAO, '!', linha_inicial, coluna_inicial)
+            return Token(TipoToken.EXCLAMACAO, '!', inicio, self.mapa_linhas)
         elif char == '>':
-            return Token(TipoToken.MAIOR_QUE, '>', linha_inicial, coluna_inicial)
+            return Token(TipoToken.MAIOR_QUE, '>', inicio, self.mapa_linhas)
         elif char == '"':
             # Aspas duplas são tratadas em estado_string(), mas incluímos aqui como fallback
-            return Token(TipoToken.ASPAS_DUPLAS, '"', linha_inicial, coluna_inicial)
+            return Token(TipoToken.ASPAS_DUPLAS, '"', inicio, self.mapa_linhas)
         elif char == "'":
             # Aspas simples (pode ser usado em alguns contextos)
-            return Token(TipoToken.ASPAS_DUPLAS, "'", linha_inicial, coluna_inicial)
+            return Token(TipoToken.ASPAS_DUPLAS, "'", inicio, self.mapa_linhas)
     
     def proximo_token(self):
         """Método principal que retorna o próximo token"""
@@ -229,20 +239,77 @@ class Lexer:
         """Tokeniza todo o código fonte e retorna uma lista de tokens e uma lista de erros."""
         tokens = []
         erros = []
+        coletor = _ColetorErros(erros, self.max_erros)
         token = self.proximo_token()
         
         while token.tipo != TipoToken.EOF:
             if token.tipo == TipoToken.ERRO:
                 # Adiciona o erro na lista em vez de imprimir
-                erros.append(f"Erro léxico na linha {token.linha}, coluna {token.coluna}: caractere inválido '{token.lexema}'")
+                coletor.adicionar(self.codigo_fonte, 0, token.posicao, token.posicao + len(token.lexema),
+                                  mapa_linhas=self.mapa_linhas)
             else:
                 tokens.append(token)
             
             token = self.proximo_token()
         
         tokens.append(token)  # Adiciona o token EOF
+        coletor.finalizar()
         return tokens, erros
 
+    @classmethod
+    def iter_tokens(cls, fonte, erros=None, tamanho_bloco=65536, manter_comentarios=False, max_erros=None):
+        """Gera os tokens de uma fonte sob demanda, lendo-a em blocos.
+
+        `fonte` pode ser uma string ou qualquer fluxo de texto com read() (arquivo
+        aberto, io.StringIO...). Como nenhum token atravessa uma quebra de linha,
+        cada bloco é analisado até a sua última '\\n' e o restante segue para o
+        bloco seguinte, de modo que linha/coluna continuam corretas. Se `erros`
+        for uma lista, os tokens ERRO são registrados nela (como em tokenizar)
+        em vez de gerados. O último token gerado é sempre EOF.
+        """
+        if isinstance(fonte, str):
+            fonte = io.StringIO(fonte)
+        comentarios = [] if manter_comentarios else None
+        coletor = _ColetorErros(erros, max_erros) if erros is not None else None
+        pendentes = []  # Pedaços lidos que ainda não terminam em '\n'
+        mapa_linhas = IndiceLinhas()  # Estendido bloco a bloco
+        base = 0
+        fim_arquivo = False
+
+        while not fim_arquivo:
+            bloco = fonte.read(tamanho_bloco)
+            if not bloco:
+                fim_arquivo = True
+            elif '\0' in bloco:
+                # '\0' é tratado como fim de arquivo, como no autômato
+                bloco = bloco[:bloco.index('\0')]
+                fim_arquivo = True
+
+            corte = bloco.rfind('\n') + 1
+            if fim_arquivo:
+                pendentes.append(bloco)
+                trecho = ''.join(pendentes)
+            elif corte == 0:
+                # Linha maior que o bloco: continua lendo
+                pendentes.append(bloco)
+                continue
+            else:
+                pendentes.append(bloco[:corte])
+                trecho = ''.join(pendentes)
+                pendentes = [bloco[corte:]]
+
+            mapa_linhas.estender(trecho, base)
+            for token in _escanear(trecho, mapa_linhas, base, comentarios, final=fim_arquivo):
+                if coletor is not None and token.tipo == TipoToken.ERRO:
+                    inicio = token.posicao - base
+                    coletor.adicionar(trecho, base, inicio, inicio + len(token.lexema), mapa_linhas=mapa_linhas)
+                else:
+                    yield token
+            base += len(trecho)
+
+        if coletor is not None:
+            coletor.finalizar()
+
 # ... (resto do arquivo)
     
     def __str__(self):
@@ -252,3 +319,709 @@ class Lexer:
         for token in tokens:
             resultado.append(str(token))
         return '\n'.join(resultado)
+
+
+
+# ==================== Motor baseado em padrão mestre ====================
+
+# Uma única expressão regular: espaço em branco opcional seguido de um lexema,
+# com um grupo nomeado por classe. As classes de letras e dígitos são ASCII e
+# recusam casar quando o próximo caractere é não-ASCII; nesse caso (e para
+# caracteres inválidos) o token é resolvido por _escanear_lento, que usa
+# os mesmos predicados (isalpha/isdigit/isalnum) do autômato original.
+_PADRAO_MESTRE = re.compile(r"""
+    [ \t\n\r]*
+    (?:
+        (?P<PALAVRA>[A-Za-z][A-Za-z0-9_]*)(?![A-Za-z0-9_]|[^\x00-\x7f])
+      | (?P<OPERADOR>[-+*^=:;()\[\]{}!,.>']|/(?!/))
+      | (?P<REAL>[0-9]+\.[0-9]+)(?![0-9]|[^\x00-\x7f])
+      | (?P<INTEIRO_PONTO>[0-9]+)\.(?![0-9]|[^\x00-\x7f])
+      | (?P<INTEIRO>[0-9]+)(?![0-9.]|[^\x00-\x7f])
+      | (?P<STRING>"[^"\n]*")
+      | (?P<STRING_ABERTA>"[^"\n]*)
+      | (?P<COMENTARIO>//[^\n]*)
+      | (?P<FIM>\Z)
+    )
+""", re.VERBOSE)
+
+_ESPACOS = re.compile(r"[ \t\n\r]*")
+
+OPERADORES = {
+    '+': TipoToken.OP_ADICAO,
+    '-': TipoToken.OP_SUBTRACAO,
+    '*': TipoToken.OP_MULTIPLICACAO,
+    '/': TipoToken.OP_DIVISAO,
+    '^': TipoToken.OP_POTENCIACAO,
+    '=': TipoToken.OP_ATRIBUICAO,
+    ':': TipoToken.DOIS_PONTOS,
+    ';': TipoToken.PONTO_VIRGULA,
+    '(': TipoToken.PARENTESE_ESQ,
+    ')': TipoToken.PARENTESE_DIR,
+    '[': TipoToken.COLCHETE_ESQ,
+    ']': TipoToken.COLCHETE_DIR,
+    '{': TipoToken.CHAVE_ESQ,
+    '}': TipoToken.CHAVE_DIR,
+    ',': TipoToken.VIRGULA,
+    '.': TipoToken.PONTO,
+    '!': TipoToken.EXCLAMACAO,
+    '>': TipoToken.MAIOR_QUE,
+    "'": TipoToken.ASPAS_DUPLAS,
+}
+
+# Versões em bytes, para analisar arquivos mapeados em memória (tokenizar_arquivo)
+# sem decodificá-los: o padrão só casa ASCII, o resto vai para o caminho lento
+_PADRAO_MESTRE_BYTES = re.compile(_PADRAO_MESTRE.pattern.encode('ascii'), re.VERBOSE)
+_ESPACOS_BYTES = re.compile(_ESPACOS.pattern.encode('ascii'))
+_RESERVADAS_BYTES = {palavra.encode('ascii'): tipo for palavra, tipo in PALAVRAS_RESERVADAS.items()}
+_OPERADORES_BYTES = {operador.encode('ascii'): tipo for operador, tipo in OPERADORES.items()}
+# Bytes ASCII que encerram qualquer token do caminho lento (tudo menos letras, dígitos, '_' e '.')
+_FIM_JANELA_BYTES = re.compile(rb"[\x00-\x2d\x2f\x3a-\x40\x5b-\x5e\x60\x7b-\x7f]")
+
+
+def _escanear_lento(texto, posicao):
+    """Reconhece um token a partir de um caractere não-ASCII (ou inválido).
+    Retorna (tipo, fim_do_lexema, posicao_seguinte)."""
+    tamanho = len(texto)
+    char = texto[posicao]
+    fim = posicao + 1
+
+    if char.isalpha():
+        while fim < tamanho and (texto[fim].isalnum() or texto[fim] == '_'):
+            fim += 1
+        return PALAVRAS_RESERVADAS.get(texto[posicao:fim], TipoToken.IDENTIFICADOR), fim, fim
+
+    if char.isdigit():
+        while fim < tamanho and texto[fim].isdigit():
+            fim += 1
+        if fim < tamanho and texto[fim] == '.':
+            if fim + 1 < tamanho and texto[fim + 1].isdigit():
+                fim += 2
+                while fim < tamanho and texto[fim].isdigit():
+                    fim += 1
+                return TipoToken.NUM_REAL, fim, fim
+            # Ponto sem dígitos depois - consumido e descartado
+            return TipoToken.NUM_INTEIRO, fim, fim + 1
+        return TipoToken.NUM_INTEIRO, fim, fim
+
+    return TipoToken.ERRO, fim, fim
+
+
+def _escanear_lento_bytes(dados, posicao, fim_dados):
+    """_escanear_lento sobre bytes UTF-8: decodifica só a janela até o próximo
+    byte ASCII que encerra qualquer token e converte as posições de volta para
+    bytes. Bytes UTF-8 inválidos viram caracteres inválidos (surrogateescape)."""
+    parada = _FIM_JANELA_BYTES.search(dados, posicao + 1, fim_dados)
+    janela = dados[posicao:parada.start() if parada else fim_dados].decode('utf-8', 'surrogateescape')
+    tipo, fim, seguinte = _escanear_lento(janela, 0)
+    fim_bytes = posicao + len(janela[:fim].encode('utf-8', 'surrogateescape'))
+    if seguinte != fim:
+        # Ponto consumido após um número: é ASCII, ocupa um byte
+        return tipo, fim_bytes, fim_bytes + 1
+    return tipo, fim_bytes, fim_bytes
+
+
+def _escanear_intervalos(texto, linha=1, final=True, fim_texto=None):
+    """Gera (tipo, inicio, fim, linha, coluna) para cada lexema de um trecho que
+    começa no início de uma linha. O lexema é sempre texto[inicio:fim].
+
+    Comentários são gerados com tipo None. linha é o número da primeira linha
+    do trecho; o EOF só é gerado se final=True. `texto` também pode ser bytes
+    UTF-8 (ou um mmap), analisados até `fim_texto`; posições e colunas são
+    então em bytes.
+    """
+    if isinstance(texto, str):
+        casar = _PADRAO_MESTRE.match
+        espacos = _ESPACOS.match
+        reservadas = PALAVRAS_RESERVADAS
+        operadores = OPERADORES
+        quebra = '\n'
+        contar = texto.count
+    else:
+        casar = _PADRAO_MESTRE_BYTES.match
+        espacos = _ESPACOS_BYTES.match
+        reservadas = _RESERVADAS_BYTES
+        operadores = _OPERADORES_BYTES
+        quebra = b'\n'
+        # mmap não tem count(): conta na fatia (os trechos de espaço são curtos)
+        contar = lambda sub, inicio, fim: texto[inicio:fim].count(sub)
+    if fim_texto is None:
+        fim_texto = len(texto)
+    identificador = TipoToken.IDENTIFICADOR
+    posicao = 0
+    inicio_linha = 0
+
+    while True:
+        m = casar(texto, posicao, fim_texto)
+
+        if m is None:
+            # Caractere não-ASCII ou inválido: pula o espaço e usa o caminho lento
+            inicio = espacos(texto, posicao, fim_texto).end()
+            grupo = None
+        else:
+            grupo = m.lastgroup
+            inicio = m.start(grupo)
+
+        # Linha e coluna só mudam com as quebras do espaço em branco
+        if inicio != posicao:
+            quebras = contar(quebra, posicao, inicio)
+            if quebras:
+                linha += quebras
+                inicio_linha = texto.rfind(quebra, posicao, inicio) + 1
+
+        if grupo is None:
+            if quebra == '\n':
+                tipo, fim, posicao = _escanear_lento(texto, inicio)
+            else:
+                tipo, fim, posicao = _escanear_lento_bytes(texto, inicio, fim_texto)
+            yield tipo, inicio, fim, linha, inicio - inicio_linha + 1
+            continue
+
+        posicao = fim = m.end(grupo)
+        if grupo == 'PALAVRA':
+            tipo = reservadas.get(m.group(grupo), identificador)
+        elif grupo == 'OPERADOR':
+            tipo = operadores[m.group(grupo)]
+        elif grupo == 'INTEIRO':
+            tipo = TipoToken.NUM_INTEIRO
+        elif grupo == 'REAL':
+            tipo = TipoToken.NUM_REAL
+        elif grupo == 'INTEIRO_PONTO':
+            # Ponto sem dígitos depois: é consumido, mas fica fora do lexema
+            tipo = TipoToken.NUM_INTEIRO
+            posicao = fim + 1
+        elif grupo == 'STRING':
+            tipo = TipoToken.STRING
+        elif grupo == 'STRING_ABERTA':
+            tipo = TipoToken.ERRO
+        elif grupo == 'COMENTARIO':
+            tipo = None
+        elif final:  # FIM
+            yield TipoToken.EOF, inicio, inicio, linha, inicio - inicio_linha + 1
+            return
+        else:
+            return
+        yield tipo, inicio, fim, linha, inicio - inicio_linha + 1
+
+
+def _escanear(texto, mapa_linhas, base=0, comentarios=None, final=True):
+    """Gera os tokens (inclusive ERRO) de um trecho que começa no início de uma linha.
+
+    base é o deslocamento do trecho na fonte completa, cujas linhas estão em
+    mapa_linhas (IndiceLinhas). Comentários pendentes são
+    acumulados em `comentarios` (se não for None) e anexados ao próximo token,
+    mesmo que ele esteja no trecho seguinte. O EOF só é emitido se final=True.
+    """
+    for tipo, inicio, fim, _, _ in _escanear_intervalos(texto, final=final):
+        if tipo is None:
+            if comentarios is not None:
+                comentarios.append((base + inicio, base + fim))
+            continue
+        token = Token(tipo, texto[inicio:fim], base + inicio, mapa_linhas)
+        if comentarios:
+            token.trivia = tuple(comentarios)
+            comentarios.clear()
+        yield token
+
+
+# Quantos caracteres de uma sequência de caracteres inválidos são guardados
+_TAMANHO_AMOSTRA = 20
+
+
+class ErroLexico:
+    """Erro léxico estruturado.
+
+    Caracteres inválidos consecutivos na mesma linha são agrupados em um único
+    erro de `quantidade` caracteres entre `posicao` e `fim`; nesse caso
+    `lexema` guarda só o início da sequência. Linha, coluna e a mensagem são
+    calculadas apenas quando lidas; str() dá a mesma mensagem de antes para
+    um único caractere.
+    """
+
+    __slots__ = ('lexema', 'posicao', 'fim', 'quantidade', 'mapa_linhas', '_linha', '_coluna', '_largura')
+
+    def __init__(self, lexema, posicao, fim, linha=None, coluna=None, mapa_linhas=None, quantidade=1,
+                 largura=None):
+        self.lexema = lexema
+        self.posicao = posicao
+        self.fim = fim
+        self.quantidade = quantidade
+        self.mapa_linhas = mapa_linhas
+        self._linha = linha
+        self._coluna = coluna
+        # Caracteres entre posicao e fim, se as posições não forem em caracteres
+        self._largura = largura
+
+    @property
+    def linha(self):
+        if self._linha is None:
+            self._linha, self._coluna = self.mapa_linhas.linha_coluna(self.posicao)
+        return self._linha
+
+    @property
+    def coluna(self):
+        if self._coluna is None:
+            self._linha, self._coluna = self.mapa_linhas.linha_coluna(self.posicao)
+        return self._coluna
+
+    @property
+    def largura(self):
+        return self.fim - self.posicao if self._largura is None else self._largura
+
+    @property
+    def coluna_fim(self):
+        """Coluna do último caractere do erro (sempre na mesma linha)"""
+        return self.coluna + self.largura - 1
+
+    def __str__(self):
+        if self.quantidade == 1:
+            return f"Erro léxico na linha {self.linha}, coluna {self.coluna}: caractere inválido '{self.lexema}'"
+        amostra = self.lexema if len(self.lexema) == self.largura else self.lexema + '...'
+        return (f"Erro léxico na linha {self.linha}, colunas {self.coluna}-{self.coluna_fim}: "
+                f"{self.quantidade} caracteres inválidos '{amostra}'")
+
+    def __repr__(self):
+        return f"ErroLexico({self.__str__()!r})"
+
+    def __eq__(self, outro):
+        if not isinstance(outro, ErroLexico):
+            return NotImplemented
+        return ((self.lexema, self.posicao, self.fim, self.quantidade) ==
+                (outro.lexema, outro.posicao, outro.fim, outro.quantidade))
+
+    __hash__ = None
+
+
+class ErrosOmitidos:
+    """Último item da lista de erros quando o limite (max_erros) é atingido"""
+
+    __slots__ = ('quantidade',)
+
+    def __init__(self, quantidade):
+        self.quantidade = quantidade
+
+    def __str__(self):
+        return f"... e mais {self.quantidade} erro(s) léxico(s)"
+
+    def __repr__(self):
+        return f"ErrosOmitidos({self.quantidade})"
+
+    def __eq__(self, outro):
+        if not isinstance(outro, ErrosOmitidos):
+            return NotImplemented
+        return self.quantidade == outro.quantidade
+
+    __hash__ = None
+
+
+def _agrupavel(texto, inicio_anterior, fim_anterior, inicio):
+    """Indica se o lexema inválido em texto[inicio] continua a sequência de
+    caracteres inválidos texto[inicio_anterior:fim_anterior]: mesma linha e só
+    espaços ou tabulações entre eles. Strings não fechadas não são agrupadas."""
+    aspas, espacos = ('"', ' \t') if isinstance(texto, str) else (b'"', b' \t')
+    return (inicio_anterior >= 0 and texto[inicio:inicio + 1] != aspas
+            and texto[inicio_anterior:inicio_anterior + 1] != aspas
+            and not texto[fim_anterior:inicio].strip(espacos))
+
+
+class _ColetorErros:
+    """Acumula erros léxicos em `erros`, agrupando caracteres inválidos separados
+    só por espaços ou tabulações e guardando no máximo `max_erros` deles. Os
+    excedentes são apenas contados e resumidos em um ErrosOmitidos ao final."""
+
+    def __init__(self, erros, max_erros=None):
+        self.erros = erros
+        self.max_erros = max_erros
+        self.omitidos = 0
+        self._ultimo = None
+
+    def adicionar(self, texto, base, inicio, fim, linha=None, mapa_linhas=None):
+        """Registra o lexema inválido texto[inicio:fim]; `texto` começa no início
+        de uma linha, na posição `base` da fonte. Sem mapa_linhas, a linha é dada
+        e a coluna é calculada no texto (só para os erros guardados)."""
+        ultimo = self._ultimo
+        if ultimo is not None and _agrupavel(texto, ultimo.posicao - base, ultimo.fim - base, inicio):
+            # Continua a sequência de caracteres inválidos do erro anterior
+            if len(ultimo.lexema) < _TAMANHO_AMOSTRA:
+                inicio_ultimo = ultimo.posicao - base
+                ultimo.lexema = texto[inicio_ultimo:min(fim, inicio_ultimo + _TAMANHO_AMOSTRA)]
+            ultimo.fim = base + fim
+            ultimo.quantidade += 1
+            return
+
+        guardar = self.max_erros is None or len(self.erros) < self.max_erros
+        coluna = None
+        if guardar and mapa_linhas is None:
+            coluna = inicio - texto.rfind('\n', 0, inicio)
+        self._ultimo = ErroLexico(texto[inicio:fim], base + inicio, base + fim, linha, coluna, mapa_linhas)
+        if guardar:
+            self.erros.append(self._ultimo)
+        else:
+            self.omitidos += 1
+
+    def finalizar(self):
+        if self.omitidos:
+            self.erros.append(ErrosOmitidos(self.omitidos))
+
+
+class LexerRegex:
+    """Analisador léxico de passada única sobre um padrão mestre compilado.
+
+    Produz exatamente a mesma sequência de tokens e as mesmas mensagens de erro
+    que Lexer, mas cada lexema é obtido por fatiamento da fonte. Como em Lexer,
+    os tokens guardam só a posição; linha/coluna vêm de self.mapa_linhas.
+    """
+
+    def __init__(self, codigo_fonte, manter_comentarios=False, max_erros=None):
+        # O autômato original trata '\0' como fim de arquivo
+        fim = codigo_fonte.find('\0')
+        self.codigo_fonte = codigo_fonte if fim < 0 else codigo_fonte[:fim]
+        self.manter_comentarios = manter_comentarios
+        self.max_erros = max_erros
+        self.mapa_linhas = IndiceLinhas(self.codigo_fonte)
+        self._tokens = _escanear(self.codigo_fonte, self.mapa_linhas,
+                                 comentarios=[] if manter_comentarios else None)
+        self._eof = None
+
+    def proximo_token(self):
+        """Retorna o próximo token (EOF indefinidamente ao final)"""
+        token = next(self._tokens, None)
+        if token is None:
+            token = self._eof
+        elif token.tipo == TipoToken.EOF:
+            self._eof = token
+        return token
+
+    def tokenizar(self):
+        """Tokeniza todo o código fonte e retorna uma lista de tokens e uma lista de erros."""
+        tokens = []
+        erros = []
+        coletor = _ColetorErros(erros, self.max_erros)
+        adicionar = tokens.append
+        erro = TipoToken.ERRO
+
+        for token in self._tokens:
+            if token.tipo == erro:
+                coletor.adicionar(self.codigo_fonte, 0, token.posicao, token.posicao + len(token.lexema),
+                                  mapa_linhas=self.mapa_linhas)
+            else:
+                adicionar(token)
+        coletor.finalizar()
+
+        if tokens and tokens[-1].tipo == TipoToken.EOF:
+            self._eof = tokens[-1]
+        else:
+            # Gerador já consumido por proximo_token()
+            tokens.append(self.proximo_token())
+        return tokens, erros
+
+    def tokenizar_buffer(self):
+        """Tokeniza todo o código fonte em um TokenBuffer colunar, sem criar um
+        objeto Token por token. Retorna (buffer, erros) como tokenizar()."""
+        buffer = TokenBuffer(self.codigo_fonte, self.manter_comentarios)
+        comentarios = [] if self.manter_comentarios else None
+        _preencher_buffer(buffer, self.codigo_fonte, comentarios=comentarios)
+        return buffer, _erros_do_buffer(buffer, self.max_erros)
+
+
+def _preencher_buffer(buffer, texto, base=0, linha=1, final=True, comentarios=None, fim_texto=None):
+    """Acrescenta ao buffer os tokens de `texto`, um trecho que começa no início
+    de uma linha e está na posição `base` da fonte do buffer. Comentários ainda
+    não anexados a um token ficam em `comentarios` (se não for None)."""
+    codigos = CODIGO_DO_TIPO
+    erro = TipoToken.ERRO
+    tipos = buffer.tipos.append
+    inicios = buffer.inicios.append
+    fins = buffer.fins.append
+    linhas = buffer.linhas.append
+    erros_inicios = buffer.erros_inicios
+    erros_fins = buffer.erros_fins
+
+    for tipo, inicio, fim, linha, _ in _escanear_intervalos(texto, linha, final, fim_texto):
+        if tipo is None:
+            if comentarios is not None:
+                comentarios.append((base + inicio, base + fim))
+            continue
+        if tipo == erro:
+            if erros_fins and _agrupavel(texto, erros_inicios[-1] - base, erros_fins[-1] - base, inicio):
+                erros_fins[-1] = base + fim
+                buffer.erros_quantidades[-1] += 1
+            else:
+                erros_inicios.append(base + inicio)
+                erros_fins.append(base + fim)
+                buffer.erros_linhas.append(linha)
+                buffer.erros_quantidades.append(1)
+            if comentarios:
+                # A trivia pertencia ao token inválido, como em tokenizar()
+                comentarios.clear()
+            continue
+        if comentarios:
+            buffer.trivias[len(buffer.tipos)] = tuple(comentarios)
+            comentarios.clear()
+        tipos(codigos[tipo])
+        inicios(base + inicio)
+        fins(base + fim)
+        linhas(linha)
+
+
+def tokenizar_arquivo(caminho, manter_comentarios=False, max_erros=None):
+    """Tokeniza um arquivo sem lê-lo para uma str e retorna (buffer, erros) como
+    tokenizar_buffer().
+
+    O arquivo é mapeado em memória e analisado diretamente nos bytes: o padrão
+    mestre cobre o ASCII e só as janelas com bytes não-ASCII são decodificadas.
+    O TokenBufferMapeado resultante mantém o mapeamento e decodifica lexemas
+    apenas quando pedidos.
+    """
+    with open(caminho, 'rb') as arquivo:
+        try:
+            dados = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Arquivos vazios não podem ser mapeados
+            dados = b''
+    # '\0' encerra a fonte, como no autômato original
+    fim = dados.find(b'\0')
+    buffer = TokenBufferMapeado(dados, manter_comentarios)
+    comentarios = [] if manter_comentarios else None
+    _preencher_buffer(buffer, dados, comentarios=comentarios, fim_texto=fim if fim >= 0 else None)
+    return buffer, _erros_do_buffer(buffer, max_erros)
+
+
+def _erros_do_buffer(buffer, max_erros=None):
+    """Erros léxicos (ErroLexico) de um TokenBuffer, agrupados como em tokenizar()"""
+    total = len(buffer.erros_inicios)
+    guardados = total if max_erros is None else min(total, max_erros)
+    erros = []
+    for inicio, fim, linha, quantidade in zip(buffer.erros_inicios[:guardados], buffer.erros_fins,
+                                               buffer.erros_linhas, buffer.erros_quantidades):
+        lexema = buffer.texto(inicio, fim)
+        if quantidade > 1:
+            largura = len(lexema)
+            lexema = lexema[:_TAMANHO_AMOSTRA]
+        else:
+            largura = None
+        erros.append(ErroLexico(lexema, inicio, fim, linha, buffer.coluna_em(inicio), quantidade=quantidade,
+                                largura=largura))
+    if guardados < total:
+        erros.append(ErrosOmitidos(total - guardados))
+    return erros
+
+
+def relexar(buffer, posicao, removidos, inseridos, max_erros=None):
+    """Atualiza um TokenBuffer após uma edição na sua fonte e retorna (buffer, erros).
+
+    A edição remove `removidos` caracteres a partir de `posicao` e insere a
+    string `inseridos` no lugar. Como strings e comentários não atravessam
+    quebras de linha, o início da linha editada é um ponto seguro e o autômato
+    volta ao estado inicial na primeira quebra de linha após o texto inserido:
+    só essas linhas são analisadas de novo. Os tokens seguintes são reaproveitados
+    e o buffer é alterado no lugar (ver TokenBuffer.substituir). Um
+    TokenBufferMapeado (tokenizar_arquivo) não pode ser editado: lança TypeError.
+    """
+    if isinstance(buffer, TokenBufferMapeado):
+        raise TypeError("relexar requer TokenBuffer em memória, não o TokenBufferMapeado de tokenizar_arquivo")
+    antigo = buffer.fonte
+    novo = antigo[:posicao] + inseridos + antigo[posicao + removidos:]
+    if '\0' in inseridos:
+        # '\0' encerra a fonte: tudo depois dele deixa de existir
+        refeito, erros = LexerRegex(novo, buffer.manter_comentarios, max_erros).tokenizar_buffer()
+        for campo in TokenBuffer.__slots__:
+            setattr(buffer, campo, getattr(refeito, campo))
+        return buffer, erros
+    delta = len(inseridos) - removidos
+
+    inicio = antigo.rfind('\n', 0, posicao) + 1
+    quebra = novo.find('\n', posicao + len(inseridos))
+    final = quebra < 0
+    fim_novo = len(novo) if final else quebra + 1
+    fim_antigo = fim_novo - delta
+    total = len(buffer)
+
+    comentarios = None
+    if buffer.manter_comentarios:
+        # Comentários antes do ponto seguro pertencem ao primeiro lexema reanalisado.
+        # Se ele for inválido, a análise antiga descartou esses comentários; então
+        # o ponto seguro recua para a linha do lexema anterior.
+        inicios_erros = buffer.erros_inicios
+        while True:
+            k = buffer.localizar(inicio)
+            e = bisect_left(inicios_erros, inicio)
+            primeiro_e_erro = e < len(inicios_erros) and (k == total or inicios_erros[e] < buffer.inicio(k))
+            if not primeiro_e_erro or inicio == 0:
+                break
+            anterior = max(buffer.inicio(k - 1) if k else 0, inicios_erros[e - 1] if e else 0)
+            inicio = antigo.rfind('\n', 0, anterior) + 1
+        comentarios = [] if primeiro_e_erro else [c for c in buffer.trivias.get(k, ()) if c[0] < inicio]
+
+    # Tokens antigos substituídos: [k, j)
+    k = buffer.localizar(inicio)
+    j = total if final else buffer.localizar(fim_antigo, k)
+    if k > 0:
+        anterior = buffer.inicio(k - 1)
+        linha = buffer.linha(k - 1) + antigo.count('\n', anterior, inicio)
+    else:
+        linha = 1 + antigo.count('\n', 0, inicio)
+
+    regiao = TokenBuffer(novo, buffer.manter_comentarios)
+    _preencher_buffer(regiao, novo[inicio:fim_novo], inicio, linha, final, comentarios)
+
+    # Erros antigos substituídos: [a, b)
+    a = bisect_left(buffer.erros_inicios, inicio)
+    b = bisect_left(buffer.erros_inicios, fim_antigo, a)
+    if comentarios and j < total and b < len(buffer.erros_inicios) and buffer.erros_inicios[b] < buffer.inicio(j):
+        # Um lexema inválido antes do primeiro token reaproveitado fica com a trivia
+        comentarios.clear()
+
+    delta_linhas = novo.count('\n', inicio, fim_novo) - antigo.count('\n', inicio, fim_antigo)
+    buffer.substituir(k, j, regiao, delta, delta_linhas)
+    buffer.fonte = novo
+    buffer._mapa_linhas = None
+
+    # Os erros são poucos: deslocados de imediato, sem o corte usado nos tokens
+    fim_regiao = a + len(regiao.erros_inicios)
+    for coluna, nova, ajuste in ((buffer.erros_inicios, regiao.erros_inicios, delta),
+                                 (buffer.erros_fins, regiao.erros_fins, delta),
+                                 (buffer.erros_linhas, regiao.erros_linhas, delta_linhas),
+                                 (buffer.erros_quantidades, regiao.erros_quantidades, 0)):
+        coluna[a:b] = nova
+        if ajuste:
+            coluna[fim_regiao:] = array('i', map(ajuste.__add__, coluna[fim_regiao:]))
+
+    if buffer.manter_comentarios:
+        # A trivia é esparsa: remapeada por completo, no custo do número de comentários
+        trivias = {indice: trivia for indice, trivia in buffer.trivias.items() if indice < k}
+        for indice, trivia in regiao.trivias.items():
+            trivias[k + indice] = trivia
+        deslocamento = len(regiao.tipos) - (j - k)
+        for indice, trivia in buffer.trivias.items():
+            if indice >= j:
+                trivia = tuple((i + delta, f + delta) for i, f in trivia if i >= fim_antigo)
+                if indice == j:
+                    # Comentários reanalisados que precedem o primeiro token reaproveitado
+                    trivia = tuple(comentarios) + trivia
+                if trivia:
+                    trivias[indice + deslocamento] = trivia
+        if comentarios and j not in buffer.trivias and j < total:
+            trivias[j + deslocamento] = tuple(comentarios)
+        buffer.trivias = trivias
+
+    return buffer, _erros_do_buffer(buffer, max_erros)
+
+
+def calcular_edicao(antigo, novo):
+    """Descobre a edição que transforma `antigo` em `novo`, como
+    (posicao, removidos, inseridos), comparando prefixo e sufixo comuns.
+    Útil quando o editor envia o documento inteiro a cada alteração."""
+    limite = min(len(antigo), len(novo))
+    prefixo = 0
+    bloco = 4096
+    while bloco:
+        # Compara blocos cada vez menores: custo proporcional ao prefixo comum
+        while prefixo + bloco <= limite and antigo[prefixo:prefixo + bloco] == novo[prefixo:prefixo + bloco]:
+            prefixo += bloco
+        bloco //= 2
+
+    limite -= prefixo
+    sufixo = 0
+    bloco = 4096
+    while bloco:
+        while (sufixo + bloco <= limite and
+               antigo[len(antigo) - sufixo - bloco:len(antigo) - sufixo] == novo[len(novo) - sufixo - bloco:len(novo) - sufixo]):
+            sufixo += bloco
+        bloco //= 2
+
+    return prefixo, len(antigo) - prefixo - sufixo, novo[prefixo:len(novo) - sufixo]
+
+
+def _tokenizar_trecho(nome_memoria, inicio, fim, base, linha, final, manter_comentarios):
+    """Executado em um processo do pool: tokeniza os bytes [inicio, fim) da
+    memória compartilhada, que estão na posição `base` e na linha `linha` da fonte."""
+    memoria = shared_memory.SharedMemory(name=nome_memoria)
+    try:
+        texto = bytes(memoria.buf[inicio:fim]).decode('utf-8', 'surrogatepass')
+    finally:
+        memoria.close()
+    buffer = TokenBuffer(texto, manter_comentarios)
+    comentarios = [] if manter_comentarios else None
+    _preencher_buffer(buffer, texto, base, linha, final, comentarios)
+    erros = (buffer.erros_inicios, buffer.erros_fins, buffer.erros_linhas, buffer.erros_quantidades)
+    return buffer.tipos, buffer.inicios, buffer.fins, buffer.linhas, buffer.trivias, erros, comentarios
+
+
+def tokenizar_paralelo(fonte, workers=None, manter_comentarios=False, max_erros=None):
+    """Tokeniza `fonte` em paralelo e retorna (buffer, erros) como tokenizar_buffer().
+
+    A fonte é dividida em `workers` trechos nas quebras de linha, que são pontos
+    seguros (strings e comentários terminam na quebra de linha). Os bytes ficam
+    em memória compartilhada, sem cópia para cada processo; cada trecho recebe
+    sua posição e linha iniciais e os resultados são só concatenados. Compensa
+    para arquivos grandes; para poucos kilobytes o custo do pool domina.
+    """
+    fim = fonte.find('\0')
+    if fim >= 0:
+        fonte = fonte[:fim]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        return LexerRegex(fonte, manter_comentarios, max_erros).tokenizar_buffer()
+
+    cortes = [0]
+    for parte in range(1, workers):
+        quebra = fonte.find('\n', max(len(fonte) * parte // workers, cortes[-1]))
+        if quebra < 0 or quebra + 1 >= len(fonte):
+            break
+        cortes.append(quebra + 1)
+    cortes.append(len(fonte))
+
+    # Cada trecho: (bytes inicial, bytes final, posição na fonte, linha inicial)
+    trechos = []
+    partes = []
+    posicao_bytes = 0
+    linha = 1
+    for inicio, fim in zip(cortes, cortes[1:]):
+        parte = fonte[inicio:fim].encode('utf-8', 'surrogatepass')
+        partes.append(parte)
+        trechos.append((posicao_bytes, posicao_bytes + len(parte), inicio, linha))
+        posicao_bytes += len(parte)
+        linha += fonte.count('\n', inicio, fim)
+
+    memoria = shared_memory.SharedMemory(create=True, size=max(1, posicao_bytes))
+    try:
+        for parte, (inicio_bytes, fim_bytes, _, _) in zip(partes, trechos):
+            memoria.buf[inicio_bytes:fim_bytes] = parte
+        del partes, parte
+        with ProcessPoolExecutor(len(trechos)) as executor:
+            tarefas = [
+                executor.submit(_tokenizar_trecho, memoria.name, *trecho,
+                                trecho is trechos[-1], manter_comentarios)
+                for trecho in trechos
+            ]
+            resultados = [tarefa.result() for tarefa in tarefas]
+    finally:
+        memoria.close()
+        memoria.unlink()
+
+    buffer = TokenBuffer(fonte, manter_comentarios)
+    pendentes = []
+    for tipos, inicios, fins, linhas, trivias, erros, abertos in resultados:
+        primeiro = len(buffer.tipos)
+        buffer.tipos.extend(tipos)
+        buffer.inicios.extend(inicios)
+        buffer.fins.extend(fins)
+        buffer.linhas.extend(linhas)
+        erros_inicios, erros_fins, erros_linhas, erros_quantidades = erros
+        buffer.erros_inicios.extend(erros_inicios)
+        buffer.erros_fins.extend(erros_fins)
+        buffer.erros_linhas.extend(erros_linhas)
+        buffer.erros_quantidades.extend(erros_quantidades)
+
+        if manter_comentarios:
+            for indice, trivia in trivias.items():
+                buffer.trivias[primeiro + indice] = trivia
+            if tipos or erros_inicios:
+                # Comentários do fim do trecho anterior vão para o primeiro lexema
+                # deste, e são descartados se ele for inválido, como em tokenizar()
+                if pendentes and tipos and (not erros_inicios or inicios[0] < erros_inicios[0]):
+                    buffer.trivias[primeiro] = tuple(pendentes) + buffer.trivias.get(primeiro, ())
+                pendentes = []
+            pendentes += abertos
+
+    return buffer, _erros_do_buffer(buffer, max_erros)
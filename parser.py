@@ -1,5 +1,8 @@
-from tokens import Token, TipoToken
-from typing import List, Union
+from bisect import bisect_left, bisect_right
+from collections import deque
+from lexer import LexerRegex, relexar
+from tokens import Token, TipoToken, IndiceLinhas, linha_coluna_de_posicao, posicao_de_linha_coluna
+from typing import Iterable, List, Union
 
 
 # Classes para representar a árvore sintática abstrata (AST) - DRAMATICA
@@ -22,15 +25,32 @@ class Declaracao:
         self.tipo = tipo  # 'VARCHAR', 'INT' ou 'FLOAT'
 
 
+class _LinhaColunaAntigas:
+    """linha e coluna dos nós criados na forma antiga, com linha=/coluna=
+    (a posição as codifica, como em Token). Nos nós do Parser, que guardam só
+    o deslocamento na fonte, valem None: use posicao com o IndiceLinhas."""
+
+    @property
+    def linha(self):
+        return linha_coluna_de_posicao(self.posicao)[0]
+
+    @property
+    def coluna(self):
+        return linha_coluna_de_posicao(self.posicao)[1]
+
+
+def _posicao(posicao, linha, coluna):
+    return posicao if linha is None else posicao_de_linha_coluna(linha, coluna)
+
+
 class Comando:
     pass
 
 
-class ComandoLeitura(Comando):
-    def __init__(self, variavel: str, linha: int = None, coluna: int = None):
+class ComandoLeitura(_LinhaColunaAntigas, Comando):
+    def __init__(self, variavel: str, posicao: int = None, *, linha: int = None, coluna: int = None):
         self.variavel = variavel
-        self.linha = linha
-        self.coluna = coluna
+        self.posicao = _posicao(posicao, linha, coluna)  # Deslocamento na fonte (ver tokens.IndiceLinhas)
 
 
 class ComandoEscrita(Comando):
@@ -39,16 +59,16 @@ class ComandoEscrita(Comando):
         self.expressao = expressao
 
 
-class ComandoAtribuicao(Comando):
-    def __init__(self, variavel: str, expressao: 'Expressao', linha: int = None, coluna: int = None):
+class ComandoAtribuicao(_LinhaColunaAntigas, Comando):
+    def __init__(self, variavel: str, expressao: 'Expressao', posicao: int = None, *,
+                 linha: int = None, coluna: int = None):
         self.variavel = variavel
         self.expressao = expressao
-        self.linha = linha
-        self.coluna = coluna
+        self.posicao = _posicao(posicao, linha, coluna)
 
 
 class Expressao:
-    pass
+    __slots__ = ()
 
 
 class ExpressaoSimples(Expressao):
@@ -66,46 +86,373 @@ class Fator:
         self.elementos = elementos  # Lista de (operador, elemento)
 
 
-class Elemento:
-    def __init__(self, valor: Union[str, int, float, 'Expressao'], tipo: str, linha: int = None, coluna: int = None):
+class Elemento(_LinhaColunaAntigas):
+    def __init__(self, valor: Union[str, int, float, 'Expressao'], tipo: str, posicao: int = None, *,
+                 linha: int = None, coluna: int = None):
         self.valor = valor
         self.tipo = tipo  # 'IDENTIFICADOR', 'NUM_INTEIRO', 'NUM_REAL', 'STRING', 'EXPRESSAO'
-        self.linha = linha
-        self.coluna = coluna
+        self.posicao = _posicao(posicao, linha, coluna)
 
-class ErroSintatico(Exception):
-    def __init__(self, mensagem: str, linha: int, coluna: int):
-        self.mensagem = mensagem
-        self.linha = linha
-        self.coluna = coluna
-        super().__init__(f"Erro sintático na linha {linha}, coluna {coluna}: {mensagem}")
 
-class ErroSemantico(Exception):
-    def __init__(self, mensagem: str, linha: int = None, coluna: int = None):
+# AST compacta das expressões: nós binários com __slots__ no lugar de
+# ExpressaoSimples/Termo/Fator/Elemento. A gramática não tem operadores unários.
+class NoCompacto(Expressao):
+    __slots__ = ()
+
+
+class Binario(NoCompacto):
+    __slots__ = ('operador', 'esquerda', 'direita')
+
+    def __init__(self, operador: str, esquerda: NoCompacto, direita: NoCompacto):
+        self.operador = operador  # '+', '-', '*', '/' ou '^'
+        self.esquerda = esquerda
+        self.direita = direita
+
+
+class Literal(NoCompacto):
+    __slots__ = ('valor', 'tipo', 'posicao')
+
+    def __init__(self, valor: Union[str, int, float], tipo: str, posicao: int = None):
+        self.valor = valor
+        self.tipo = tipo  # 'NUM_INTEIRO', 'NUM_REAL' ou 'STRING' (com as aspas, como em Elemento)
+        self.posicao = posicao
+
+
+class Nome(NoCompacto):
+    __slots__ = ('nome', 'posicao')
+
+    def __init__(self, nome: str, posicao: int = None):
+        self.nome = nome
+        self.posicao = posicao
+
+
+_PRECEDENCIA = {
+    TipoToken.OP_ADICAO: 1, TipoToken.OP_SUBTRACAO: 1,
+    TipoToken.OP_MULTIPLICACAO: 2, TipoToken.OP_DIVISAO: 2,
+    TipoToken.OP_POTENCIACAO: 3,
+}
+_PRECEDENCIA_POTENCIA = _PRECEDENCIA[TipoToken.OP_POTENCIACAO]  # Única associativa à direita
+
+
+def _folha_compacta(elemento: 'Elemento') -> NoCompacto:
+    if elemento.tipo == 'IDENTIFICADOR':
+        return Nome(elemento.valor, elemento.posicao)
+    return Literal(elemento.valor, elemento.tipo, elemento.posicao)
+
+
+def compactar_expressao(expressao: Expressao) -> NoCompacto:
+    """Converte uma expressão da AST tradicional para a AST compacta"""
+    if isinstance(expressao, NoCompacto):
+        return expressao
+    # Pré-ordem com pilha explícita; em ordem inversa, cada expressão entre
+    # parênteses é convertida antes da expressão que a contém
+    ordem = []
+    pendentes = [expressao]
+    while pendentes:
+        atual = pendentes.pop()
+        ordem.append(atual)
+        for elemento in _elementos_da_expressao(atual):
+            if elemento.tipo == 'EXPRESSAO':
+                pendentes.append(elemento.valor)
+
+    compactas = {}
+
+    def folha(elemento):
+        if elemento.tipo == 'EXPRESSAO':
+            return compactas[id(elemento.valor)]
+        return _folha_compacta(elemento)
+
+    for atual in reversed(ordem):
+        resultado = None
+        for operador_termo, termo in atual.termos:
+            valor_termo = None
+            for operador_fator, fator in termo.fatores:
+                # '^' associa à direita: dobra os elementos a partir do último
+                elementos = fator.elementos
+                valor_fator = folha(elementos[-1][1])
+                for i in range(len(elementos) - 2, -1, -1):
+                    valor_fator = Binario(elementos[i + 1][0], folha(elementos[i][1]), valor_fator)
+                valor_termo = (valor_fator if valor_termo is None
+                               else Binario(operador_fator, valor_termo, valor_fator))
+            resultado = (valor_termo if resultado is None
+                         else Binario(operador_termo, resultado, valor_termo))
+        compactas[id(atual)] = resultado
+    return compactas[id(expressao)]
+
+
+def expandir_expressao(no: Expressao) -> 'ExpressaoSimples':
+    """Converte uma expressão da AST compacta para ExpressaoSimples/Termo/Fator/Elemento.
+    Parênteses só aparecem onde a precedência exige; a posição dos Elementos
+    'EXPRESSAO' gerados é None."""
+    if not isinstance(no, NoCompacto):
+        return no
+    raiz = Elemento(None, 'EXPRESSAO')
+    pendentes = [(no, raiz)]
+
+    def elemento(no):
+        if isinstance(no, Nome):
+            return Elemento(no.nome, 'IDENTIFICADOR', no.posicao)
+        if isinstance(no, Literal):
+            return Elemento(no.valor, no.tipo, no.posicao)
+        # Subexpressão entre parênteses: preenchida quando sair da pilha
+        destino = Elemento(None, 'EXPRESSAO')
+        pendentes.append((no, destino))
+        return destino
+
+    def cadeia_esquerda(no, operadores):
+        """Operandos de uma cadeia associativa à esquerda, da esquerda para a direita"""
+        itens = []
+        while isinstance(no, Binario) and no.operador in operadores:
+            itens.append((no.operador, no.direita))
+            no = no.esquerda
+        itens.append(("", no))
+        itens.reverse()
+        return itens
+
+    while pendentes:
+        no, destino = pendentes.pop()
+        termos = []
+        for operador_termo, no_termo in cadeia_esquerda(no, '+-'):
+            fatores = []
+            for operador_fator, no_fator in cadeia_esquerda(no_termo, '*/'):
+                elementos = []
+                operador = ""
+                while isinstance(no_fator, Binario) and no_fator.operador == '^':
+                    elementos.append((operador, elemento(no_fator.esquerda)))
+                    operador = no_fator.operador
+                    no_fator = no_fator.direita
+                elementos.append((operador, elemento(no_fator)))
+                fatores.append((operador_fator, Fator(elementos)))
+            termos.append((operador_termo, Termo(fatores)))
+        destino.valor = ExpressaoSimples(termos)
+    return raiz.valor
+
+
+def _converter_comandos(programa: 'Programa', converter) -> 'Programa':
+    comandos = []
+    for comando in programa.comandos:
+        if isinstance(comando, ComandoEscrita):
+            comando = ComandoEscrita(comando.personagem, converter(comando.expressao))
+        elif isinstance(comando, ComandoAtribuicao):
+            comando = ComandoAtribuicao(comando.variavel, converter(comando.expressao), comando.posicao)
+        comandos.append(comando)
+    return Programa(programa.nome_cena, programa.personagem, comandos)
+
+
+def compactar_ast(programa: 'Programa') -> 'Programa':
+    """Cópia do programa com as expressões na AST compacta"""
+    return _converter_comandos(programa, compactar_expressao)
+
+
+def expandir_ast(programa: 'Programa') -> 'Programa':
+    """Cópia do programa com as expressões na AST tradicional, para consumidores antigos"""
+    return _converter_comandos(programa, expandir_expressao)
+
+class _ErroComPosicao(Exception):
+    """Base dos erros do parser. A posição pode ser dada como linha/coluna ou
+    como deslocamento na fonte mais o IndiceLinhas; nesse caso linha, coluna e
+    a mensagem completa só são calculadas quando lidas."""
+
+    def __init__(self, mensagem: str, linha: int = None, coluna: int = None,
+                 posicao: int = None, mapa_linhas: IndiceLinhas = None):
+        super().__init__(mensagem)
         self.mensagem = mensagem
-        self.linha = linha
-        self.coluna = coluna
-        if linha is not None and coluna is not None:
-            super().__init__(f"Erro semântico na linha {linha}, coluna {coluna}: {mensagem}")
+        self._linha = linha
+        self._coluna = coluna
+        self.posicao = posicao
+        self.mapa_linhas = mapa_linhas
+
+    def _resolver(self):
+        if self._linha is None and self.posicao is not None:
+            if self.mapa_linhas is not None:
+                self._linha, self._coluna = self.mapa_linhas.linha_coluna(self.posicao)
+            else:
+                # Posição de um nó criado com linha=/coluna=: não precisa do mapa
+                self._linha, self._coluna = linha_coluna_de_posicao(self.posicao)
+
+    @property
+    def linha(self):
+        self._resolver()
+        return self._linha
+
+    @property
+    def coluna(self):
+        self._resolver()
+        return self._coluna
+
+class ErroSintatico(_ErroComPosicao):
+    def __str__(self):
+        return f"Erro sintático na linha {self.linha}, coluna {self.coluna}: {self.mensagem}"
+
+class ErroSemantico(_ErroComPosicao):
+    def __str__(self):
+        if self.linha is not None and self.coluna is not None:
+            return f"Erro semântico na linha {self.linha}, coluna {self.coluna}: {self.mensagem}"
+        return f"Erro semântico: {self.mensagem}"
+
+def _elementos_da_expressao(expressao: Expressao):
+    """Elementos de um nível da expressão, da esquerda para a direita"""
+    if isinstance(expressao, ExpressaoSimples):
+        for _, termo in expressao.termos:
+            for _, fator in termo.fatores:
+                for _, elemento in fator.elementos:
+                    yield elemento
+
+def _nos_do_comando(comando: Comando):
+    """Nós de um comando que guardam posição na fonte (o próprio comando, Elemento,
+    Literal e Nome), na ordem da fonte"""
+    if not isinstance(comando, ComandoEscrita):
+        yield comando
+    if isinstance(comando, ComandoLeitura):
+        return
+    expressao = comando.expressao
+    if isinstance(expressao, NoCompacto):
+        pilha = [expressao]
+        while pilha:
+            no = pilha.pop()
+            if isinstance(no, Binario):
+                pilha.append(no.direita)
+                pilha.append(no.esquerda)
+            else:
+                yield no
+        return
+    iteradores = [_elementos_da_expressao(expressao)]
+    while iteradores:
+        for elemento in iteradores[-1]:
+            yield elemento
+            if elemento.tipo == 'EXPRESSAO':
+                iteradores.append(_elementos_da_expressao(elemento.valor))
+                break
         else:
-            super().__init__(f"Erro semântico: {mensagem}")
+            iteradores.pop()
+
+def _copiar_comando(comando: Comando, delta: int) -> Comando:
+    """Cópia do comando com as posições deslocadas de `delta`. A expressão é
+    copiada sem recursão: os nós são listados do topo para as folhas e
+    recriados na ordem inversa, cada um depois dos filhos."""
+    def deslocar(posicao):
+        return None if posicao is None else posicao + delta
+
+    if isinstance(comando, ComandoLeitura):
+        return ComandoLeitura(comando.variavel, deslocar(comando.posicao))
+    ordem = []
+    pilha = [comando.expressao]
+    while pilha:
+        no = pilha.pop()
+        ordem.append(no)
+        if isinstance(no, ExpressaoSimples):
+            pilha.extend(termo for _, termo in no.termos)
+        elif isinstance(no, Termo):
+            pilha.extend(fator for _, fator in no.fatores)
+        elif isinstance(no, Fator):
+            pilha.extend(elemento for _, elemento in no.elementos)
+        elif isinstance(no, Elemento):
+            if no.tipo == 'EXPRESSAO':
+                pilha.append(no.valor)
+        elif isinstance(no, Binario):
+            pilha.append(no.esquerda)
+            pilha.append(no.direita)
+    copias = {}
+    for no in reversed(ordem):
+        if isinstance(no, ExpressaoSimples):
+            copia = ExpressaoSimples([(operador, copias[id(termo)]) for operador, termo in no.termos])
+        elif isinstance(no, Termo):
+            copia = Termo([(operador, copias[id(fator)]) for operador, fator in no.fatores])
+        elif isinstance(no, Fator):
+            copia = Fator([(operador, copias[id(elemento)]) for operador, elemento in no.elementos])
+        elif isinstance(no, Elemento):
+            valor = copias[id(no.valor)] if no.tipo == 'EXPRESSAO' else no.valor
+            copia = Elemento(valor, no.tipo, deslocar(no.posicao))
+        elif isinstance(no, Binario):
+            copia = Binario(no.operador, copias[id(no.esquerda)], copias[id(no.direita)])
+        elif isinstance(no, Literal):
+            copia = Literal(no.valor, no.tipo, deslocar(no.posicao))
+        else:
+            copia = Nome(no.nome, deslocar(no.posicao))
+        copias[id(no)] = copia
+    expressao = copias[id(comando.expressao)]
+    if isinstance(comando, ComandoEscrita):
+        return ComandoEscrita(comando.personagem, expressao)
+    return ComandoAtribuicao(comando.variavel, expressao, deslocar(comando.posicao))
+
+
+class FluxoTokens:
+    """Janela de lookahead sobre um iterador de tokens (ex.: Lexer.iter_tokens).
+    Mantém apenas os tokens ainda não consumidos que já foram espiados."""
+
+    def __init__(self, tokens: Iterable[Token]):
+        self._iterador = iter(tokens)
+        self._janela = deque()
+        self._ultimo = None
+
+    def espiar(self, distancia: int = 0) -> Token:
+        """Retorna o token a `distancia` posições da frente sem consumi-lo.
+        Após o fim do fluxo, retorna sempre o último token (EOF)."""
+        while len(self._janela) <= distancia:
+            token = next(self._iterador, None)
+            if token is None:
+                return self._janela[-1] if self._janela else self._ultimo
+            self._janela.append(token)
+        return self._janela[distancia]
+
+    def consumir(self):
+        """Descarta o token da frente, se houver outro depois dele"""
+        if self.espiar(1) is not self._janela[0]:
+            self._ultimo = self._janela.popleft()
+
 
 class Parser:
-    def __init__(self, tokens: List[Token]):
-        self.tokens = tokens
+    def __init__(self, tokens: Union[List[Token], Iterable[Token]], ast_compacta: bool = False,
+                 recuperar_erros: bool = False):
+        if hasattr(tokens, '__getitem__'):
+            self.tokens = tokens
+            self._fluxo = None
+            self.token_atual = self.tokens[0] if tokens else None
+        else:
+            # Tokens sob demanda: apenas a janela de lookahead fica em memória
+            self.tokens = None
+            self._fluxo = FluxoTokens(tokens)
+            self.token_atual = self._fluxo.espiar()
         self.posicao = 0
-        self.token_atual = self.tokens[0] if tokens else None
         self.nivel_cena = 0  # Rastreia aninhamento de blocos CENA
         self.nivel_memoria = 0  # Rastreia aninhamento de blocos MEMORIA
-        self.variaveis_declaradas = {}  # Dicionário: nome_variavel -> (tipo, linha_declaracao)
+        self.variaveis_declaradas = {}  # Dicionário: nome_variavel -> (posicao_declaracao, tipo)
         self.nome_personagem = None  # Nome do personagem atual
-        
+        self.ast_compacta = ast_compacta  # Expressões como Binario/Literal/Nome
+        # Primeiro uso de variável não declarada, verificado durante a análise e
+        # lançado por parse() ao final (erros sintáticos continuam tendo prioridade)
+        self._erro_semantico = None
+        # Modo de recuperação (pânico): parse() não lança; registra os erros em
+        # self.erros, ressincroniza em ';', FIM_MEMORIA ou FIM_CENA e devolve uma AST parcial
+        self.recuperar_erros = recuperar_erros
+        self.erros = []
+        self.erro_principal = None  # O erro que parse() lançaria sem recuperação
+        
+    @property
+    def mapa_linhas(self) -> IndiceLinhas:
+        """IndiceLinhas da fonte dos tokens, para localizar erros"""
+        return self.token_atual.mapa_linhas
+
     def avancar(self):
         """Avança para o próximo token"""
-        if self.posicao < len(self.tokens) - 1:
+        if self._fluxo is not None:
+            if self._fluxo.espiar(1) is not self.token_atual:
+                self._fluxo.consumir()
+                self.posicao += 1
+                self.token_atual = self._fluxo.espiar()
+        elif self.posicao < len(self.tokens) - 1:
             self.posicao += 1
             self.token_atual = self.tokens[self.posicao]
     
+    def espiar(self) -> Union[Token, None]:
+        """Retorna o token seguinte ao atual sem consumi-lo (None se não houver)"""
+        if self._fluxo is not None:
+            proximo = self._fluxo.espiar(1)
+            return proximo if proximo is not self.token_atual else None
+        if self.posicao + 1 < len(self.tokens):
+            return self.tokens[self.posicao + 1]
+        return None
+    
     def verificar(self, tipo_esperado: TipoToken) -> bool:
         """Verifica se o token atual é do tipo esperado"""
         return self.token_atual.tipo == tipo_esperado
@@ -119,8 +466,8 @@ class Parser:
         else:
             raise ErroSintatico(
                 mensagem_erro, 
-                self.token_atual.linha, 
-                self.token_atual.coluna
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
             )
     
     def consumir_tipo(self, tipos_esperados: List[TipoToken], mensagem_erro: str) -> Token:
@@ -132,55 +479,99 @@ class Parser:
         else:
             raise ErroSintatico(
                 mensagem_erro, 
-                self.token_atual.linha, 
-                self.token_atual.coluna
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
             )
     
+    def _esperar(self, tipo_esperado: TipoToken, mensagem_erro: str) -> Union[Token, None]:
+        """consumir() para os tokens de estrutura (CENA, PERSONAGEM, ':', FIM_MEMORIA,
+        FIM_CENA...). No modo de recuperação, um token ausente é registrado como
+        erro e a análise segue como se ele estivesse lá (retorna None)."""
+        if self.recuperar_erros and not self.verificar(tipo_esperado):
+            self._registrar_erro(ErroSintatico(
+                mensagem_erro,
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
+            ))
+            return None
+        return self.consumir(tipo_esperado, mensagem_erro)
+    
+    def _registrar_erro(self, erro: '_ErroComPosicao'):
+        """Registra um erro no modo de recuperação. Erros seguidos no mesmo token
+        (em cascata) são descartados."""
+        if self.erro_principal is None:
+            self.erro_principal = erro
+        if self.erros and self.erros[-1].posicao == erro.posicao:
+            return
+        self.erros.append(erro)
+    
+    def _recuperar(self, erro: '_ErroComPosicao', dentro_memoria: bool):
+        """Modo pânico: registra o erro e descarta tokens até um ponto de
+        sincronização. ';' é consumido; FIM_MEMORIA também, exceto dentro do bloco
+        MEMORIA (que o consome ao fechar); FIM_CENA e EOF ficam para quem chamou."""
+        self._registrar_erro(erro)
+        while True:
+            tipo = self.token_atual.tipo
+            if tipo == TipoToken.FIM_CENA or tipo == TipoToken.EOF:
+                return
+            if tipo == TipoToken.FIM_MEMORIA and dentro_memoria:
+                return
+            posicao = self.posicao
+            self.avancar()
+            if tipo == TipoToken.PONTO_VIRGULA or tipo == TipoToken.FIM_MEMORIA or self.posicao == posicao:
+                return
+    
     def parser_programa(self) -> Programa:
         """<programa> ::= CENA IDENTIFICADOR : <personagem> <comandos> FIM_CENA"""
+        nome_cena, personagem = self.parser_cabecalho()
+        
+        # Parse comandos
+        comandos = self.parser_comandos()
+        
+        # Consome FIM_CENA
+        self._esperar(TipoToken.FIM_CENA, "Esperado 'FIM_CENA' no final do programa")
+        self.nivel_cena -= 1
+        
+        return Programa(nome_cena, personagem, comandos)
+    
+    def parser_cabecalho(self) -> tuple[str, 'Personagem']:
+        """CENA IDENTIFICADOR : <personagem>, isto é, tudo antes dos comandos.
+        Retorna (nome_cena, personagem)."""
         # Verifica se já estamos dentro de uma CENA (aninhamento não permitido)
         if self.nivel_cena > 0:
             raise ErroSemantico(
                 "Bloco CENA não pode ser declarado dentro de outro bloco CENA",
-                self.token_atual.linha,
-                self.token_atual.coluna
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
             )
         
         # Consome cena
-        self.consumir(TipoToken.CENA, "Esperado 'CENA' no início do programa")
+        self._esperar(TipoToken.CENA, "Esperado 'CENA' no início do programa")
         self.nivel_cena += 1
         
         # Nome da cena
-        nome_cena_token = self.consumir(TipoToken.IDENTIFICADOR, "Esperado nome da cena após 'CENA'")
-        nome_cena = nome_cena_token.lexema
+        nome_cena_token = self._esperar(TipoToken.IDENTIFICADOR, "Esperado nome da cena após 'CENA'")
+        nome_cena = nome_cena_token.lexema if nome_cena_token else None
         
         # Dois pontos
-        self.consumir(TipoToken.DOIS_PONTOS, "Esperado ':' após nome da cena")
+        self._esperar(TipoToken.DOIS_PONTOS, "Esperado ':' após nome da cena")
         
         # Parse personagem (obrigatório)
         personagem = self.parser_personagem()
-        
-        # Parse comandos
-        comandos = self.parser_comandos()
-        
-        # Consome FIM_CENA
-        self.consumir(TipoToken.FIM_CENA, "Esperado 'FIM_CENA' no final do programa")
-        self.nivel_cena -= 1
-        
-        return Programa(nome_cena, personagem, comandos)
+        return nome_cena, personagem
     
     def parser_personagem(self) -> Personagem:
         """<personagem> ::= PERSONAGEM IDENTIFICADOR : <declaracao_variaveis>"""
         # Consome personagem
-        self.consumir(TipoToken.PERSONAGEM, "Esperado 'PERSONAGEM'")
+        self._esperar(TipoToken.PERSONAGEM, "Esperado 'PERSONAGEM'")
         
         # Nome do personagem
-        nome_token = self.consumir(TipoToken.IDENTIFICADOR, "Esperado nome do personagem")
-        nome = nome_token.lexema
+        nome_token = self._esperar(TipoToken.IDENTIFICADOR, "Esperado nome do personagem")
+        nome = nome_token.lexema if nome_token else None
         self.nome_personagem = nome  # Armazena o nome do personagem
         
         # Dois pontos
-        self.consumir(TipoToken.DOIS_PONTOS, "Esperado ':' após nome do personagem")
+        self._esperar(TipoToken.DOIS_PONTOS, "Esperado ':' após nome do personagem")
         
         # Parse declarações de variáveis
         declaracoes = self.parser_declaracao_variaveis()
@@ -199,8 +590,8 @@ class Parser:
         if self.nivel_memoria > 0:
             raise ErroSemantico(
                 "Bloco MEMORIA não pode ser declarado dentro de outro bloco MEMORIA",
-                self.token_atual.linha,
-                self.token_atual.coluna
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
             )
         
         # Consome memoria
@@ -208,13 +599,13 @@ class Parser:
         self.nivel_memoria += 1
         
         # Dois pontos
-        self.consumir(TipoToken.DOIS_PONTOS, "Esperado ':' após 'MEMORIA'")
+        self._esperar(TipoToken.DOIS_PONTOS, "Esperado ':' após 'MEMORIA'")
         
         # Parse lista de declarações
         declaracoes = self.parser_lista_declaracoes()
         
         # Consome FIM_MEMORIA
-        self.consumir(TipoToken.FIM_MEMORIA, "Esperado 'FIM_MEMORIA' após declarações")
+        self._esperar(TipoToken.FIM_MEMORIA, "Esperado 'FIM_MEMORIA' após declarações")
         self.nivel_memoria -= 1
         
         return declaracoes
@@ -225,7 +616,13 @@ class Parser:
         
         # Continua enquanto houver declarações (identificadores seguidos de :)
         while self.verificar(TipoToken.IDENTIFICADOR):
-            declaracao = self.parser_declaracao()
+            try:
+                declaracao = self.parser_declaracao()
+            except _ErroComPosicao as erro:
+                if not self.recuperar_erros:
+                    raise
+                self._recuperar(erro, dentro_memoria=True)
+                continue
             declaracoes.append(declaracao)
         
         return declaracoes
@@ -238,11 +635,12 @@ class Parser:
         
         # Verifica se a variável já foi declarada
         if nome in self.variaveis_declaradas:
-            linha_original, tipo_original = self.variaveis_declaradas[nome]
+            posicao_original, tipo_original = self.variaveis_declaradas[nome]
+            linha_original = self.mapa_linhas.linha_coluna(posicao_original)[0]
             raise ErroSemantico(
                 f"Variável '{nome}' já foi declarada na linha {linha_original} com tipo {tipo_original}",
-                nome_token.linha,
-                nome_token.coluna
+                posicao=nome_token.posicao,
+                mapa_linhas=nome_token.mapa_linhas
             )
         
         # Dois pontos
@@ -266,23 +664,23 @@ class Parser:
         else:
             raise ErroSintatico(
                 "Esperado tipo (VARCHAR, INT ou FLOAT)",
-                self.token_atual.linha,
-                self.token_atual.coluna
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
             )
         
         # Valida que o tipo foi especificado
         if tipo is None:
             raise ErroSemantico(
                 f"Variável '{nome}' declarada sem tipo",
-                nome_token.linha,
-                nome_token.coluna
+                posicao=nome_token.posicao,
+                mapa_linhas=nome_token.mapa_linhas
             )
         
         # Ponto e vírgula
         self.consumir(TipoToken.PONTO_VIRGULA, "Esperado ';' após declaração")
         
         # Registra a variável declarada
-        self.variaveis_declaradas[nome] = (nome_token.linha, tipo)
+        self.variaveis_declaradas[nome] = (nome_token.posicao, tipo)
         
         return Declaracao(nome, tipo)
     
@@ -294,57 +692,72 @@ class Parser:
         while (not self.verificar(TipoToken.EOF) and
                not self.verificar(TipoToken.FIM_CENA)):
             
-            # Verifica se há um bloco MEMORIA fora do lugar (após comandos começarem)
-            if self.verificar(TipoToken.MEMORIA):
-                raise ErroSemantico(
-                    "Bloco MEMORIA deve ser declarado antes dos comandos, dentro do bloco PERSONAGEM",
-                    self.token_atual.linha,
-                    self.token_atual.coluna
-                )
-            
-            # Verifica se há uma nova CENA (aninhamento não permitido)
-            if self.verificar(TipoToken.CENA):
-                raise ErroSemantico(
-                    "Bloco CENA não pode ser declarado dentro de outro bloco CENA",
-                    self.token_atual.linha,
-                    self.token_atual.coluna
-                )
-            
-            # Verifica se há um novo PERSONAGEM (apenas um personagem por cena)
-            if self.verificar(TipoToken.PERSONAGEM):
-                raise ErroSemantico(
-                    "Apenas um PERSONAGEM pode ser declarado por CENA",
-                    self.token_atual.linha,
-                    self.token_atual.coluna
-                )
-            
-            # Verifica se há comandos válidos
-            if (self.verificar(TipoToken.LEIA) or 
-                self.verificar(TipoToken.DIZ) or 
-                self.verificar(TipoToken.IDENTIFICADOR)):
-                comando = self.parser_comando()
-                comandos.append(comando)
-            else:
-                # Token inesperado, mas não é FIM_CENA nem EOF
-                break
+            try:
+                comandos.append(self.parser_item_comando())
+            except _ErroComPosicao as erro:
+                if not self.recuperar_erros:
+                    raise
+                self._recuperar(erro, dentro_memoria=False)
         
         return comandos
     
+    def parser_item_comando(self) -> Comando:
+        """Um item do bloco de comandos: o comando ou o erro correspondente ao token
+        atual (blocos fora do lugar ou token que não inicia comando)"""
+        # Verifica se há um bloco MEMORIA fora do lugar (após comandos começarem)
+        if self.verificar(TipoToken.MEMORIA):
+            raise ErroSemantico(
+                "Bloco MEMORIA deve ser declarado antes dos comandos, dentro do bloco PERSONAGEM",
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
+            )
+        
+        # Verifica se há uma nova CENA (aninhamento não permitido)
+        if self.verificar(TipoToken.CENA):
+            raise ErroSemantico(
+                "Bloco CENA não pode ser declarado dentro de outro bloco CENA",
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
+            )
+        
+        # Verifica se há um novo PERSONAGEM (apenas um personagem por cena)
+        if self.verificar(TipoToken.PERSONAGEM):
+            raise ErroSemantico(
+                "Apenas um PERSONAGEM pode ser declarado por CENA",
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
+            )
+        
+        # Verifica se há comandos válidos
+        if (self.verificar(TipoToken.LEIA) or 
+            self.verificar(TipoToken.DIZ) or 
+            self.verificar(TipoToken.IDENTIFICADOR)):
+            return self.parser_comando()
+        
+        # Token inesperado, mas não é FIM_CENA nem EOF: é o mesmo erro que o
+        # consumo de FIM_CENA ao final do bloco reportaria
+        raise ErroSintatico(
+            "Esperado 'FIM_CENA' no final do programa",
+            posicao=self.token_atual.posicao,
+            mapa_linhas=self.token_atual.mapa_linhas
+        )
+        
     def parser_comando(self) -> Comando:
         """<comando> ::= <comando_leitura> | <comando_escrita> | <comando_atribuicao>"""
         if self.verificar(TipoToken.LEIA):
             return self.parser_comando_leitura()
         elif self.verificar(TipoToken.IDENTIFICADOR):
             # Precisa fazer lookahead para distinguir entre "Personagem diz" e "variavel ="
-            if self.posicao + 1 < len(self.tokens) and self.tokens[self.posicao + 1].tipo == TipoToken.DIZ:
+            proximo = self.espiar()
+            if proximo is not None and proximo.tipo == TipoToken.DIZ:
                 return self.parser_comando_escrita()
             else:
                 return self.parser_comando_atribuicao()
         else:
             raise ErroSintatico(
                 "Esperado comando (LEIA, DIZ ou atribuição)",
-                self.token_atual.linha,
-                self.token_atual.coluna
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
             )
     
     def parser_comando_leitura(self) -> ComandoLeitura:
@@ -355,12 +768,13 @@ class Parser:
         variavel_token = self.consumir(TipoToken.IDENTIFICADOR, "Esperado identificador após LEIA")
         variavel = variavel_token.lexema
         
-        # Verifica se a variável foi declarada (validação será feita na validação semântica)
-        # Aqui apenas armazenamos informação para validação posterior
+        # As declarações já foram todas lidas: verifica o uso aqui mesmo
+        if variavel not in self.variaveis_declaradas:
+            self._registrar_nao_declarada(variavel_token, "no comando LEIA")
         
         self.consumir(TipoToken.PONTO_VIRGULA, "Esperado ';' após comando LEIA")
         
-        return ComandoLeitura(variavel, variavel_token.linha, variavel_token.coluna)
+        return ComandoLeitura(variavel, variavel_token.posicao)
     
     def parser_comando_escrita(self) -> ComandoEscrita:
         """<comando_escrita> ::= IDENTIFICADOR DIZ <expressao> ;"""
@@ -372,8 +786,8 @@ class Parser:
         if self.nome_personagem and personagem != self.nome_personagem:
             raise ErroSemantico(
                 f"Personagem '{personagem}' usado no comando DIZ não corresponde ao personagem declarado '{self.nome_personagem}'",
-                personagem_token.linha,
-                personagem_token.coluna
+                posicao=personagem_token.posicao,
+                mapa_linhas=personagem_token.mapa_linhas
             )
         
         # diz
@@ -391,6 +805,8 @@ class Parser:
         """<comando_atribuicao> ::= IDENTIFICADOR = <expressao> ;"""
         variavel_token = self.consumir(TipoToken.IDENTIFICADOR, "Esperado identificador")
         variavel = variavel_token.lexema
+        if variavel not in self.variaveis_declaradas:
+            self._registrar_nao_declarada(variavel_token, "na atribuição")
         
         self.consumir(TipoToken.OP_ATRIBUICAO, "Esperado '=' após identificador")
         
@@ -398,11 +814,126 @@ class Parser:
         
         self.consumir(TipoToken.PONTO_VIRGULA, "Esperado ';' após expressão")
         
-        return ComandoAtribuicao(variavel, expressao, variavel_token.linha, variavel_token.coluna)
+        return ComandoAtribuicao(variavel, expressao, variavel_token.posicao)
     
     def parser_expressao(self) -> Expressao:
-        """<expressao> ::= <expressao_simples>"""
-        return self.parser_expressao_simples()
+        """<expressao> ::= <expressao_simples>
+
+        Versão iterativa de parser_expressao_simples/termo/fator/elemento: em vez
+        de quatro chamadas aninhadas por nível de parênteses, guarda os níveis
+        abertos em uma pilha explícita. Depois de cada operando, a precedência do
+        operador seguinte diz quantos níveis (Fator, Termo, ExpressaoSimples) são
+        fechados. Constrói a mesma AST que a versão recursiva, que é mantida para
+        comparação.
+        """
+        if self.ast_compacta:
+            return self.parser_expressao_compacta()
+        pilha = []  # Parênteses abertos: 7 itens por nível (token "(" e o estado do nível de fora)
+        termos, fatores, elementos = [], [], []
+        operador_termo = operador_fator = operador_elemento = ""
+        while True:
+            token = self.token_atual
+            tipo = token.tipo
+            if tipo == TipoToken.PARENTESE_ESQ:
+                pilha += (token, termos, operador_termo, fatores, operador_fator,
+                          elementos, operador_elemento)
+                termos, fatores, elementos = [], [], []
+                operador_termo = operador_fator = operador_elemento = ""
+                self.avancar()
+                continue
+            if tipo == TipoToken.IDENTIFICADOR:
+                elemento = Elemento(token.lexema, "IDENTIFICADOR", token.posicao)
+                if token.lexema not in self.variaveis_declaradas:
+                    self._registrar_nao_declarada(token, "na expressão")
+            elif tipo == TipoToken.NUM_INTEIRO:
+                elemento = Elemento(int(token.lexema), "NUM_INTEIRO", token.posicao)
+            elif tipo == TipoToken.NUM_REAL:
+                elemento = Elemento(float(token.lexema), "NUM_REAL", token.posicao)
+            elif tipo == TipoToken.STRING:
+                elemento = Elemento(token.lexema, "STRING", token.posicao)
+            else:
+                raise ErroSintatico(
+                    "Esperado identificador, número, string ou expressão entre parênteses",
+                    posicao=token.posicao,
+                    mapa_linhas=token.mapa_linhas
+                )
+            self.avancar()
+
+            # Fecha os níveis de precedência maior que a do próximo operador
+            while True:
+                elementos.append((operador_elemento, elemento))
+                tipo = self.token_atual.tipo
+                if tipo == TipoToken.OP_POTENCIACAO:
+                    operador_elemento = self.token_atual.lexema
+                    break
+                fatores.append((operador_fator, Fator(elementos)))
+                elementos, operador_elemento = [], ""
+                if tipo == TipoToken.OP_MULTIPLICACAO or tipo == TipoToken.OP_DIVISAO:
+                    operador_fator = self.token_atual.lexema
+                    break
+                termos.append((operador_termo, Termo(fatores)))
+                fatores, operador_fator = [], ""
+                if tipo == TipoToken.OP_ADICAO or tipo == TipoToken.OP_SUBTRACAO:
+                    operador_termo = self.token_atual.lexema
+                    break
+                expressao = ExpressaoSimples(termos)
+                if not pilha:
+                    return expressao
+                self.consumir(TipoToken.PARENTESE_DIR, "Esperado ')' após expressão")
+                (abre, termos, operador_termo, fatores, operador_fator,
+                 elementos, operador_elemento) = pilha[-7:]
+                del pilha[-7:]
+                elemento = Elemento(expressao, "EXPRESSAO", abre.posicao)
+            self.avancar()
+    
+    def parser_expressao_compacta(self) -> NoCompacto:
+        """<expressao> na AST compacta, por precedência de operadores com pilhas
+        explícitas de operandos e operadores. Aceita as mesmas entradas e lança
+        os mesmos erros que parser_expressao."""
+        operandos = []
+        operadores = []  # (precedência, lexema); None marca um '(' aberto
+        while True:
+            token = self.token_atual
+            tipo = token.tipo
+            if tipo == TipoToken.PARENTESE_ESQ:
+                operadores.append(None)
+                self.avancar()
+                continue
+            if tipo == TipoToken.IDENTIFICADOR:
+                operandos.append(Nome(token.lexema, token.posicao))
+                if token.lexema not in self.variaveis_declaradas:
+                    self._registrar_nao_declarada(token, "na expressão")
+            elif tipo == TipoToken.NUM_INTEIRO:
+                operandos.append(Literal(int(token.lexema), "NUM_INTEIRO", token.posicao))
+            elif tipo == TipoToken.NUM_REAL:
+                operandos.append(Literal(float(token.lexema), "NUM_REAL", token.posicao))
+            elif tipo == TipoToken.STRING:
+                operandos.append(Literal(token.lexema, "STRING", token.posicao))
+            else:
+                raise ErroSintatico(
+                    "Esperado identificador, número, string ou expressão entre parênteses",
+                    posicao=token.posicao,
+                    mapa_linhas=token.mapa_linhas
+                )
+            self.avancar()
+
+            while True:
+                token = self.token_atual
+                precedencia = _PRECEDENCIA.get(token.tipo)
+                # Reduz os operadores pendentes que ligam mais forte que o próximo
+                while operadores and operadores[-1] is not None and (
+                        precedencia is None or operadores[-1][0] > precedencia or
+                        (operadores[-1][0] == precedencia and precedencia != _PRECEDENCIA_POTENCIA)):
+                    direita = operandos.pop()
+                    operandos[-1] = Binario(operadores.pop()[1], operandos[-1], direita)
+                if precedencia is not None:
+                    operadores.append((precedencia, token.lexema))
+                    self.avancar()
+                    break
+                if not operadores:
+                    return operandos[0]
+                self.consumir(TipoToken.PARENTESE_DIR, "Esperado ')' após expressão")
+                operadores.pop()
     
     def parser_expressao_simples(self) -> ExpressaoSimples:
         """<expressao_simples> ::= <termo> <resto_expressao_simples>"""
@@ -460,45 +991,54 @@ class Parser:
         if self.verificar(TipoToken.IDENTIFICADOR):
             token = self.token_atual
             valor = token.lexema
+            if valor not in self.variaveis_declaradas:
+                self._registrar_nao_declarada(token, "na expressão")
             self.avancar()
-            return Elemento(valor, "IDENTIFICADOR", token.linha, token.coluna)
+            return Elemento(valor, "IDENTIFICADOR", token.posicao)
         
         elif self.verificar(TipoToken.NUM_INTEIRO):
             token = self.token_atual
             valor = int(token.lexema)
             self.avancar()
-            return Elemento(valor, "NUM_INTEIRO", token.linha, token.coluna)
+            return Elemento(valor, "NUM_INTEIRO", token.posicao)
         
         elif self.verificar(TipoToken.NUM_REAL):
             token = self.token_atual
             valor = float(token.lexema)
             self.avancar()
-            return Elemento(valor, "NUM_REAL", token.linha, token.coluna)
+            return Elemento(valor, "NUM_REAL", token.posicao)
         
         elif self.verificar(TipoToken.STRING):
             token = self.token_atual
             valor = token.lexema
             self.avancar()
-            return Elemento(valor, "STRING", token.linha, token.coluna)
+            return Elemento(valor, "STRING", token.posicao)
         
         elif self.verificar(TipoToken.PARENTESE_ESQ):
             token = self.token_atual
             self.avancar()
-            expressao = self.parser_expressao()
+            expressao = self.parser_expressao_simples()
             self.consumir(TipoToken.PARENTESE_DIR, "Esperado ')' após expressão")
-            return Elemento(expressao, "EXPRESSAO", token.linha, token.coluna)
+            return Elemento(expressao, "EXPRESSAO", token.posicao)
         
         else:
             raise ErroSintatico(
                 "Esperado identificador, número, string ou expressão entre parênteses",
-                self.token_atual.linha,
-                self.token_atual.coluna
+                posicao=self.token_atual.posicao,
+                mapa_linhas=self.token_atual.mapa_linhas
             )
     
     # ... (início do arquivo parser.py)
 
-    def validar_semantica(self, programa: Programa):
-        """Valida regras semânticas do programa"""
+    def validar_semantica(self, programa: Programa, mapa_linhas: IndiceLinhas = None):
+        """Valida regras semânticas de um programa já construído (parse() já faz
+        essas verificações durante a análise).
+
+        As posições dos nós são deslocamentos na fonte do programa: `mapa_linhas`
+        é o IndiceLinhas dela. Sem ele vale o da fonte dos tokens deste parser,
+        se houver um token atual; senão o ErroSemantico sai sem linha e coluna."""
+        if mapa_linhas is None and self.token_atual is not None:
+            mapa_linhas = self.token_atual.mapa_linhas
         # Coleta todas as variáveis declaradas
         variaveis_declaradas = set()
         for decl in programa.personagem.declaracoes:
@@ -510,56 +1050,94 @@ class Parser:
                 if comando.variavel not in variaveis_declaradas:
                     raise ErroSemantico(
                         f"Variável '{comando.variavel}' não foi declarada antes do uso no comando LEIA",
-                        comando.linha,
-                        comando.coluna
+                        posicao=comando.posicao,
+                        mapa_linhas=mapa_linhas
                     )
             elif isinstance(comando, ComandoAtribuicao):
                 if comando.variavel not in variaveis_declaradas:
                     raise ErroSemantico(
                         f"Variável '{comando.variavel}' não foi declarada antes do uso na atribuição",
-                        comando.linha,
-                        comando.coluna
+                        posicao=comando.posicao,
+                        mapa_linhas=mapa_linhas
                     )
                 # Valida variáveis na expressão
-                self._validar_variaveis_expressao(comando.expressao, variaveis_declaradas)
+                self._validar_variaveis_expressao(comando.expressao, variaveis_declaradas, mapa_linhas)
             elif isinstance(comando, ComandoEscrita):
                 # Valida variáveis na expressão
-                self._validar_variaveis_expressao(comando.expressao, variaveis_declaradas)
-    
-    def _validar_variaveis_expressao(self, expressao: Expressao, variaveis_declaradas: set):
-        """Valida se todas as variáveis usadas na expressão foram declaradas"""
-        if isinstance(expressao, ExpressaoSimples):
-            for operador, termo in expressao.termos:
-                self._validar_variaveis_termo(termo, variaveis_declaradas)
+                self._validar_variaveis_expressao(comando.expressao, variaveis_declaradas, mapa_linhas)
     
-    def _validar_variaveis_termo(self, termo: Termo, variaveis_declaradas: set):
-        """Valida variáveis em um termo"""
-        for operador, fator in termo.fatores:
-            self._validar_variaveis_fator(fator, variaveis_declaradas)
-    
-    def _validar_variaveis_fator(self, fator: Fator, variaveis_declaradas: set):
-        """Valida variáveis em um fator"""
-        for operador, elemento in fator.elementos:
-            self._validar_variaveis_elemento(elemento, variaveis_declaradas)
+    def _validar_variaveis_expressao(self, expressao: Expressao, variaveis_declaradas: set,
+                                     mapa_linhas: IndiceLinhas = None):
+        """Valida se todas as variáveis usadas na expressão foram declaradas.
+        Usa uma pilha explícita de iteradores (um por nível de parênteses), na
+        mesma ordem da descida recursiva, sem limite de aninhamento."""
+        if isinstance(expressao, NoCompacto):
+            self._validar_variaveis_compacta(expressao, variaveis_declaradas, mapa_linhas)
+            return
+        pilha = [_elementos_da_expressao(expressao)]
+        while pilha:
+            for elemento in pilha[-1]:
+                if elemento.tipo == 'IDENTIFICADOR':
+                    if elemento.valor not in variaveis_declaradas:
+                        raise ErroSemantico(
+                            f"Variável '{elemento.valor}' não foi declarada antes do uso na expressão",
+                            posicao=elemento.posicao,
+                            mapa_linhas=mapa_linhas
+                        )
+                elif elemento.tipo == 'EXPRESSAO':
+                    pilha.append(_elementos_da_expressao(elemento.valor))
+                    break
+            else:
+                pilha.pop()
     
-    def _validar_variaveis_elemento(self, elemento: Elemento, variaveis_declaradas: set):
-        """Valida variáveis em um elemento"""
-        if elemento.tipo == 'IDENTIFICADOR':
-            if elemento.valor not in variaveis_declaradas:
+    def _validar_variaveis_compacta(self, no: NoCompacto, variaveis_declaradas: set,
+                                    mapa_linhas: IndiceLinhas = None):
+        """Como _validar_variaveis_expressao, para a AST compacta (da esquerda para a direita)"""
+        pilha = [no]
+        while pilha:
+            no = pilha.pop()
+            if isinstance(no, Binario):
+                pilha.append(no.direita)
+                pilha.append(no.esquerda)
+            elif isinstance(no, Nome) and no.nome not in variaveis_declaradas:
                 raise ErroSemantico(
-                    f"Variável '{elemento.valor}' não foi declarada antes do uso na expressão",
-                    elemento.linha,
-                    elemento.coluna
+                    f"Variável '{no.nome}' não foi declarada antes do uso na expressão",
+                    posicao=no.posicao,
+                    mapa_linhas=mapa_linhas
                 )
-        elif elemento.tipo == 'EXPRESSAO':
-            self._validar_variaveis_expressao(elemento.valor, variaveis_declaradas)
+    
+    def _registrar_nao_declarada(self, token: Token, contexto: str):
+        """Guarda o primeiro uso de variável não declarada encontrado na análise
+        (todos, no modo de recuperação)"""
+        if self._erro_semantico is None or self.recuperar_erros:
+            erro = ErroSemantico(
+                f"Variável '{token.lexema}' não foi declarada antes do uso {contexto}",
+                posicao=token.posicao,
+                mapa_linhas=token.mapa_linhas
+            )
+            if self._erro_semantico is None:
+                self._erro_semantico = erro
+            if self.recuperar_erros:
+                self.erros.append(erro)
     
     def parse(self) -> Programa:
         """Método principal que inicia a análise sintática.
-        Lança ErroSintatico ou ErroSemantico em caso de falha."""
+        Lança ErroSintatico ou ErroSemantico em caso de falha.
+
+        O uso de variáveis não declaradas é verificado enquanto os comandos são
+        construídos, sem uma segunda passada pela AST; validar_semantica continua
+        disponível para ASTs montadas de outra forma.
+
+        Com recuperar_erros=True não lança: retorna a AST parcial (só os comandos
+        e declarações completos) e deixa todos os erros em self.erros, na ordem
+        da fonte, e em self.erro_principal o que seria lançado sem recuperação."""
         programa = self.parser_programa()
-        # Validação semântica após parsing completo
-        self.validar_semantica(programa)
+        if self.recuperar_erros:
+            if self.erro_principal is None:
+                self.erro_principal = self._erro_semantico
+            return programa
+        if self._erro_semantico is not None:
+            raise self._erro_semantico
         return programa
 
 # ... (resto do arquivo)
@@ -611,9 +1189,324 @@ class Parser:
                     print(f"{indentacao}  Operador: {operador}")
                 self.imprimir_ast(elemento, nivel + 2)
         
+        elif isinstance(no, Binario):
+            print(f"{indentacao}Binário: {no.operador}")
+            self.imprimir_ast(no.esquerda, nivel + 1)
+            self.imprimir_ast(no.direita, nivel + 1)
+        
+        elif isinstance(no, Nome):
+            print(f"{indentacao}Nome: {no.nome}")
+        
+        elif isinstance(no, Literal):
+            print(f"{indentacao}Literal: {no.valor} ({no.tipo})")
+        
         elif isinstance(no, Elemento):
             if no.tipo == "EXPRESSAO":
                 print(f"{indentacao}Elemento: (expressão)")
                 self.imprimir_ast(no.valor, nivel + 1)
             else:
                 print(f"{indentacao}Elemento: {no.valor} ({no.tipo})")
+
+
+class _Segmento:
+    """Um item do bloco de comandos em ParserIncremental: os tokens de um comando
+    até o ';' que o encerra. Um item com erro vai até o próximo ';' (inclusive),
+    FIM_CENA ou EOF. As posições ficam desatualizadas além do corte do parser."""
+
+    __slots__ = ('comando', 'erro', 'posicao_erro', 'parado', 'nomes', 'nao_declarada', 'entregue')
+
+    def __init__(self, comando: Comando = None, erro: '_ErroComPosicao' = None):
+        self.comando = comando
+        self.erro = erro  # Erro imediato (sintático ou semântico) do item
+        self.posicao_erro = erro.posicao if erro is not None else None
+        # Item com erro que parou em FIM_CENA ou EOF: depende desse token também
+        self.parado = False
+        self.nomes = frozenset()  # Variáveis usadas pelo comando
+        self.nao_declarada = None  # (nome, nó, contexto) do primeiro uso não declarado
+        self.entregue = False  # O comando já saiu em um Programa de parse(): não é mais alterado
+
+
+class ParserIncremental:
+    """Mantém o Programa de uma fonte e o atualiza a cada edição, reanalisando
+    só os comandos atingidos.
+
+    Comandos não se aninham e terminam em ';': o bloco de comandos é uma
+    sequência de itens (_Segmento) cujas fronteiras não dependem do que vem
+    antes. Uma edição relexa as linhas editadas (lexer.relexar), e os itens são
+    reanalisados a partir do primeiro que toca essas linhas até um item que
+    termina no mesmo token de um item antigo, depois do trecho relexado: dali
+    em diante os itens antigos, e seus objetos Comando, são reaproveitados.
+    Editar o cabeçalho (CENA, PERSONAGEM, MEMORIA) reanalisa o cabeçalho; se o
+    personagem for o mesmo, só os comandos que usam uma variável cuja
+    declaração mudou são verificados de novo.
+
+    Como no TokenBuffer, o deslocamento das posições dos itens depois da edição
+    não é aplicado: `_delta` vale para os itens a partir de `_corte`. parse()
+    aplica o deslocamento pendente; `erro` não precisa dele. Um Comando que já
+    saiu em um Programa de parse() nunca é alterado: se as posições dele
+    mudam, o item passa a ter uma cópia deslocada, e os Programa anteriores
+    continuam com as posições da fonte de quando foram devolvidos.
+    """
+
+    def __init__(self, fonte: str, ast_compacta: bool = False):
+        self.buffer, self.erros_lexicos = LexerRegex(fonte).tokenizar_buffer()
+        self.ast_compacta = ast_compacta
+        self.comandos_reanalisados = 0  # Itens analisados na última edição
+        self._analisar_tudo()
+
+    @property
+    def fonte(self) -> str:
+        return self.buffer.fonte
+
+    def _parser_em(self, indice: int) -> Parser:
+        """Parser sobre o buffer, posicionado no token `indice` do bloco de comandos"""
+        parser = Parser(self.buffer, self.ast_compacta)
+        parser.posicao = indice
+        parser.token_atual = self.buffer[indice]
+        parser.nivel_cena = 1
+        parser.variaveis_declaradas = self._variaveis
+        parser.nome_personagem = self._cabecalho[1].nome
+        return parser
+
+    def _analisar_cabecalho(self) -> Union[Parser, None]:
+        """Analisa CENA/PERSONAGEM/MEMORIA. Retorna o parser parado no primeiro
+        comando, ou None se o cabeçalho tiver erro (guardado em _erro_cabecalho)."""
+        parser = Parser(self.buffer, self.ast_compacta)
+        try:
+            cabecalho = parser.parser_cabecalho()
+        except _ErroComPosicao as erro:
+            self._erro_cabecalho = erro
+            self._cabecalho = None
+            self._fim_cabecalho = None
+            self._alcance_cabecalho = None
+            self._limpar_itens()
+            return None
+        self._erro_cabecalho = None
+        self._cabecalho = cabecalho
+        self._variaveis = parser.variaveis_declaradas
+        self._fim_cabecalho = self.buffer.fim(parser.posicao - 1)
+        # Sem MEMORIA, o cabeçalho depende também do token seguinte
+        self._alcance_cabecalho = self.buffer.inicio(parser.posicao)
+        return parser
+
+    def _limpar_itens(self):
+        self._segmentos = []
+        self._inicios = []  # Posição do primeiro token de cada item
+        self._fins = []  # Posição do fim do último token de cada item
+        self._corte = 0
+        self._delta = 0
+        # Quantos itens têm erro e quantos usam variável não declarada: sem
+        # nenhum, `erro` não percorre os itens
+        self._com_erro = 0
+        self._com_nao_declarada = 0
+
+    def _contar(self, segmentos: List[_Segmento], sinal: int):
+        for segmento in segmentos:
+            if segmento.erro is not None:
+                self._com_erro += sinal
+            elif segmento.nao_declarada is not None:
+                self._com_nao_declarada += sinal
+
+    def _analisar_tudo(self):
+        parser = self._analisar_cabecalho()
+        if parser is not None:
+            self._limpar_itens()
+            self._analisar_itens(parser, 0, None, 0)
+
+    def _analisar_item(self, parser: Parser) -> _Segmento:
+        """Analisa um item do bloco de comandos a partir do token atual do parser"""
+        try:
+            segmento = _Segmento(parser.parser_item_comando())
+        except _ErroComPosicao as erro:
+            # Pula até o ';' (consumido), FIM_CENA ou EOF
+            while parser.token_atual.tipo not in (TipoToken.PONTO_VIRGULA, TipoToken.FIM_CENA, TipoToken.EOF):
+                parser.avancar()
+            segmento = _Segmento(erro=erro)
+            if parser.verificar(TipoToken.PONTO_VIRGULA):
+                parser.avancar()
+            else:
+                segmento.parado = True
+            return segmento
+        self._verificar_nomes(segmento)
+        return segmento
+
+    def _verificar_nomes(self, segmento: _Segmento):
+        """Recalcula as variáveis usadas pelo comando e o primeiro uso não declarado"""
+        nomes = set()
+        segmento.nao_declarada = None
+        for no in _nos_do_comando(segmento.comando):
+            if isinstance(no, ComandoLeitura):
+                nome, contexto = no.variavel, "no comando LEIA"
+            elif isinstance(no, ComandoAtribuicao):
+                nome, contexto = no.variavel, "na atribuição"
+            elif isinstance(no, Nome):
+                nome, contexto = no.nome, "na expressão"
+            elif isinstance(no, Elemento) and no.tipo == 'IDENTIFICADOR':
+                nome, contexto = no.valor, "na expressão"
+            else:
+                continue
+            nomes.add(nome)
+            if segmento.nao_declarada is None and nome not in self._variaveis:
+                segmento.nao_declarada = (nome, no, contexto)
+        segmento.nomes = frozenset(nomes)
+
+    def _analisar_itens(self, parser: Parser, k: int, fim_novo: Union[int, None], delta: int) -> int:
+        """Analisa itens a partir do token atual do parser e os coloca no lugar dos
+        itens antigos a partir de `k`. Para quando o próximo item começa depois de
+        `fim_novo` (fora do trecho relexado) no mesmo token que um item antigo
+        (posições antigas = novas - delta), ou no fim do bloco. Retorna o número
+        de itens analisados."""
+        buffer = self.buffer
+        novos = []
+        inicios_novos = []
+        fins_novos = []
+        fim_velho = None
+        while not (parser.verificar(TipoToken.FIM_CENA) or parser.verificar(TipoToken.EOF)):
+            proximo = parser.token_atual.posicao
+            if fim_novo is not None and proximo >= fim_novo:
+                # Daqui em diante os tokens são os antigos: procura o item antigo
+                # que começa no mesmo token
+                alvo = proximo - delta - self._delta
+                m = bisect_left(self._inicios, alvo, k)
+                if m < len(self._inicios) and self._inicios[m] == alvo:
+                    fim_velho = m
+                    break
+            novos.append(self._analisar_item(parser))
+            inicios_novos.append(proximo)
+            fins_novos.append(buffer.fim(parser.posicao - 1))
+        if fim_velho is None:
+            # Chegou ao fim do bloco: os itens antigos restantes deixam de existir
+            fim_velho = len(self._segmentos)
+            self._fim_cena = parser.verificar(TipoToken.FIM_CENA)
+        self._contar(self._segmentos[k:fim_velho], -1)
+        self._contar(novos, 1)
+        self._segmentos[k:fim_velho] = novos
+        self._inicios[k:fim_velho] = inicios_novos
+        self._fins[k:fim_velho] = fins_novos
+        self._corte = k + len(novos)
+        self._delta += delta
+        return len(novos)
+
+    def _mover_corte(self, indice: int):
+        """Aplica o deslocamento pendente aos itens entre o corte e `indice` (ou o
+        desfaz, se `indice` estiver antes do corte)"""
+        corte = self._corte
+        if indice > corte:
+            trecho, delta = range(corte, indice), self._delta
+        else:
+            trecho, delta = range(indice, corte), -self._delta
+        if delta:
+            inicios, fins = self._inicios, self._fins
+            for i in trecho:
+                inicios[i] += delta
+                fins[i] += delta
+                segmento = self._segmentos[i]
+                if segmento.erro is not None:
+                    segmento.posicao_erro += delta
+                elif segmento.entregue:
+                    self._trocar_comando(segmento, _copiar_comando(segmento.comando, delta))
+                else:
+                    for no in _nos_do_comando(segmento.comando):
+                        if no.posicao is not None:
+                            no.posicao += delta
+        self._corte = indice
+
+    @staticmethod
+    def _trocar_comando(segmento: _Segmento, comando: Comando):
+        """Põe a cópia `comando` no item, com o nó do uso não declarado na cópia"""
+        if segmento.nao_declarada is not None:
+            nome, no, contexto = segmento.nao_declarada
+            for antigo, novo in zip(_nos_do_comando(segmento.comando), _nos_do_comando(comando)):
+                if antigo is no:
+                    segmento.nao_declarada = (nome, novo, contexto)
+                    break
+        segmento.comando = comando
+        segmento.entregue = False
+
+    def editar(self, posicao: int, removidos: int, inseridos: str):
+        """Aplica uma edição (como em lexer.relexar) e atualiza a análise"""
+        buffer = self.buffer
+        inicio = buffer.fonte.rfind('\n', 0, posicao) + 1
+        self.buffer, self.erros_lexicos = relexar(buffer, posicao, removidos, inseridos)
+        if '\0' in inseridos or self._erro_cabecalho is not None:
+            self._analisar_tudo()
+            self.comandos_reanalisados = len(self._segmentos)
+            return
+        delta = len(inseridos) - removidos
+        quebra = buffer.fonte.find('\n', posicao + len(inseridos))
+        fim_novo = len(buffer.fonte) if quebra < 0 else quebra + 1
+
+        if inicio <= self._alcance_cabecalho:
+            variaveis_antigas = set(self._variaveis)
+            personagem_antigo = self._cabecalho[1].nome
+            parser = self._analisar_cabecalho()
+            if parser is None:
+                self.comandos_reanalisados = 0
+                return
+            if self._cabecalho[1].nome != personagem_antigo:
+                # Os comandos DIZ dependem do nome do personagem
+                self._analisar_tudo()
+                self.comandos_reanalisados = len(self._segmentos)
+                return
+            self._mover_corte(0)
+            self.comandos_reanalisados = self._analisar_itens(parser, 0, fim_novo, delta)
+            alteradas = variaveis_antigas.symmetric_difference(self._variaveis)
+            if alteradas:
+                # Só os comandos que usam uma variável alterada são verificados de novo
+                for segmento in self._segmentos[self.comandos_reanalisados:]:
+                    if segmento.erro is None and not segmento.nomes.isdisjoint(alteradas):
+                        self._contar((segmento,), -1)
+                        self._verificar_nomes(segmento)
+                        self._contar((segmento,), 1)
+            return
+
+        # Primeiro item que termina depois do início do trecho relexado
+        k = bisect_right(self._fins, inicio, 0, self._corte)
+        if k == self._corte:
+            k = bisect_right(self._fins, inicio - self._delta, self._corte)
+        if k == len(self._segmentos) and k and self._segmentos[-1].parado:
+            k -= 1
+        self._mover_corte(k)
+        anterior = self._fins[k - 1] if k else self._fim_cabecalho
+        parser = self._parser_em(buffer.localizar(anterior))
+        self.comandos_reanalisados = self._analisar_itens(parser, k, fim_novo, delta)
+
+    def _posicao(self, indice: int, posicao: int) -> int:
+        return posicao + self._delta if indice >= self._corte else posicao
+
+    @property
+    def erro(self) -> Union['_ErroComPosicao', None]:
+        """O erro que parse() lançaria (None se não houver)"""
+        if self._erro_cabecalho is not None:
+            return self._erro_cabecalho
+        if self._com_erro == 0 and self._fim_cena and self._com_nao_declarada == 0:
+            return None
+        mapa_linhas = self.buffer.mapa_linhas
+        for indice, segmento in enumerate(self._segmentos if self._com_erro else ()):
+            if segmento.erro is not None:
+                erro = segmento.erro
+                return type(erro)(erro.mensagem, posicao=self._posicao(indice, segmento.posicao_erro),
+                                  mapa_linhas=mapa_linhas)
+        if not self._fim_cena:
+            # Os itens foram até o EOF
+            return ErroSintatico("Esperado 'FIM_CENA' no final do programa",
+                                 posicao=self.buffer.inicio(len(self.buffer) - 1), mapa_linhas=mapa_linhas)
+        for indice, segmento in enumerate(self._segmentos):
+            if segmento.nao_declarada is not None:
+                nome, no, contexto = segmento.nao_declarada
+                return ErroSemantico(f"Variável '{nome}' não foi declarada antes do uso {contexto}",
+                                     posicao=self._posicao(indice, no.posicao), mapa_linhas=mapa_linhas)
+        return None
+
+    def parse(self) -> Programa:
+        """Como Parser.parse(): lança o erro da análise ou retorna o Programa, com
+        os objetos Comando reaproveitados entre edições (os que não mudaram de
+        posição)"""
+        erro = self.erro
+        if erro is not None:
+            raise erro
+        self._mover_corte(len(self._segmentos))
+        nome_cena, personagem = self._cabecalho
+        for segmento in self._segmentos:
+            segmento.entregue = True
+        return Programa(nome_cena, personagem, [segmento.comando for segmento in self._segmentos])
@@ -1,16 +1,51 @@
+import hashlib
+import importlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Iterable, List, Union
+
+from cache import gravar_conteiner, ler_conteiner
+from parser import (Programa, Personagem, Declaracao, ComandoLeitura, ComandoEscrita, ComandoAtribuicao,
+                    ExpressaoSimples, Termo, Fator, Elemento, ErroSintatico, ErroSemantico)
+from tokens import Token, TipoToken
+
 EPSILON = "ε"
 
 
+# Mensagem do erro sintático comum a todas as posições onde começa uma expressão
+_ESPERADO_EXPRESSAO = "Esperado identificador, número, string ou expressão entre parênteses"
+
+
 class Grammar:
+    """Gramática completa da DRAMATICA.
+
+    Cada produção tem uma ação semântica (nome de um método de ParserSLR, ou None
+    para repassar o valor do único símbolo do corpo) e, opcionalmente, as
+    mensagens de erro para as posições do ponto no corpo: as mesmas que o Parser
+    recursivo lança naquele ponto. Uma mensagem é um dicionário tipo do token ->
+    (semântico?, texto), com None para qualquer outro token."""
+
     def __init__(self):
         self.start_symbol = "Programa"
         self.nonterminals = [
             "S'",
             "Programa",
+            "Personagem",
+            "Memoria",
+            "Declaracoes",
+            "Declaracao",
+            "NomeDeclaracao",
+            "Tipo",
             "Comandos",
             "Comando",
             "ComandoLeitura",
             "ComandoEscrita",
+            "Fala",
             "ComandoAtribuicao",
             "Expressao",
             "ExpressaoSimples",
@@ -19,264 +54,908 @@ class Grammar:
             "Elemento",
         ]
         self.terminals = [
+            "CENA",
+            "FIM_CENA",
+            "PERSONAGEM",
+            "MEMORIA",
+            "FIM_MEMORIA",
+            "VARCHAR",
+            "INT",
+            "FLOAT",
             "LEIA",
-            "ESCREVA",
+            "DIZ",
             "IDENTIFICADOR",
             "NUM_INTEIRO",
             "NUM_REAL",
+            "STRING",
             "OP_ADICAO",
             "OP_SUBTRACAO",
             "OP_MULTIPLICACAO",
             "OP_DIVISAO",
             "OP_POTENCIACAO",
             "OP_ATRIBUICAO",
+            "DOIS_PONTOS",
             "PONTO_VIRGULA",
             "PARENTESE_ESQ",
             "PARENTESE_DIR",
             "EOF",
         ]
         self.productions = []
+        self.actions = []
+        self.error_messages = {}  # (produção, ponto) -> {tipo do token ou None: (semântico?, texto)}
         self._build_productions()
 
+    def _add(self, cabeca, corpo, acao=None, erros=None):
+        """Acrescenta uma produção; `erros` é {ponto: texto ou dicionário de mensagens}"""
+        indice = len(self.productions)
+        self.productions.append((cabeca, corpo))
+        self.actions.append(acao)
+        for ponto, mensagem in (erros or {}).items():
+            if isinstance(mensagem, str):
+                mensagem = {None: (False, mensagem)}
+            self.error_messages[(indice, ponto)] = mensagem
+
     def _build_productions(self):
-        p = self.productions
+        add = self._add
         # 0: S' -> Programa
-        p.append(("S'", ["Programa"]))
-        # 1: Programa -> Comandos
-        p.append(("Programa", ["Comandos"]))
-        # 2: Comandos -> Comando Comandos
-        p.append(("Comandos", ["Comando", "Comandos"]))
-        # 3: Comandos -> Comando
-        p.append(("Comandos", ["Comando"]))
-        # 4: Comando -> ComandoLeitura
-        p.append(("Comando", ["ComandoLeitura"]))
-        # 5: Comando -> ComandoEscrita
-        p.append(("Comando", ["ComandoEscrita"]))
-        # 6: Comando -> ComandoAtribuicao
-        p.append(("Comando", ["ComandoAtribuicao"]))
-        # 7: ComandoLeitura -> LEIA IDENTIFICADOR PONTO_VIRGULA
-        p.append(("ComandoLeitura", ["LEIA", "IDENTIFICADOR", "PONTO_VIRGULA"]))
-        # 8: ComandoEscrita -> ESCREVA IDENTIFICADOR PONTO_VIRGULA
-        p.append(("ComandoEscrita", ["ESCREVA", "IDENTIFICADOR", "PONTO_VIRGULA"]))
-        # 9: ComandoAtribuicao -> IDENTIFICADOR OP_ATRIBUICAO Expressao PONTO_VIRGULA
-        p.append(("ComandoAtribuicao", ["IDENTIFICADOR", "OP_ATRIBUICAO", "Expressao", "PONTO_VIRGULA"]))
-        # 10: Expressao -> ExpressaoSimples
-        p.append(("Expressao", ["ExpressaoSimples"]))
-        # 11: ExpressaoSimples -> ExpressaoSimples OP_ADICAO Termo
-        p.append(("ExpressaoSimples", ["ExpressaoSimples", "OP_ADICAO", "Termo"]))
-        # 12: ExpressaoSimples -> ExpressaoSimples OP_SUBTRACAO Termo
-        p.append(("ExpressaoSimples", ["ExpressaoSimples", "OP_SUBTRACAO", "Termo"]))
-        # 13: ExpressaoSimples -> Termo
-        p.append(("ExpressaoSimples", ["Termo"]))
-        # 14: Termo -> Termo OP_MULTIPLICACAO Fator
-        p.append(("Termo", ["Termo", "OP_MULTIPLICACAO", "Fator"]))
-        # 15: Termo -> Termo OP_DIVISAO Fator
-        p.append(("Termo", ["Termo", "OP_DIVISAO", "Fator"]))
-        # 16: Termo -> Fator
-        p.append(("Termo", ["Fator"]))
-        # 17: Fator -> Fator OP_POTENCIACAO Elemento
-        p.append(("Fator", ["Fator", "OP_POTENCIACAO", "Elemento"]))
-        # 18: Fator -> Elemento
-        p.append(("Fator", ["Elemento"]))
-        # 19: Elemento -> IDENTIFICADOR
-        p.append(("Elemento", ["IDENTIFICADOR"]))
-        # 20: Elemento -> NUM_INTEIRO
-        p.append(("Elemento", ["NUM_INTEIRO"]))
-        # 21: Elemento -> NUM_REAL
-        p.append(("Elemento", ["NUM_REAL"]))
-        # 22: Elemento -> PARENTESE_ESQ Expressao PARENTESE_DIR
-        p.append(("Elemento", ["PARENTESE_ESQ", "Expressao", "PARENTESE_DIR"]))
+        add("S'", ["Programa"])
+        # 1: Programa -> CENA IDENTIFICADOR DOIS_PONTOS Personagem Comandos FIM_CENA
+        add("Programa", ["CENA", "IDENTIFICADOR", "DOIS_PONTOS", "Personagem", "Comandos", "FIM_CENA"],
+            "_reduzir_programa", {
+                0: "Esperado 'CENA' no início do programa",
+                1: "Esperado nome da cena após 'CENA'",
+                2: "Esperado ':' após nome da cena",
+                3: "Esperado 'PERSONAGEM'",
+                # Tokens fora do lugar no bloco de comandos
+                5: {
+                    None: (False, "Esperado 'FIM_CENA' no final do programa"),
+                    "DIZ": (False, "Esperado comando (LEIA, DIZ ou atribuição)"),
+                    "MEMORIA": (True, "Bloco MEMORIA deve ser declarado antes dos comandos, dentro do bloco PERSONAGEM"),
+                    "CENA": (True, "Bloco CENA não pode ser declarado dentro de outro bloco CENA"),
+                    "PERSONAGEM": (True, "Apenas um PERSONAGEM pode ser declarado por CENA"),
+                },
+            })
+        # 2: Personagem -> PERSONAGEM IDENTIFICADOR DOIS_PONTOS Memoria
+        add("Personagem", ["PERSONAGEM", "IDENTIFICADOR", "DOIS_PONTOS", "Memoria"], "_reduzir_personagem", {
+            1: "Esperado nome do personagem",
+            2: "Esperado ':' após nome do personagem",
+        })
+        # 3: Memoria -> MEMORIA DOIS_PONTOS Declaracoes FIM_MEMORIA
+        add("Memoria", ["MEMORIA", "DOIS_PONTOS", "Declaracoes", "FIM_MEMORIA"], "_reduzir_memoria", {
+            1: "Esperado ':' após 'MEMORIA'",
+            3: "Esperado 'FIM_MEMORIA' após declarações",
+        })
+        # 4: Memoria -> ε
+        add("Memoria", [], "_reduzir_lista_vazia")
+        # 5: Declaracoes -> Declaracoes Declaracao
+        add("Declaracoes", ["Declaracoes", "Declaracao"], "_reduzir_lista")
+        # 6: Declaracoes -> ε
+        add("Declaracoes", [], "_reduzir_lista_vazia")
+        # 7: Declaracao -> NomeDeclaracao DOIS_PONTOS Tipo PONTO_VIRGULA
+        add("Declaracao", ["NomeDeclaracao", "DOIS_PONTOS", "Tipo", "PONTO_VIRGULA"], "_reduzir_declaracao", {
+            1: "Esperado ':' após identificador",
+            2: "Esperado tipo (VARCHAR, INT ou FLOAT)",
+            3: "Esperado ';' após declaração",
+        })
+        # 8: NomeDeclaracao -> IDENTIFICADOR (verifica redeclaração antes do ':', como o Parser)
+        add("NomeDeclaracao", ["IDENTIFICADOR"], "_reduzir_nome_declaracao")
+        # 9-11: Tipo -> VARCHAR | INT | FLOAT
+        add("Tipo", ["VARCHAR"], "_reduzir_tipo")
+        add("Tipo", ["INT"], "_reduzir_tipo")
+        add("Tipo", ["FLOAT"], "_reduzir_tipo")
+        # 12: Comandos -> Comandos Comando
+        add("Comandos", ["Comandos", "Comando"], "_reduzir_lista")
+        # 13: Comandos -> ε
+        add("Comandos", [], "_reduzir_lista_vazia")
+        # 14-16: Comando -> ComandoLeitura | ComandoEscrita | ComandoAtribuicao
+        add("Comando", ["ComandoLeitura"])
+        add("Comando", ["ComandoEscrita"])
+        add("Comando", ["ComandoAtribuicao"])
+        # 17: ComandoLeitura -> LEIA IDENTIFICADOR PONTO_VIRGULA
+        add("ComandoLeitura", ["LEIA", "IDENTIFICADOR", "PONTO_VIRGULA"], "_reduzir_leitura", {
+            1: "Esperado identificador após LEIA",
+            2: "Esperado ';' após comando LEIA",
+        })
+        # 18: ComandoEscrita -> Fala Expressao PONTO_VIRGULA
+        add("ComandoEscrita", ["Fala", "Expressao", "PONTO_VIRGULA"], "_reduzir_escrita", {
+            1: _ESPERADO_EXPRESSAO,
+            2: "Esperado ';' após comando DIZ",
+        })
+        # 19: Fala -> IDENTIFICADOR DIZ (verifica o personagem antes da expressão, como o Parser)
+        add("Fala", ["IDENTIFICADOR", "DIZ"], "_reduzir_fala")
+        # 20: ComandoAtribuicao -> IDENTIFICADOR OP_ATRIBUICAO Expressao PONTO_VIRGULA
+        add("ComandoAtribuicao", ["IDENTIFICADOR", "OP_ATRIBUICAO", "Expressao", "PONTO_VIRGULA"],
+            "_reduzir_atribuicao", {
+                1: "Esperado '=' após identificador",
+                2: _ESPERADO_EXPRESSAO,
+                3: "Esperado ';' após expressão",
+            })
+        # 21: Expressao -> ExpressaoSimples
+        add("Expressao", ["ExpressaoSimples"])
+        # 22-23: ExpressaoSimples -> ExpressaoSimples (OP_ADICAO | OP_SUBTRACAO) Termo
+        add("ExpressaoSimples", ["ExpressaoSimples", "OP_ADICAO", "Termo"], "_reduzir_expressao_simples",
+            {2: _ESPERADO_EXPRESSAO})
+        add("ExpressaoSimples", ["ExpressaoSimples", "OP_SUBTRACAO", "Termo"], "_reduzir_expressao_simples",
+            {2: _ESPERADO_EXPRESSAO})
+        # 24: ExpressaoSimples -> Termo
+        add("ExpressaoSimples", ["Termo"], "_reduzir_primeiro_termo")
+        # 25-26: Termo -> Termo (OP_MULTIPLICACAO | OP_DIVISAO) Fator
+        add("Termo", ["Termo", "OP_MULTIPLICACAO", "Fator"], "_reduzir_termo", {2: _ESPERADO_EXPRESSAO})
+        add("Termo", ["Termo", "OP_DIVISAO", "Fator"], "_reduzir_termo", {2: _ESPERADO_EXPRESSAO})
+        # 27: Termo -> Fator
+        add("Termo", ["Fator"], "_reduzir_primeiro_fator")
+        # 28: Fator -> Fator OP_POTENCIACAO Elemento
+        add("Fator", ["Fator", "OP_POTENCIACAO", "Elemento"], "_reduzir_fator", {2: _ESPERADO_EXPRESSAO})
+        # 29: Fator -> Elemento
+        add("Fator", ["Elemento"], "_reduzir_primeiro_elemento")
+        # 30: Elemento -> IDENTIFICADOR
+        add("Elemento", ["IDENTIFICADOR"], "_reduzir_identificador")
+        # 31-33: Elemento -> NUM_INTEIRO | NUM_REAL | STRING
+        add("Elemento", ["NUM_INTEIRO"], "_reduzir_inteiro")
+        add("Elemento", ["NUM_REAL"], "_reduzir_real")
+        add("Elemento", ["STRING"], "_reduzir_string")
+        # 34: Elemento -> PARENTESE_ESQ Expressao PARENTESE_DIR
+        add("Elemento", ["PARENTESE_ESQ", "Expressao", "PARENTESE_DIR"], "_reduzir_parenteses", {
+            1: _ESPERADO_EXPRESSAO,
+            2: "Esperado ')' após expressão",
+        })
+
+
+class TabelasLR:
+    """ACTION e GOTO compiladas em arranjos de inteiros.
+
+    Uma ação é um inteiro: 0 é erro, s + 1 é shift para o estado s e ~p
+    (negativo) é a redução pela produção p; ~0, a redução por S' -> Programa, é
+    o accept. Cada estado tem uma redução padrão (acao_padrao, ou 0), feita para
+    qualquer terminal sem ação própria: só estados com uma única produção a
+    reduzir têm uma, então a linguagem aceita não muda e o erro é detectado
+    no estado seguinte. O GOTO é guardado por não-terminal, com o destino mais
+    comum como padrão (desvio_padrao).
+
+    Cadeias de reduções unitárias (B -> A, com A não-terminal) são feitas de
+    uma vez: quando o estado goto(s, A) reduziria por B -> A com algum
+    lookahead, o GOTO guarda ~r, e a linha r de ATALHO dá, para cada
+    lookahead, a cadeia seguida (cadeia_destinos: o estado final;
+    cadeia_estados e cadeia_producoes: os estados intermediários e as
+    produções unitárias reduzidas, para as ações semânticas e o rastro).
+
+    As tabelas usam deslocamento de linhas: a entrada (linha, coluna) está
+    em valores[base[linha] + coluna] se verificacao[base[linha] + coluna] ==
+    linha; senão vale o padrão da linha. Na forma "densa" cada linha tem o
+    próprio trecho (base = linha * largura, todas as células verificadas); na
+    "comprimida" as linhas esparsas se encaixam umas nos espaços das outras.
+    A última coluna de ACTION recebe os tipos de token fora da gramática.
+    Os arranjos são montados com array e guardados como tuplas: imutáveis, podem
+    ser compartilhadas entre threads, e o CPython as indexa mais rápido que um
+    array no laço do analisador."""
+
+    __slots__ = ('forma', 'num_terminais', 'producoes', 'cadeia_estados', 'cadeia_producoes',
+                 'acao_base', 'acao_valores', 'acao_verificacao', 'acao_padrao',
+                 'desvio_base', 'desvio_valores', 'desvio_verificacao', 'desvio_padrao',
+                 'atalho_base', 'atalho_valores', 'atalho_verificacao', 'atalho_padrao', 'cadeia_destinos')
+
+    def acao(self, estado: int, terminal: int) -> int:
+        indice = self.acao_base[estado] + terminal
+        if self.acao_verificacao[indice] == estado:
+            return self.acao_valores[indice]
+        return self.acao_padrao[estado]
+
+    def _desvio_codificado(self, estado: int, nao_terminal: int) -> int:
+        indice = self.desvio_base[nao_terminal] + estado
+        if self.desvio_verificacao[indice] == nao_terminal:
+            return self.desvio_valores[indice]
+        return self.desvio_padrao[nao_terminal]
+
+    def desvio(self, estado: int, nao_terminal: int, terminal: int = None) -> int:
+        """GOTO; com o lookahead `terminal`, já seguindo a cadeia de reduções unitárias"""
+        destino = self._desvio_codificado(estado, nao_terminal)
+        if destino >= 0:
+            return destino
+        if terminal is None:
+            return self.cadeia_estados[self.atalho_padrao[~destino]][0]
+        return self.cadeia_destinos[self.cadeia(~destino, terminal)]
+
+    def cadeia(self, linha: int, terminal: int) -> int:
+        """Cadeia da linha de ATALHO para o lookahead"""
+        indice = self.atalho_base[linha] + terminal
+        if self.atalho_verificacao[indice] == linha:
+            return self.atalho_valores[indice]
+        return self.atalho_padrao[linha]
+
+    def cadeia_do_desvio(self, estado: int, nao_terminal: int, terminal: int):
+        """(estados, produções unitárias) da cadeia seguida pelo GOTO com o lookahead"""
+        destino = self._desvio_codificado(estado, nao_terminal)
+        if destino >= 0:
+            return (destino,), ()
+        cadeia = self.cadeia(~destino, terminal)
+        return self.cadeia_estados[cadeia], self.cadeia_producoes[cadeia]
+
+    @property
+    def tamanho(self) -> int:
+        """Número de inteiros nos arranjos"""
+        return (sum(len(getattr(self, nome)) for nome in self.__slots__[5:])
+                + sum(map(len, self.cadeia_estados)) + sum(map(len, self.cadeia_producoes)))
+
+
+def _deslocar_linhas(linhas, largura, densa):
+    """Tuplas (base, valores, verificacao) para linhas esparsas {coluna: valor}.
+    Na forma comprimida, as linhas mais cheias são encaixadas primeiro, cada uma
+    na primeira base em que todas as suas colunas estão livres."""
+    base = array('i', bytes(4 * len(linhas)))
+    if densa:
+        valores = array('i', bytes(4 * len(linhas) * largura))
+        verificacao = array('i', [linha for linha in range(len(linhas)) for _ in range(largura)])
+        for linha, entradas in enumerate(linhas):
+            base[linha] = linha * largura
+            for coluna, valor in entradas.items():
+                valores[linha * largura + coluna] = valor
+        return tuple(base), tuple(valores), tuple(verificacao)
+
+    ocupado = bytearray()
+    valores = array('i')
+    verificacao = array('i')
+    primeira_livre = 0
+    proxima_tentativa = {}  # Colunas da linha -> menor base ainda possível (linhas iguais são comuns)
+    for linha in sorted(range(len(linhas)), key=lambda linha: -len(linhas[linha])):
+        colunas = tuple(sorted(linhas[linha]))
+        if not colunas:
+            continue  # Nenhuma célula terá verificacao == linha: vale sempre o padrão
+        primeira = colunas[0]
+        deslocamento = max(0, primeira_livre - primeira, proxima_tentativa.get(colunas, 0))
+        while True:
+            # Salta até a próxima célula livre para a primeira coluna
+            livre = ocupado.find(0, deslocamento + primeira)
+            if livre < 0:
+                deslocamento = max(deslocamento, len(ocupado) - primeira)
+                break
+            deslocamento = livre - primeira
+            if all(deslocamento + coluna >= len(ocupado) or not ocupado[deslocamento + coluna]
+                   for coluna in colunas[1:]):
+                break
+            deslocamento += 1
+        proxima_tentativa[colunas] = deslocamento + 1
+        fim = deslocamento + colunas[-1] + 1
+        if fim > len(ocupado):
+            extra = fim - len(ocupado)
+            ocupado.extend(bytes(extra))
+            valores.frombytes(bytes(4 * extra))
+            verificacao.extend([-1] * extra)
+        for coluna in colunas:
+            ocupado[deslocamento + coluna] = 1
+            valores[deslocamento + coluna] = linhas[linha][coluna]
+            verificacao[deslocamento + coluna] = linha
+        base[linha] = deslocamento
+        primeira_livre = ocupado.find(0, primeira_livre)
+        if primeira_livre < 0:
+            primeira_livre = len(ocupado)
+    # Qualquer base + coluna precisa cair dentro dos arranjos
+    extra = max(base, default=0) + largura - len(valores)
+    if extra > 0:
+        valores.frombytes(bytes(4 * extra))
+        verificacao.extend([-1] * extra)
+    return tuple(base), tuple(valores), tuple(verificacao)
+
+
+def _digraph(relacao, iniciais):
+    """Menor F com F[x] ⊇ iniciais[x] e F[x] ⊇ F[y] para cada y em relacao[x]
+    (o algoritmo digraph de DeRemer e Pennello): uma busca em profundidade à
+    moda de Tarjan, em que os nós de um ciclo recebem o mesmo conjunto. Os
+    conjuntos são bitsets e a busca usa uma pilha explícita."""
+    infinito = len(iniciais) + 1
+    conjuntos = list(iniciais)
+    profundidade = [0] * len(iniciais)  # 0: não visitado; infinito: concluído
+    pilha = []
+    for inicio in range(len(iniciais)):
+        if profundidade[inicio]:
+            continue
+        pilha.append(inicio)
+        profundidade[inicio] = len(pilha)
+        quadros = [[inicio, 0, len(pilha)]]  # (nó, próxima aresta, profundidade ao entrar)
+        while quadros:
+            quadro = quadros[-1]
+            x, proxima, entrada = quadro
+            if proxima < len(relacao[x]):
+                quadro[1] += 1
+                y = relacao[x][proxima]
+                if not profundidade[y]:
+                    pilha.append(y)
+                    profundidade[y] = len(pilha)
+                    quadros.append([y, 0, len(pilha)])
+                    continue
+            else:
+                quadros.pop()
+                if profundidade[x] == entrada:
+                    while True:
+                        topo = pilha.pop()
+                        profundidade[topo] = infinito
+                        conjuntos[topo] = conjuntos[x]
+                        if topo == x:
+                            break
+                if not quadros:
+                    break
+                x, y = quadros[-1][0], x
+            if profundidade[y] < profundidade[x]:
+                profundidade[x] = profundidade[y]
+            conjuntos[x] |= conjuntos[y]
+    return conjuntos
+
+
+class RastroSLR:
+    """Passos de SLRAnalyzer.analisar(trace="compact").
+
+    Cada passo guarda só a ação codificada (como em TabelasLR), quantos
+    estados saíram da pilha e o estado empilhado (-1 no accept). A pilha de
+    um passo é refeita repassando os anteriores a partir do último passo
+    consultado, então percorrer o rastro em ordem custa o mesmo que a
+    análise. rastro[i] e a iteração dão os mesmos dicionários que
+    analisar(trace="stream")."""
+
+    __slots__ = ('analisador', 'entrada', 'expandido', 'acoes', 'desempilhados', 'empilhados',
+                 'colapsados', '_cursor')
+
+    def __init__(self, analisador: 'SLRAnalyzer', entrada: List[str], expandido: bool = False):
+        self.analisador = analisador
+        self.entrada = entrada
+        self.expandido = expandido
+        self.acoes = array('i')
+        self.desempilhados = array('i')
+        self.empilhados = array('i')
+        self.colapsados = set()  # Passos das reduções unitárias expandidas
+        self._cursor = (0, [0], 0)  # (passo, pilha antes dele, posição na entrada)
+
+    def __len__(self) -> int:
+        return len(self.acoes)
+
+    def _registros(self, inicio: int, fim: int):
+        colapsados = self.colapsados
+        for passo in range(inicio, fim):
+            yield self.acoes[passo], self.desempilhados[passo], self.empilhados[passo], passo in colapsados
+
+    def _antes(self, passo: int):
+        """(pilha, posição na entrada) antes do passo"""
+        inicio, pilha, posicao = self._cursor
+        if passo < inicio:
+            inicio, pilha, posicao = 0, [0], 0
+        pilha = list(pilha)
+        for acao, saidas, empilhado, _ in self._registros(inicio, passo):
+            posicao = _aplicar_passo(pilha, posicao, acao, saidas, empilhado)
+        self._cursor = (passo, list(pilha), posicao)
+        return pilha, posicao
+
+    def _indice(self, passo: int) -> int:
+        if passo < 0:
+            passo += len(self)
+        if not 0 <= passo < len(self):
+            raise IndexError("passo fora do rastro")
+        return passo
+
+    def pilha(self, passo: int) -> List[int]:
+        """Pilha de estados antes do passo"""
+        return self._antes(self._indice(passo))[0]
+
+    def __getitem__(self, passo):
+        if isinstance(passo, slice):
+            return [self[indice] for indice in range(*passo.indices(len(self)))]
+        passo = self._indice(passo)
+        pilha, posicao = self._antes(passo)
+        return _descrever_passo(self.analisador, self.entrada, self.expandido, pilha, posicao,
+                                self.acoes[passo], passo in self.colapsados)
+
+    def __iter__(self):
+        yield from _descrever_passos(self.analisador, self.entrada, self.expandido,
+                                     self._registros(0, len(self)))
+
+
+def _aplicar_passo(pilha: List[int], posicao: int, acao: int, saidas: int, empilhado: int) -> int:
+    """Aplica um passo registrado à pilha; retorna a nova posição na entrada"""
+    if saidas:
+        del pilha[-saidas:]
+    if empilhado >= 0:
+        pilha.append(empilhado)
+    return posicao + 1 if acao > 0 else posicao
+
+
+def _descrever_passo(analisador, entrada, expandido, pilha, posicao, acao, colapsado) -> dict:
+    """Dicionário do passo a partir da pilha antes dele"""
+    producoes = analisador.grammar.productions
+
+    def texto(producao):
+        cabeca, corpo = producoes[producao]
+        return f"{cabeca} -> {' '.join(corpo) if corpo else EPSILON}"
+
+    lookahead = entrada[posicao]
+    passo_info = {"pilha": list(pilha), "posicao": posicao, "lookahead": lookahead}
+    if acao > 0:
+        passo_info["acao"] = f"shift para estado {acao - 1} consumindo '{lookahead}'"
+    elif acao == ~0:
+        passo_info["acao"] = "accept"
+    else:
+        passo_info["acao"] = f"reduce usando {texto(~acao)}"
+        if colapsado:
+            passo_info["colapsado"] = True
+        elif not expandido:
+            # A cadeia seguida depende só do estado exposto pela redução e do lookahead
+            tabelas = analisador.tabelas
+            cabeca, tamanho = tabelas.producoes[~acao]
+            terminal = analisador.terminal_index.get(lookahead, len(analisador.grammar.terminals))
+            _, unitarias = tabelas.cadeia_do_desvio(pilha[-tamanho - 1], cabeca, terminal)
+            if unitarias:
+                passo_info["cadeia"] = [texto(unitaria) for unitaria in unitarias]
+                passo_info["acao"] += " e " + ", ".join(passo_info["cadeia"])
+    return passo_info
+
+
+def _descrever_passos(analisador, entrada, expandido, registros):
+    """Produz o dicionário de cada registro (ação, desempilhados, empilhado,
+    colapsado?), refazendo a pilha a partir da inicial. Retorna (o retorno de
+    `registros`, número de passos)."""
+    pilha = [0]
+    posicao = 0
+    passos = 0
+    while True:
+        try:
+            acao, saidas, empilhado, colapsado = next(registros)
+        except StopIteration as fim:
+            return fim.value, passos
+        yield _descrever_passo(analisador, entrada, expandido, pilha, posicao, acao, colapsado)
+        posicao = _aplicar_passo(pilha, posicao, acao, saidas, empilhado)
+        passos += 1
 
 
 class SLRAnalyzer:
-    def __init__(self):
-        self.grammar = Grammar()
+    """Tabelas LR para a gramática. O autômato é sempre o LR(0); `algoritmo`
+    escolhe os lookaheads das reduções: "slr" (o FOLLOW da cabeça) ou "lalr"
+    (LALR(1), que evita conflitos de gramáticas que não são SLR). Conflitos
+    lançam ValueError, a não ser com tolerar_conflitos: então ficam em
+    `conflicts` e são resolvidos como no yacc (shift antes de reduce, e a
+    produção de menor índice entre reduções)."""
+
+    def __init__(self, grammar: Grammar = None, forma: str = None, algoritmo: str = "slr",
+                 tolerar_conflitos: bool = False, eliminar_cadeias: bool = True):
+        if algoritmo not in _ALGORITMOS:
+            raise ValueError(f"Algoritmo desconhecido: {algoritmo}")
+        self.grammar = grammar or Grammar()
+        self.algoritmo = algoritmo
+        self.build_times = {}  # Etapa da construção -> segundos
+        inicio = time.perf_counter()
         self.first = self._compute_first()
         self.follow = self._compute_follow()
+        self.build_times["first_follow"] = time.perf_counter() - inicio
+        inicio = time.perf_counter()
         self.states, self.transitions = self._build_lr0_items()
+        self.build_times["lr0"] = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        self.lookaheads = self._lookaheads_lalr() if algoritmo == "lalr" else self._lookaheads_slr()
+        self.build_times["lookaheads"] = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        self.conflicts = []  # (estado, símbolo, ação mantida, ação descartada)
         self.action_table, self.goto_table = self._build_tables()
+        self.build_times["tabelas"] = time.perf_counter() - inicio
+        if self.conflicts and not tolerar_conflitos:
+            _, simbolo, existente, acao = self.conflicts[0]
+            raise ValueError(f"Conflito na tabela {algoritmo.upper()} para símbolo '{simbolo}': "
+                             f"{existente} vs {acao}")
+        self.default_reductions = self._build_default_reductions()
+        self.state_error_messages = self._build_error_messages()
+        inicio = time.perf_counter()
+        self.tabelas = self.compilar_tabelas(forma, eliminar_cadeias)
+        self.build_times["compilacao"] = time.perf_counter() - inicio
+
+    def analisar(self, tokens, trace: str = "off", expandir_cadeias: bool = False):
+        """Executa a análise SLR com base na sequência de tokens.
+
+        trace escolhe o que é registrado além do veredito ("sucesso",
+        "mensagem" e "passos"): "off", nada; "compact", os passos em
+        "passos_realizados" como um RastroSLR, que guarda três inteiros por
+        passo e refaz a pilha de cada um sob demanda; "stream", um gerador que
+        produz os passos um a um e retorna o veredito no fim.
 
-    def analisar(self, tokens):
-        """Executa a análise SLR com base na sequência de tokens."""
+        Uma redução seguida de uma cadeia de reduções unitárias é um único
+        passo, com as produções da cadeia em "cadeia"; com expandir_cadeias,
+        cada redução da cadeia vira um passo próprio, marcado "colapsado"
+        (com trace="off" só os passos do analisador são contados)."""
+        if trace not in _RASTROS:
+            raise ValueError(f"Modo de rastro desconhecido: {trace}")
         # Extrai os tipos de token e garante o marcador de fim de arquivo
         entrada = [token.tipo for token in tokens if token.tipo != "ERRO"]
         if not entrada or entrada[-1] != "EOF":
             entrada.append("EOF")
 
+        if trace == "off":
+            indice_terminal = self.terminal_index
+            outro = len(self.grammar.terminals)
+            sucesso, passos, estado, posicao = self._reconhecer(
+                [indice_terminal.get(tipo, outro) for tipo in entrada])
+            return self._veredito(sucesso, passos, estado, entrada[posicao])
+        if trace == "stream":
+            return self._transmitir(entrada, expandir_cadeias)
+
+        rastro = RastroSLR(self, entrada, expandir_cadeias)
+        acoes, desempilhados, empilhados = rastro.acoes, rastro.desempilhados, rastro.empilhados
+        registros = self._executar(entrada, expandir_cadeias)
+        while True:
+            try:
+                acao, saidas, estado, colapsado = next(registros)
+            except StopIteration as fim:
+                sucesso, estado, posicao = fim.value
+                break
+            if colapsado:
+                rastro.colapsados.add(len(acoes))
+            acoes.append(acao)
+            desempilhados.append(saidas)
+            empilhados.append(estado)
+        resultado = self._veredito(sucesso, len(acoes), estado, entrada[posicao])
+        resultado["passos_realizados"] = rastro
+        return resultado
+
+    def _transmitir(self, entrada, expandir_cadeias):
+        """Gerador de analisar(trace="stream")"""
+        (sucesso, estado, posicao), passos = yield from _descrever_passos(
+            self, entrada, expandir_cadeias, self._executar(entrada, expandir_cadeias))
+        return self._veredito(sucesso, passos, estado, entrada[posicao])
+
+    @staticmethod
+    def _veredito(sucesso, passos, estado, lookahead) -> dict:
+        if sucesso:
+            mensagem = "Análise SLR concluída com sucesso."
+        else:
+            mensagem = f"Nenhuma ação para o estado {estado} com lookahead '{lookahead}'."
+        return {"sucesso": sucesso, "mensagem": mensagem, "passos": passos}
+
+    def _executar(self, entrada, expandir_cadeias):
+        """Laço do analisador que produz cada passo como (ação codificada,
+        estados desempilhados, estado empilhado ou -1, colapsado?). Retorna
+        (sucesso, estado, posição na entrada) do último passo."""
+        tabelas = self.tabelas
+        producoes = tabelas.producoes
+        indice_terminal = self.terminal_index
+        outro = len(self.grammar.terminals)
         pilha = [0]
-        indice = 0
-        passos = []
+        posicao = 0
 
         while True:
             estado = pilha[-1]
-            lookahead = entrada[indice] if indice < len(entrada) else "EOF"
-            acao = self.action_table.get(estado, {}).get(lookahead)
-
-            passo_info = {
-                "pilha": list(pilha),
-                "entrada": entrada[indice:],
-            }
-
-            if acao is None:
-                return {
-                    "sucesso": False,
-                    "mensagem": f"Nenhuma ação para o estado {estado} com lookahead '{lookahead}'.",
-                    "passos": len(passos),
-                    "passos_realizados": passos,
-                }
-
-            tipo_acao = acao[0]
-
-            if tipo_acao == "shift":
-                proximo_estado = acao[1]
-                pilha.append(proximo_estado)
-                indice += 1
-                passo_info["acao"] = f"shift para estado {proximo_estado} consumindo '{lookahead}'"
-                passos.append(passo_info)
-            elif tipo_acao == "reduce":
-                prod_idx = acao[1]
-                cabeca, corpo = self.grammar.productions[prod_idx]
-                if corpo:
-                    for _ in corpo:
-                        if len(pilha) > 1:
-                            pilha.pop()
-                estado_atual = pilha[-1]
-                goto_estado = self.goto_table.get(estado_atual, {}).get(cabeca)
-                if goto_estado is None:
-                    return {
-                        "sucesso": False,
-                        "mensagem": f"Goto indefinido após redução por {cabeca} -> {' '.join(corpo) or 'ε'}.",
-                        "passos": len(passos),
-                        "passos_realizados": passos,
-                    }
-                pilha.append(goto_estado)
-                producao_texto = " ".join(corpo) if corpo else "ε"
-                passo_info["acao"] = f"reduce usando {cabeca} -> {producao_texto}"
-                passos.append(passo_info)
-            elif tipo_acao == "accept":
-                passo_info["acao"] = "accept"
-                passos.append(passo_info)
-                return {
-                    "sucesso": True,
-                    "mensagem": "Análise SLR concluída com sucesso.",
-                    "passos": len(passos),
-                    "passos_realizados": passos,
-                }
+            terminal = indice_terminal.get(entrada[posicao], outro)
+            acao = tabelas.acao(estado, terminal)
+            if acao == 0:
+                return False, estado, posicao
+            if acao > 0:
+                pilha.append(acao - 1)
+                posicao += 1
+                yield acao, 0, acao - 1, False
+            elif acao != ~0:
+                cabeca, tamanho = producoes[~acao]
+                if tamanho:
+                    del pilha[-tamanho:]
+                estados, unitarias = tabelas.cadeia_do_desvio(pilha[-1], cabeca, terminal)
+                if expandir_cadeias:
+                    pilha.append(estados[0])
+                    yield acao, tamanho, estados[0], False
+                    for unitaria, proximo_estado in zip(unitarias, estados[1:]):
+                        pilha[-1] = proximo_estado
+                        yield ~unitaria, 1, proximo_estado, True
+                else:
+                    pilha.append(estados[-1])
+                    yield acao, tamanho, estados[-1], False
+            else:
+                yield acao, 0, -1, False
+                return True, estado, posicao
+
+    def contar_passos(self, tokens) -> tuple:
+        """Como analisar, sem registrar os passos: retorna (sucesso, passos).
+        Aceita os tokens ou só os seus tipos."""
+        indice_terminal = self.terminal_index
+        outro = len(self.grammar.terminals)
+        tipos = (getattr(token, "tipo", token) for token in tokens)
+        entrada = [indice_terminal.get(tipo, outro) for tipo in tipos if tipo != "ERRO"]
+        entrada.append(indice_terminal["EOF"])
+        return self._reconhecer(entrada)[:2]
+
+    def _reconhecer(self, entrada) -> tuple:
+        """Reconhece os terminais numerados de `entrada`, terminada por EOF:
+        retorna (sucesso, passos, último estado, posição na entrada)."""
+        tabelas = self.tabelas
+        base, valores, verificacao, padrao = (tabelas.acao_base, tabelas.acao_valores,
+                                              tabelas.acao_verificacao, tabelas.acao_padrao)
+        desvio_base, desvio_valores, desvio_verificacao, desvio_padrao = (
+            tabelas.desvio_base, tabelas.desvio_valores, tabelas.desvio_verificacao, tabelas.desvio_padrao)
+        atalho_base, atalho_valores, atalho_verificacao, atalho_padrao = (
+            tabelas.atalho_base, tabelas.atalho_valores, tabelas.atalho_verificacao, tabelas.atalho_padrao)
+        cadeia_destinos = tabelas.cadeia_destinos
+        producoes = tabelas.producoes
+
+        posicao = 0
+        pilha = [0]
+        estado = 0
+        passos = 0
+        terminal = entrada[0]
+        while True:
+            indice = base[estado] + terminal
+            acao = valores[indice] if verificacao[indice] == estado else padrao[estado]
+            if acao > 0:
+                estado = acao - 1
+                pilha.append(estado)
+                passos += 1
+                posicao += 1  # EOF nunca é empilhado: a entrada não se esgota antes do fim
+                terminal = entrada[posicao]
+            elif acao < -1:
+                cabeca, tamanho = producoes[~acao]
+                if tamanho:
+                    del pilha[-tamanho:]
+                indice = desvio_base[cabeca] + pilha[-1]
+                estado = (desvio_valores[indice] if desvio_verificacao[indice] == cabeca
+                          else desvio_padrao[cabeca])
+                if estado < 0:  # Cadeia de reduções unitárias
+                    linha = ~estado
+                    indice = atalho_base[linha] + terminal
+                    estado = cadeia_destinos[atalho_valores[indice] if atalho_verificacao[indice] == linha
+                                             else atalho_padrao[linha]]
+                pilha.append(estado)
+                passos += 1
+            elif acao == 0:
+                return False, passos, estado, posicao  # Como em analisar, o passo que falha não conta
+            else:
+                return True, passos + 1, estado, posicao
 
     # ==================== Construção de Tabelas ====================
 
     def _compute_first(self):
-        first = {nt: set() for nt in self.grammar.nonterminals}
-
-        changed = True
-        while changed:
-            changed = False
-            for head, body in self.grammar.productions[1:]:  # ignora produção S' -> Programa
-                if not body:
-                    if EPSILON not in first[head]:
-                        first[head].add(EPSILON)
-                        changed = True
-                    continue
+        """FIRST de cada não-terminal (com EPSILON se for anulável).
 
-                adiciona_epsilon = True
-                for simbolo in body:
-                    simbolo_first = self._first_of_symbol(simbolo, first)
-                    tamanho_antes = len(first[head])
-                    first[head].update(simbolo_first - {EPSILON})
-                    if len(first[head]) != tamanho_antes:
-                        changed = True
+        Os terminais são numerados (terminal_index) e os conjuntos calculados
+        como inteiros usados como bitsets (first_bits; o bit EPSILON_BIT marca
+        os anuláveis). Anuláveis: cada produção conta os símbolos do corpo ainda
+        não anuláveis, e a cabeça fica anulável quando a conta chega a zero.
+        FIRST: cada cabeça recebe os terminais iniciais do corpo e depende dos
+        não-terminais do prefixo anulável; uma lista de trabalho repassa o FIRST
+        só para quem depende de um conjunto que mudou."""
+        grammar = self.grammar
+        nonterminals = set(grammar.nonterminals)
+        self.terminal_index = {terminal: i for i, terminal in enumerate(grammar.terminals)}
+        self.epsilon_bit = 1 << len(grammar.terminals)
+        productions = grammar.productions[1:]  # ignora produção S' -> Programa
 
-                    if EPSILON not in simbolo_first:
-                        adiciona_epsilon = False
-                        break
+        # Anuláveis
+        faltando = []
+        ocorrencias = {nt: [] for nt in nonterminals}
+        anulaveis = set()
+        pendentes = []
+        for indice, (head, body) in enumerate(productions):
+            faltando.append(len(body))
+            for simbolo in body:
+                if simbolo in nonterminals:
+                    ocorrencias[simbolo].append(indice)
+            if not body and head not in anulaveis:
+                anulaveis.add(head)
+                pendentes.append(head)
+        while pendentes:
+            for indice in ocorrencias[pendentes.pop()]:
+                faltando[indice] -= 1
+                head = productions[indice][0]
+                if faltando[indice] == 0 and head not in anulaveis:
+                    anulaveis.add(head)
+                    pendentes.append(head)
+        self.nullable = anulaveis
 
-                if adiciona_epsilon:
-                    if EPSILON not in first[head]:
-                        first[head].add(EPSILON)
-                        changed = True
-
-        return first
+        # FIRST: parte constante (terminais) e dependências entre não-terminais
+        bits = {nt: 0 for nt in nonterminals}
+        dependentes = {nt: set() for nt in nonterminals}
+        for head, body in productions:
+            for simbolo in body:
+                if simbolo not in nonterminals:
+                    bits[head] |= 1 << self.terminal_index[simbolo]
+                    break
+                if simbolo != head:
+                    dependentes[simbolo].add(head)
+                if simbolo not in anulaveis:
+                    break
+        pendentes = list(nonterminals)
+        na_lista = set(nonterminals)
+        while pendentes:
+            simbolo = pendentes.pop()
+            na_lista.discard(simbolo)
+            for head in dependentes[simbolo]:
+                novo = bits[head] | bits[simbolo]
+                if novo != bits[head]:
+                    bits[head] = novo
+                    if head not in na_lista:
+                        na_lista.add(head)
+                        pendentes.append(head)
+        for nt in anulaveis:
+            bits[nt] |= self.epsilon_bit
+        self.first_bits = bits
+        return {nt: self._decode_bits(bits[nt]) for nt in grammar.nonterminals}
 
     def _compute_follow(self):
-        follow = {nt: set() for nt in self.grammar.nonterminals}
-        follow[self.grammar.start_symbol].add("EOF")
-
-        changed = True
-        while changed:
-            changed = False
-            for head, body in self.grammar.productions[1:]:
-                if not body:
+        """FOLLOW de cada não-terminal, também como bitsets (follow_bits).
+
+        Percorrendo cada corpo da direita para a esquerda, um não-terminal recebe
+        o FIRST do restante do corpo e, se o restante for anulável, passa a
+        depender do FOLLOW da cabeça; a lista de trabalho propaga só o que mudou."""
+        grammar = self.grammar
+        nonterminals = set(grammar.nonterminals)
+        first_bits = self.first_bits
+        sem_epsilon = ~self.epsilon_bit
+        bits = {nt: 0 for nt in nonterminals}
+        bits[grammar.start_symbol] = 1 << self.terminal_index["EOF"]
+        dependentes = {nt: set() for nt in nonterminals}
+        for head, body in grammar.productions[1:]:
+            restante = 0  # FIRST do restante do corpo
+            restante_anulavel = True
+            for simbolo in reversed(body):
+                if simbolo not in nonterminals:
+                    restante = 1 << self.terminal_index[simbolo]
+                    restante_anulavel = False
                     continue
-                trailer = follow[head].copy()
-                for simbolo in reversed(body):
-                    if simbolo in self.grammar.nonterminals:
-                        tamanho_antes = len(follow[simbolo])
-                        follow[simbolo].update(trailer)
-                        if len(follow[simbolo]) != tamanho_antes:
-                            changed = True
-
-                        simbolo_first = self._first_of_symbol(simbolo, self.first)
-                        if EPSILON in simbolo_first:
-                            trailer = trailer.union(simbolo_first - {EPSILON})
-                        else:
-                            trailer = simbolo_first
-                    else:
-                        trailer = {simbolo}
-        return follow
+                bits[simbolo] |= restante
+                if restante_anulavel and simbolo != head:
+                    dependentes[head].add(simbolo)
+                if simbolo in self.nullable:
+                    restante |= first_bits[simbolo] & sem_epsilon
+                else:
+                    restante = first_bits[simbolo] & sem_epsilon
+                    restante_anulavel = False
+        pendentes = list(nonterminals)
+        na_lista = set(nonterminals)
+        while pendentes:
+            simbolo = pendentes.pop()
+            na_lista.discard(simbolo)
+            for dependente in dependentes[simbolo]:
+                novo = bits[dependente] | bits[simbolo]
+                if novo != bits[dependente]:
+                    bits[dependente] = novo
+                    if dependente not in na_lista:
+                        na_lista.add(dependente)
+                        pendentes.append(dependente)
+        self.follow_bits = bits
+        return {nt: self._decode_bits(bits[nt]) for nt in grammar.nonterminals}
+
+    def _decode_bits(self, bits):
+        """Conjunto de terminais (e EPSILON) de um bitset"""
+        terminais = self.grammar.terminals
+        conjunto = set()
+        while bits:
+            menor = bits & -bits
+            indice = menor.bit_length() - 1
+            conjunto.add(terminais[indice] if indice < len(terminais) else EPSILON)
+            bits ^= menor
+        return conjunto
 
     def _build_lr0_items(self):
+        """Autômato LR(0). Cada estado é identificado pelo seu kernel (os itens
+        com o ponto depois do início, mais o item inicial) em um dicionário, e
+        só é fechado uma vez. O fecho usa, para cada não-terminal, os itens
+        (produção, 0) alcançáveis a partir dele, calculados uma única vez; as
+        transições saem só dos símbolos que aparecem depois de um ponto."""
         productions = self.grammar.productions
         nonterminals = set(self.grammar.nonterminals)
-        symbols = set(self.grammar.terminals + self.grammar.nonterminals)
-
-        def closure(items):
-            fecho = set(items)
-            mudou = True
-            while mudou:
-                mudou = False
-                for prod_idx, ponto in list(fecho):
-                    cabeca, corpo = productions[prod_idx]
-                    if ponto < len(corpo):
-                        simbolo = corpo[ponto]
-                        if simbolo in nonterminals:
-                            for idx, prod in enumerate(productions):
-                                if prod[0] == simbolo:
-                                    item_novo = (idx, 0)
-                                    if item_novo not in fecho:
-                                        fecho.add(item_novo)
-                                        mudou = True
-            return frozenset(fecho)
+        por_cabeca = {nt: [] for nt in nonterminals}
+        for idx, (cabeca, _) in enumerate(productions):
+            por_cabeca[cabeca].append(idx)
 
-        def goto(estado, simbolo):
-            itens = set()
-            for prod_idx, ponto in estado:
-                cabeca, corpo = productions[prod_idx]
-                if ponto < len(corpo) and corpo[ponto] == simbolo:
-                    itens.add((prod_idx, ponto + 1))
-            if not itens:
-                return frozenset()
-            return closure(itens)
+        fechos_nao_terminais = {}
+
+        def fecho_do_nao_terminal(simbolo):
+            itens = fechos_nao_terminais.get(simbolo)
+            if itens is None:
+                itens = set()
+                vistos = {simbolo}
+                pendentes = [simbolo]
+                while pendentes:
+                    for idx in por_cabeca[pendentes.pop()]:
+                        itens.add((idx, 0))
+                        corpo = productions[idx][1]
+                        if corpo and corpo[0] in nonterminals and corpo[0] not in vistos:
+                            vistos.add(corpo[0])
+                            pendentes.append(corpo[0])
+                itens = fechos_nao_terminais[simbolo] = frozenset(itens)
+            return itens
+
+        def closure(kernel):
+            fecho = set(kernel)
+            for prod_idx, ponto in kernel:
+                corpo = productions[prod_idx][1]
+                if ponto < len(corpo) and corpo[ponto] in nonterminals:
+                    fecho |= fecho_do_nao_terminal(corpo[ponto])
+            return frozenset(fecho)
 
-        estados = []
+        inicial = frozenset({(0, 0)})
+        estados = [closure(inicial)]
+        indices = {inicial: 0}
         transicoes = {}
-        inicial = closure({(0, 0)})
-        estados.append(inicial)
-        fila = [inicial]
-
-        while fila:
-            estado_atual = fila.pop(0)
-            indice_estado = estados.index(estado_atual)
-            for simbolo in symbols:
-                proximo = goto(estado_atual, simbolo)
-                if not proximo:
-                    continue
-                if proximo not in estados:
-                    estados.append(proximo)
-                    fila.append(proximo)
-                transicoes[(indice_estado, simbolo)] = estados.index(proximo)
+
+        indice_estado = 0
+        while indice_estado < len(estados):
+            # Kernels dos sucessores, agrupados pelo símbolo depois do ponto
+            sucessores = {}
+            for prod_idx, ponto in sorted(estados[indice_estado]):
+                corpo = productions[prod_idx][1]
+                if ponto < len(corpo):
+                    sucessores.setdefault(corpo[ponto], []).append((prod_idx, ponto + 1))
+            for simbolo, kernel in sucessores.items():
+                kernel = frozenset(kernel)
+                destino = indices.get(kernel)
+                if destino is None:
+                    destino = indices[kernel] = len(estados)
+                    estados.append(closure(kernel))
+                transicoes[(indice_estado, simbolo)] = destino
+            indice_estado += 1
 
         return estados, transicoes
 
+    def _lookaheads_slr(self):
+        """(estado, produção) -> bitset dos lookaheads de cada item de redução:
+        o FOLLOW da cabeça"""
+        productions = self.grammar.productions
+        return {(indice_estado, prod_idx): self.follow_bits[productions[prod_idx][0]]
+                for indice_estado, estado in enumerate(self.states)
+                for prod_idx, ponto in estado
+                if ponto == len(productions[prod_idx][1]) and prod_idx != 0}
+
+    def _lookaheads_lalr(self):
+        """Lookaheads LALR(1) sobre o mesmo autômato LR(0), pelas relações de
+        DeRemer e Pennello entre as transições por não-terminal (p, A):
+        - DR(p, A): terminais com shift no estado goto(p, A);
+        - (p, A) reads (r, C): r = goto(p, A) e C anulável;
+        - (p, A) includes (p', B): B -> β A γ, γ anulável e p' --β--> p;
+        - (q, B -> ω) lookback (p', B): p' --ω--> q.
+        Read é o fecho de DR por reads, Follow o de Read por includes (ambos
+        com _digraph) e o lookahead de um item de redução é a união dos Follow
+        das transições do seu lookback."""
+        grammar = self.grammar
+        productions = grammar.productions
+        nonterminals = set(grammar.nonterminals)
+        transicoes = self.transitions
+        indice_terminal = self.terminal_index
+
+        saidas_nt = [[] for _ in self.states]  # estado -> não-terminais com transição
+        deslocamentos = [0] * len(self.states)  # estado -> bitset dos terminais com shift
+        numeros = {}  # (p, A) -> número da transição
+        for (origem, simbolo), destino in transicoes.items():
+            if simbolo in nonterminals:
+                saidas_nt[origem].append(simbolo)
+                numeros[(origem, simbolo)] = len(numeros)
+            else:
+                deslocamentos[origem] |= 1 << indice_terminal[simbolo]
+        por_cabeca = {nt: [] for nt in nonterminals}
+        for (origem, simbolo), numero in numeros.items():
+            por_cabeca[simbolo].append((origem, numero))
+
+        diretos = [0] * len(numeros)
+        leituras = [[] for _ in numeros]
+        for (origem, simbolo), numero in numeros.items():
+            destino = transicoes[(origem, simbolo)]
+            diretos[numero] = deslocamentos[destino]
+            leituras[numero] = [numeros[(destino, c)] for c in saidas_nt[destino] if c in self.nullable]
+        # O fim da entrada segue o símbolo inicial (S' -> Programa, com EOF implícito)
+        diretos[numeros[(0, grammar.start_symbol)]] |= 1 << indice_terminal["EOF"]
+        leitura = _digraph(leituras, diretos)
+
+        inclusoes = [[] for _ in numeros]
+        retrocessos = {}  # (estado, produção) -> transições (p', B)
+        for prod_idx, (cabeca, corpo) in enumerate(productions):
+            if prod_idx == 0:
+                continue
+            anulavel_desde = len(corpo)  # corpo[anulavel_desde:] é anulável
+            while anulavel_desde and corpo[anulavel_desde - 1] in self.nullable:
+                anulavel_desde -= 1
+            for origem, numero in por_cabeca[cabeca]:
+                estado = origem
+                for posicao, simbolo in enumerate(corpo):
+                    if simbolo in nonterminals and posicao + 1 >= anulavel_desde:
+                        inclusoes[numeros[(estado, simbolo)]].append(numero)
+                    estado = transicoes[(estado, simbolo)]
+                retrocessos.setdefault((estado, prod_idx), []).append(numero)
+        seguintes = _digraph(inclusoes, leitura)
+
+        lookaheads = {}
+        for item, numeros_retrocesso in retrocessos.items():
+            bits = 0
+            for numero in numeros_retrocesso:
+                bits |= seguintes[numero]
+            lookaheads[item] = bits
+        return lookaheads
+
     def _build_tables(self):
         action = {}
         goto = {}
@@ -294,27 +973,623 @@ class SLRAnalyzer:
                     if simbolo in terminals:
                         destino = self.transitions.get((indice_estado, simbolo))
                         if destino is not None:
-                            self._adicionar_acao(action[indice_estado], simbolo, ("shift", destino))
+                            self._adicionar_acao(indice_estado, action[indice_estado], simbolo, ("shift", destino))
                     else:
                         destino = self.transitions.get((indice_estado, simbolo))
                         if destino is not None:
                             goto[indice_estado][simbolo] = destino
                 else:
                     if cabeca == "S'":
-                        self._adicionar_acao(action[indice_estado], "EOF", ("accept",))
+                        self._adicionar_acao(indice_estado, action[indice_estado], "EOF", ("accept",))
                     else:
-                        for a in self.follow[cabeca]:
-                            self._adicionar_acao(action[indice_estado], a, ("reduce", prod_idx))
+                        for a in self._decode_bits(self.lookaheads[(indice_estado, prod_idx)]):
+                            self._adicionar_acao(indice_estado, action[indice_estado], a, ("reduce", prod_idx))
 
         return action, goto
 
-    def _adicionar_acao(self, tabela_estado, simbolo, acao):
+    def _build_default_reductions(self):
+        """Estado -> produção, para os estados que só reduzem por uma produção"""
+        padroes = {}
+        for estado, acoes in self.action_table.items():
+            reducoes = {acao[1] for acao in acoes.values() if acao[0] == "reduce"}
+            if len(reducoes) == 1:
+                padroes[estado] = reducoes.pop()
+        return padroes
+
+    def _build_error_messages(self):
+        """Estado -> mensagens de erro do primeiro item do estado que tem mensagens
+        (o item fica em error_items)"""
+        self.error_items = {}
+        for indice_estado, estado in enumerate(self.states):
+            for item in sorted(estado):
+                if item in self.grammar.error_messages:
+                    self.error_items[indice_estado] = item
+                    break
+        return {estado: self.grammar.error_messages[item] for estado, item in self.error_items.items()}
+
+    def compilar_tabelas(self, forma: str = None, eliminar_cadeias: bool = True) -> TabelasLR:
+        """TabelasLR a partir de action_table/goto_table. `forma` é "densa",
+        "comprimida" ou None (densa enquanto couber em 256 mil inteiros);
+        com eliminar_cadeias, o GOTO segue direto as cadeias de reduções unitárias."""
+        terminais = self.grammar.terminals
+        nonterminals = self.grammar.nonterminals
+        self.nonterminal_index = {nt: i for i, nt in enumerate(nonterminals)}
+        largura = len(terminais) + 1  # + coluna dos tipos de token fora da gramática
+        total_estados = len(self.states)
+        if forma is None:
+            forma = "densa" if total_estados * (largura + len(nonterminals)) <= 1 << 18 else "comprimida"
+        if forma not in ("densa", "comprimida"):
+            raise ValueError(f"Forma de tabela desconhecida: {forma}")
+
+        tabelas = TabelasLR()
+        tabelas.forma = forma
+        tabelas.num_terminais = len(terminais)
+        tabelas.producoes = tuple((self.nonterminal_index[cabeca], len(corpo))
+                                  for cabeca, corpo in self.grammar.productions)
+
+        linhas = []
+        for estado in range(total_estados):
+            padrao = self.default_reductions.get(estado)
+            linha = {}
+            for simbolo, acao in self.action_table[estado].items():
+                if acao[0] == "shift":
+                    linha[self.terminal_index[simbolo]] = acao[1] + 1
+                elif acao[0] == "reduce":
+                    if acao[1] != padrao:
+                        linha[self.terminal_index[simbolo]] = ~acao[1]
+                else:
+                    linha[self.terminal_index[simbolo]] = ~0
+            linhas.append(linha)
+        tabelas.acao_padrao = tuple(~self.default_reductions[estado] if estado in self.default_reductions
+                                    else 0 for estado in range(total_estados))
+        atalhos, cadeias = self._cadeias_unitarias(linhas, tabelas.acao_padrao) if eliminar_cadeias else ({}, [])
+        if forma == "densa":
+            for estado, linha in enumerate(linhas):
+                # Na forma densa as células sem ação própria já guardam a redução padrão
+                padrao = tabelas.acao_padrao[estado]
+                if padrao:
+                    for coluna in range(largura):
+                        linha.setdefault(coluna, padrao)
+        tabelas.acao_base, tabelas.acao_valores, tabelas.acao_verificacao = _deslocar_linhas(
+            linhas, largura, forma == "densa")
+
+        # Linhas de ATALHO iguais (mesmas cadeias por lookahead) são compartilhadas
+        linhas_atalho = {}
+        for padrao, entradas in atalhos.values():
+            linhas_atalho.setdefault((padrao, tuple(sorted(entradas.items()))), len(linhas_atalho))
+        colunas = [{} for _ in nonterminals]
+        for estado, desvios in self.goto_table.items():
+            for simbolo, destino in desvios.items():
+                atalho = atalhos.get((estado, simbolo))
+                if atalho is not None:
+                    padrao, entradas = atalho
+                    destino = ~linhas_atalho[(padrao, tuple(sorted(entradas.items())))]
+                colunas[self.nonterminal_index[simbolo]][estado] = destino
+        tabelas.desvio_padrao = tuple(Counter(coluna.values()).most_common(1)[0][0] if coluna else 0
+                                      for coluna in colunas)
+        if forma == "comprimida":
+            colunas = [{estado: destino for estado, destino in coluna.items() if destino != padrao}
+                       for coluna, padrao in zip(colunas, tabelas.desvio_padrao)]
+        tabelas.desvio_base, tabelas.desvio_valores, tabelas.desvio_verificacao = _deslocar_linhas(
+            colunas, total_estados, forma == "densa")
+
+        tabelas.atalho_padrao = tuple(padrao for padrao, _ in linhas_atalho)
+        linhas = [dict(entradas) for _, entradas in linhas_atalho]
+        if forma == "densa":
+            for linha, padrao in zip(linhas, tabelas.atalho_padrao):
+                for coluna in range(largura):
+                    linha.setdefault(coluna, padrao)
+        tabelas.atalho_base, tabelas.atalho_valores, tabelas.atalho_verificacao = _deslocar_linhas(
+            linhas, largura, forma == "densa")
+        tabelas.cadeia_estados = tuple(estados for estados, _ in cadeias)
+        tabelas.cadeia_producoes = tuple(producoes for _, producoes in cadeias)
+        tabelas.cadeia_destinos = tuple(estados[-1] for estados in tabelas.cadeia_estados)
+        return tabelas
+
+    def _cadeias_unitarias(self, linhas, padroes):
+        """Cadeias de reduções unitárias que seguem cada entrada (s, A) do GOTO.
+
+        Com o lookahead a, o estado t0 = goto(s, A) pode reduzir por B -> A,
+        voltando a s e indo a t1 = goto(s, B), que pode reduzir de novo, e
+        assim por diante: o analisador faria esses passos de qualquer jeito,
+        inclusive pelas reduções padrão, então segui-los de uma vez não muda a
+        linguagem aceita nem o ponto em que um erro é detectado. `linhas` e
+        `padroes` são as ações codificadas de ACTION. Retorna ({(s, A): (cadeia
+        padrão, {coluna: cadeia})}, cadeias), só para as entradas com alguma
+        cadeia; as colunas sem ação própria nos estados visitados seguem a
+        cadeia padrão. Cada cadeia é (estados t0..tn, produções unitárias)."""
+        productions = self.grammar.productions
+        nonterminals = set(self.grammar.nonterminals)
+        unitarias = {~p for p, (_, corpo) in enumerate(productions)
+                     if p and len(corpo) == 1 and corpo[0] in nonterminals}
+        redutores = [padroes[estado] in unitarias or any(acao in unitarias for acao in linha.values())
+                     for estado, linha in enumerate(linhas)]
+        cadeias = {}  # (estados, produções) -> número
+
+        def seguir(origem, estado, coluna):
+            """(número da cadeia, estados visitados) a partir de t0 = estado"""
+            estados = [estado]
+            producoes = []
+            while True:
+                acao = padroes[estado] if coluna is None else linhas[estado].get(coluna, padroes[estado])
+                if acao not in unitarias or len(producoes) > len(nonterminals):
+                    break
+                producoes.append(~acao)
+                estado = self.goto_table[origem][productions[~acao][0]]
+                estados.append(estado)
+            return cadeias.setdefault((tuple(estados), tuple(producoes)), len(cadeias)), estados
+
+        atalhos = {}
+        for origem, desvios in self.goto_table.items():
+            for simbolo, destino in desvios.items():
+                if not redutores[destino]:
+                    continue
+                padrao, estados_padrao = seguir(origem, destino, None)
+                entradas = {}
+                pendentes = {coluna for estado in estados_padrao for coluna in linhas[estado]}
+                vistas = set()
+                while pendentes:
+                    coluna = pendentes.pop()
+                    vistas.add(coluna)
+                    cadeia, estados = seguir(origem, destino, coluna)
+                    if cadeia != padrao:
+                        entradas[coluna] = cadeia
+                    pendentes.update(coluna for estado in estados for coluna in linhas[estado]
+                                     if coluna not in vistas)
+                if len(estados_padrao) > 1 or entradas:
+                    atalhos[(origem, simbolo)] = (padrao, entradas)
+        return atalhos, list(cadeias)
+
+    # ==================== Tabelas prontas ====================
+
+    # O que só a construção calcula: num analisador criado a partir das tabelas
+    # prontas (carregar, do_modulo) é reconstruído no primeiro acesso
+    _CONSTRUCAO = ('first', 'follow', 'nullable', 'epsilon_bit', 'first_bits', 'follow_bits', 'states',
+                   'transitions', 'lookaheads', 'conflicts', 'action_table', 'goto_table', 'default_reductions')
+
+    def __getattr__(self, nome):
+        if nome not in SLRAnalyzer._CONSTRUCAO or not self.__dict__.get('_carregado'):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{nome}'")
+        with _trava_construcao:
+            if nome not in self.__dict__:
+                completo = type(self)(self.grammar, self.tabelas.forma, self.algoritmo)
+                for atributo in SLRAnalyzer._CONSTRUCAO:
+                    self.__dict__[atributo] = completo.__dict__[atributo]
+        return self.__dict__[nome]
+
+    @classmethod
+    def carregar(cls, grammar: Grammar = None, forma: str = None, diretorio: str = None,
+                 algoritmo: str = "slr", eliminar_cadeias: bool = True) -> 'SLRAnalyzer':
+        """SLRAnalyzer com as tabelas do cache em disco (em `diretorio` ou no
+        diretório de cache do usuário, diretorio_tabelas()), sem FIRST/FOLLOW,
+        autômato nem compilação. Sem um cache válido para a gramática, constrói
+        o analisador e grava o cache, apagando os arquivos deixados por outras
+        versões deste módulo; falhas de gravação são ignoradas."""
+        inicio = time.perf_counter()
+        grammar = grammar or Grammar()
+        digital = impressao_digital(grammar)
+        diretorio = diretorio or diretorio_tabelas()
+        arquivo = os.path.join(diretorio, f"{_PREFIXO_TABELAS}{digital.hex()}-{algoritmo}-{forma or 'auto'}"
+                                          f"{'' if eliminar_cadeias else '-sem-cadeias'}.dmt")
+        secoes = _ler_tabelas(arquivo, digital)
+        if secoes is None:
+            analisador = cls(grammar, forma, algoritmo, eliminar_cadeias=eliminar_cadeias)
+            _gravar_tabelas(arquivo, digital, analisador.exportar_tabelas())
+            _apagar_tabelas_antigas(diretorio)
+            return analisador
+        analisador = cls._de_secoes(grammar, secoes)
+        analisador.build_times["carga"] = time.perf_counter() - inicio
+        return analisador
+
+    @classmethod
+    def do_modulo(cls, modulo, grammar: Grammar = None) -> 'SLRAnalyzer':
+        """SLRAnalyzer com as tabelas de um módulo gerado por gerar_modulo (o
+        módulo ou o seu nome). Lança ValueError se o módulo foi gerado para
+        outra gramática ou outra versão deste arquivo."""
+        inicio = time.perf_counter()
+        if isinstance(modulo, str):
+            modulo = importlib.import_module(modulo)
+        grammar = grammar or Grammar()
+        if getattr(modulo, 'IMPRESSAO_DIGITAL', None) != impressao_digital(grammar).hex():
+            raise ValueError(f"As tabelas de '{modulo.__name__}' não são desta gramática")
+        analisador = cls._de_secoes(grammar, {nome: getattr(modulo, nome.upper()) for nome in _SECOES_TABELAS})
+        analisador.build_times["carga"] = time.perf_counter() - inicio
+        return analisador
+
+    def gerar_modulo(self, caminho: str):
+        """Grava as tabelas como um módulo Python de tuplas constantes, para
+        do_modulo: a importação (a partir do .pyc) dispensa até a leitura do cache"""
+        linhas = ['"""Tabelas SLR geradas por slr.SLRAnalyzer.gerar_modulo. Não edite."""', '',
+                  f"IMPRESSAO_DIGITAL = {impressao_digital(self.grammar).hex()!r}"]
+        linhas += [f"{nome.upper()} = {tuple(valores)!r}" for nome, valores in self.exportar_tabelas().items()]
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('\n'.join(linhas) + '\n')
+        os.replace(temporario, caminho)
+
+    def exportar_tabelas(self) -> dict:
+        """Seção de _SECOES_TABELAS -> inteiros: o que os analisadores usam
+        (TabelasLR e o item das mensagens de erro de cada estado)"""
+        tabelas = self.tabelas
+        itens_erro = [-1] * (2 * len(tabelas.acao_base))
+        for estado, item in self.error_items.items():
+            itens_erro[2 * estado:2 * estado + 2] = item
+        secoes = {
+            'dimensoes': (_FORMAS.index(tabelas.forma), tabelas.num_terminais, len(tabelas.acao_base),
+                          _ALGORITMOS.index(self.algoritmo)),
+            'producoes': tuple(numero for producao in tabelas.producoes for numero in producao),
+            'itens_erro': tuple(itens_erro),
+            'cadeias': tuple(numero for estados, producoes in zip(tabelas.cadeia_estados, tabelas.cadeia_producoes)
+                             for numero in (len(producoes),) + estados + producoes),
+        }
+        secoes.update((nome, getattr(tabelas, nome)) for nome in _SECOES_TABELAS[4:])
+        return secoes
+
+    @classmethod
+    def _de_secoes(cls, grammar: Grammar, secoes: dict) -> 'SLRAnalyzer':
+        analisador = cls.__new__(cls)
+        analisador._carregado = True
+        analisador.grammar = grammar
+        analisador.build_times = {}
+        analisador.terminal_index = {terminal: i for i, terminal in enumerate(grammar.terminals)}
+        analisador.nonterminal_index = {nt: i for i, nt in enumerate(grammar.nonterminals)}
+        forma, num_terminais, _, algoritmo = secoes['dimensoes']
+        analisador.algoritmo = _ALGORITMOS[algoritmo]
+        tabelas = TabelasLR()
+        tabelas.forma = _FORMAS[forma]
+        tabelas.num_terminais = num_terminais
+        producoes = secoes['producoes']
+        tabelas.producoes = tuple(zip(producoes[::2], producoes[1::2]))
+        for nome in _SECOES_TABELAS[4:]:
+            setattr(tabelas, nome, tuple(secoes[nome]))
+        cadeias = secoes['cadeias']
+        estados, producoes = [], []
+        posicao = 0
+        while posicao < len(cadeias):
+            tamanho = cadeias[posicao]
+            estados.append(tuple(cadeias[posicao + 1:posicao + tamanho + 2]))
+            producoes.append(tuple(cadeias[posicao + tamanho + 2:posicao + 2 * tamanho + 2]))
+            posicao += 2 * tamanho + 2
+        tabelas.cadeia_estados, tabelas.cadeia_producoes = tuple(estados), tuple(producoes)
+        analisador.tabelas = tabelas
+        itens = secoes['itens_erro']
+        analisador.error_items = {estado: (itens[2 * estado], itens[2 * estado + 1])
+                                  for estado in range(len(itens) // 2) if itens[2 * estado] >= 0}
+        analisador.state_error_messages = {estado: grammar.error_messages[item]
+                                           for estado, item in analisador.error_items.items()}
+        return analisador
+
+    def _adicionar_acao(self, estado, tabela_estado, simbolo, acao):
         existente = tabela_estado.get(simbolo)
-        if existente is not None and existente != acao:
-            raise ValueError(f"Conflito na tabela SLR para símbolo '{simbolo}': {existente} vs {acao}")
-        tabela_estado[simbolo] = acao
-
-    def _first_of_symbol(self, simbolo, first_map):
-        if simbolo in self.grammar.nonterminals:
-            return first_map.get(simbolo, set())
-        return {simbolo}
+        if existente is None or existente == acao:
+            tabela_estado[simbolo] = acao
+            return
+        if acao[0] != "reduce" and (existente[0] == "reduce" or acao < existente):
+            existente, acao = acao, existente
+        elif acao[0] == existente[0] == "reduce" and acao[1] < existente[1]:
+            existente, acao = acao, existente
+        tabela_estado[simbolo] = existente
+        self.conflicts.append((estado, simbolo, existente, acao))
+
+
+# Cache das tabelas em disco, no contêiner do cache de AST (cache.py): um arquivo por
+# gramática e forma no diretório de cache do usuário, com o nome e o cabeçalho
+# marcados pela impressão digital da gramática e deste arquivo. O nome começa
+# pela versão deste arquivo (_PREFIXO_TABELAS), para que os arquivos de versões
+# anteriores sejam reconhecidos e apagados. Cada seção de _SECOES_TABELAS é um
+# array('i').
+
+_MAGICO_TABELAS = b'DRMT'
+_FORMATO_TABELAS = 4  # Metadados do contêiner (cache.py): a impressão digital
+_SECOES_TABELAS = (
+    'dimensoes',   # forma (índice em _FORMAS), número de terminais e de estados, algoritmo (em _ALGORITMOS)
+    'producoes',   # pares (cabeça, tamanho do corpo)
+    'itens_erro',  # pares (produção, ponto) do item com as mensagens de erro de cada estado, ou -1
+    'cadeias',     # por cadeia: n, os n + 1 estados e as n produções unitárias
+    'acao_base', 'acao_valores', 'acao_verificacao', 'acao_padrao',
+    'desvio_base', 'desvio_valores', 'desvio_verificacao', 'desvio_padrao',
+    'atalho_base', 'atalho_valores', 'atalho_verificacao', 'atalho_padrao', 'cadeia_destinos',
+)
+_FORMAS = ("densa", "comprimida")
+_ALGORITMOS = ("slr", "lalr")
+_RASTROS = ("off", "compact", "stream")
+_trava_construcao = threading.Lock()
+
+
+def _calcular_versao_tabelas() -> bytes:
+    """Identifica a construção das tabelas: o formato, a plataforma e o código
+    deste arquivo. Qualquer mudança nele invalida as tabelas guardadas."""
+    resumo = hashlib.blake2b(digest_size=16)
+    resumo.update(f"{_FORMATO_TABELAS} {sys.byteorder} {array('i').itemsize}".encode())
+    with open(__file__, 'rb') as arquivo:
+        resumo.update(arquivo.read())
+    return resumo.digest()
+
+
+VERSAO_TABELAS = _calcular_versao_tabelas()
+_PREFIXO_TABELAS = f"slr-{VERSAO_TABELAS.hex()[:16]}-"
+
+
+def diretorio_tabelas() -> str:
+    """Diretório padrão das tabelas guardadas: dramatica/ no cache do usuário
+    (%LOCALAPPDATA% no Windows, $XDG_CACHE_HOME ou ~/.cache nos demais), ou
+    no diretório temporário se não houver um diretório pessoal"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME')
+        if not base:
+            pessoal = os.path.expanduser('~')
+            base = os.path.join(pessoal, '.cache') if pessoal != '~' else None
+    return os.path.join(base or tempfile.gettempdir(), 'dramatica')
+
+
+def _apagar_tabelas_antigas(diretorio: str):
+    """Apaga os .dmt gravados por outras versões deste módulo, que nunca mais
+    seriam lidos (as impressões digitais deles não podem mais ser geradas)"""
+    try:
+        nomes = os.listdir(diretorio)
+    except OSError:
+        return
+    for nome in nomes:
+        if nome.startswith('slr-') and nome.endswith('.dmt') and not nome.startswith(_PREFIXO_TABELAS):
+            try:
+                os.unlink(os.path.join(diretorio, nome))
+            except OSError:
+                pass
+
+
+def impressao_digital(grammar: Grammar) -> bytes:
+    """Hash das produções da gramática (com os símbolos, as ações semânticas e
+    as mensagens de erro) e de VERSAO_TABELAS: a chave das tabelas guardadas"""
+    resumo = hashlib.blake2b(VERSAO_TABELAS, digest_size=16)
+    resumo.update(repr((grammar.start_symbol, grammar.terminals, grammar.nonterminals, grammar.productions,
+                        grammar.actions, sorted(grammar.error_messages.items()))).encode('utf-8'))
+    return resumo.digest()
+
+
+def _ler_tabelas(arquivo_cache: str, digital: bytes):
+    """Seções do cache se ele for desta impressão digital; None caso contrário"""
+    conteudo = ler_conteiner(arquivo_cache, _MAGICO_TABELAS, _FORMATO_TABELAS, len(digital),
+                             len(_SECOES_TABELAS))
+    if conteudo is None or conteudo[0] != digital:
+        return None
+    secoes = {}
+    for nome, dados in zip(_SECOES_TABELAS, conteudo[1]):
+        secoes[nome] = array('i')
+        secoes[nome].frombytes(dados)
+    return secoes
+
+
+def _gravar_tabelas(arquivo_cache: str, digital: bytes, secoes: dict):
+    gravar_conteiner(arquivo_cache, _MAGICO_TABELAS, _FORMATO_TABELAS, digital,
+                     [array('i', secoes[nome]).tobytes() for nome in _SECOES_TABELAS])
+
+
+MODULO_TABELAS = 'slr_tabelas'  # Módulo opcional gerado por gerar_modulo para a gramática DRAMATICA
+_analisador = None
+_trava_analisador = threading.Lock()
+
+
+def analisador_padrao() -> SLRAnalyzer:
+    """SLRAnalyzer da gramática DRAMATICA, criado no primeiro uso e compartilhado
+    entre threads (as tabelas são tuplas imutáveis). As tabelas vêm do módulo
+    gerado MODULO_TABELAS, se ele existir e estiver atualizado, ou do cache em
+    disco; só sem nenhum dos dois a gramática é analisada."""
+    global _analisador
+    if _analisador is None:
+        with _trava_analisador:
+            if _analisador is None:
+                try:
+                    analisador = SLRAnalyzer.do_modulo(MODULO_TABELAS)
+                except (ImportError, ValueError):
+                    analisador = SLRAnalyzer.carregar()
+                _analisador = analisador
+    return _analisador
+
+
+class ParserSLR:
+    """Alternativa a Parser(tokens).parse() dirigida pelas tabelas SLR.
+
+    Lê os tokens direto do lexer (lista, TokenBuffer ou iterador, como o Parser)
+    e monta o mesmo Programa com as ações semânticas das reduções. Os erros são
+    os do Parser, com a mesma mensagem e posição: quando não há ação para o
+    token, a redução única do estado (se houver) é feita mesmo assim, o que leva
+    o erro ao ponto em que a descida recursiva o detectaria, e a mensagem vem do
+    item do estado (Grammar.error_messages). Como no Parser, o que vem depois de
+    FIM_CENA não é examinado e o uso de variável não declarada só é lançado ao
+    final, se não houver erro sintático."""
+
+    def __init__(self, tokens: Union[List[Token], Iterable[Token]], analisador: SLRAnalyzer = None):
+        self.tokens = tokens
+        self.analisador = analisador or analisador_padrao()
+        self.variaveis_declaradas = {}  # nome -> (posicao_declaracao, tipo), como no Parser
+        self.nome_personagem = None
+        self._erro_semantico = None
+
+    def parse(self) -> Programa:
+        """Analisa o programa e retorna a AST. Lança ErroSintatico ou ErroSemantico."""
+        analisador = self.analisador
+        tabelas = analisador.tabelas
+        base, tabela, verificacao, padrao = (tabelas.acao_base, tabelas.acao_valores,
+                                             tabelas.acao_verificacao, tabelas.acao_padrao)
+        desvio_base, desvio_valores, desvio_verificacao, desvio_padrao = (
+            tabelas.desvio_base, tabelas.desvio_valores, tabelas.desvio_verificacao, tabelas.desvio_padrao)
+        atalho_base, atalho_valores, atalho_verificacao, atalho_padrao = (
+            tabelas.atalho_base, tabelas.atalho_valores, tabelas.atalho_verificacao, tabelas.atalho_padrao)
+        cadeia_destinos, cadeia_producoes = tabelas.cadeia_destinos, tabelas.cadeia_producoes
+        producoes = tabelas.producoes
+        semanticas = [getattr(self, nome) if nome else None for nome in analisador.grammar.actions]
+        indice_terminal = analisador.terminal_index
+        outro = tabelas.num_terminais
+        fim_cena = indice_terminal[TipoToken.FIM_CENA]
+        eof = indice_terminal[TipoToken.EOF]
+
+        estados = [0]
+        valores = [None]
+        estado = 0
+        tokens = iter(self.tokens)
+        token = next(tokens)
+        terminal = indice_terminal.get(token.tipo, outro)
+        while True:
+            indice = base[estado] + terminal
+            acao = tabela[indice] if verificacao[indice] == estado else padrao[estado]
+            if acao > 0:
+                estado = acao - 1
+                estados.append(estado)
+                valores.append(token)
+                if terminal == fim_cena:
+                    terminal = eof  # Fim do programa: o resto da entrada é ignorado
+                else:
+                    token = next(tokens, token)
+                    terminal = indice_terminal.get(token.tipo, outro)
+            elif acao < -1:
+                producao = ~acao
+                cabeca, tamanho = producoes[producao]
+                if tamanho:
+                    filhos = valores[-tamanho:]
+                    del valores[-tamanho:]
+                    del estados[-tamanho:]
+                else:
+                    filhos = ()
+                semantica = semanticas[producao]
+                valor = semantica(*filhos) if semantica else filhos[0]
+                indice = desvio_base[cabeca] + estados[-1]
+                estado = (desvio_valores[indice] if desvio_verificacao[indice] == cabeca
+                          else desvio_padrao[cabeca])
+                if estado < 0:  # Cadeia de reduções unitárias: as ações semânticas delas, em ordem
+                    linha = ~estado
+                    indice = atalho_base[linha] + terminal
+                    cadeia = (atalho_valores[indice] if atalho_verificacao[indice] == linha
+                              else atalho_padrao[linha])
+                    for unitaria in cadeia_producoes[cadeia]:
+                        semantica = semanticas[unitaria]
+                        if semantica:
+                            valor = semantica(valor)
+                    estado = cadeia_destinos[cadeia]
+                valores.append(valor)
+                estados.append(estado)
+            elif acao == 0:
+                raise self._erro(estado, token)
+            else:
+                if self._erro_semantico is not None:
+                    raise self._erro_semantico
+                return valores[-1]
+
+    def _erro(self, estado: int, token: Token) -> Union[ErroSintatico, ErroSemantico]:
+        """Erro do Parser recursivo para o token inesperado no estado"""
+        mensagens = self.analisador.state_error_messages.get(estado)
+        if mensagens is None:
+            semantico, mensagem = False, f"Token inesperado '{token.lexema}'"
+        else:
+            semantico, mensagem = mensagens.get(token.tipo, mensagens[None])
+        classe = ErroSemantico if semantico else ErroSintatico
+        return classe(mensagem, posicao=token.posicao, mapa_linhas=token.mapa_linhas)
+
+    def _registrar_nao_declarada(self, token: Token, contexto: str):
+        """Guarda o uso de variável não declarada que vem primeiro na fonte (as
+        reduções não seguem a ordem da fonte: a atribuição é reduzida depois da
+        expressão)"""
+        if self._erro_semantico is None or token.posicao < self._erro_semantico.posicao:
+            self._erro_semantico = ErroSemantico(
+                f"Variável '{token.lexema}' não foi declarada antes do uso {contexto}",
+                posicao=token.posicao,
+                mapa_linhas=token.mapa_linhas
+            )
+
+    # Ações semânticas, uma por produção (Grammar.actions); recebem os valores do corpo
+
+    def _reduzir_programa(self, cena, nome, dois_pontos, personagem, comandos, fim):
+        return Programa(nome.lexema, personagem, comandos)
+
+    def _reduzir_personagem(self, marcador, nome, dois_pontos, declaracoes):
+        self.nome_personagem = nome.lexema
+        return Personagem(nome.lexema, declaracoes)
+
+    def _reduzir_memoria(self, memoria, dois_pontos, declaracoes, fim):
+        return declaracoes
+
+    def _reduzir_lista_vazia(self):
+        return []
+
+    def _reduzir_lista(self, lista, item):
+        lista.append(item)
+        return lista
+
+    def _reduzir_nome_declaracao(self, nome):
+        if nome.lexema in self.variaveis_declaradas:
+            posicao_original, tipo_original = self.variaveis_declaradas[nome.lexema]
+            linha_original = nome.mapa_linhas.linha_coluna(posicao_original)[0]
+            raise ErroSemantico(
+                f"Variável '{nome.lexema}' já foi declarada na linha {linha_original} com tipo {tipo_original}",
+                posicao=nome.posicao,
+                mapa_linhas=nome.mapa_linhas
+            )
+        return nome
+
+    def _reduzir_tipo(self, tipo):
+        return tipo.tipo
+
+    def _reduzir_declaracao(self, nome, dois_pontos, tipo, ponto_virgula):
+        self.variaveis_declaradas[nome.lexema] = (nome.posicao, tipo)
+        return Declaracao(nome.lexema, tipo)
+
+    def _reduzir_leitura(self, leia, variavel, ponto_virgula):
+        if variavel.lexema not in self.variaveis_declaradas:
+            self._registrar_nao_declarada(variavel, "no comando LEIA")
+        return ComandoLeitura(variavel.lexema, variavel.posicao)
+
+    def _reduzir_fala(self, personagem, diz):
+        if self.nome_personagem and personagem.lexema != self.nome_personagem:
+            raise ErroSemantico(
+                f"Personagem '{personagem.lexema}' usado no comando DIZ não corresponde ao personagem declarado '{self.nome_personagem}'",
+                posicao=personagem.posicao,
+                mapa_linhas=personagem.mapa_linhas
+            )
+        return personagem
+
+    def _reduzir_escrita(self, personagem, expressao, ponto_virgula):
+        return ComandoEscrita(personagem.lexema, expressao)
+
+    def _reduzir_atribuicao(self, variavel, igual, expressao, ponto_virgula):
+        if variavel.lexema not in self.variaveis_declaradas:
+            self._registrar_nao_declarada(variavel, "na atribuição")
+        return ComandoAtribuicao(variavel.lexema, expressao, variavel.posicao)
+
+    def _reduzir_expressao_simples(self, expressao, operador, termo):
+        expressao.termos.append((operador.lexema, termo))
+        return expressao
+
+    def _reduzir_primeiro_termo(self, termo):
+        return ExpressaoSimples([("", termo)])
+
+    def _reduzir_termo(self, termo, operador, fator):
+        termo.fatores.append((operador.lexema, fator))
+        return termo
+
+    def _reduzir_primeiro_fator(self, fator):
+        return Termo([("", fator)])
+
+    def _reduzir_fator(self, fator, operador, elemento):
+        fator.elementos.append((operador.lexema, elemento))
+        return fator
+
+    def _reduzir_primeiro_elemento(self, elemento):
+        return Fator([("", elemento)])
+
+    def _reduzir_identificador(self, token):
+        if token.lexema not in self.variaveis_declaradas:
+            self._registrar_nao_declarada(token, "na expressão")
+        return Elemento(token.lexema, "IDENTIFICADOR", token.posicao)
+
+    def _reduzir_inteiro(self, token):
+        return Elemento(int(token.lexema), "NUM_INTEIRO", token.posicao)
+
+    def _reduzir_real(self, token):
+        return Elemento(float(token.lexema), "NUM_REAL", token.posicao)
+
+    def _reduzir_string(self, token):
+        return Elemento(token.lexema, "STRING", token.posicao)
+
+    def _reduzir_parenteses(self, abre, expressao, fecha):
+        return Elemento(expressao, "EXPRESSAO", abre.posicao)
@@ -1,4 +1,13 @@
-from lexer import Lexer
+import glob
+import io
+import os
+import random
+import sys
+import tempfile
+
+from lexer import (Lexer, LexerRegex, ErroLexico, ErrosOmitidos, relexar, calcular_edicao, tokenizar_paralelo,
+                   tokenizar_arquivo)
+from tokens import IndiceLinhas
 
 def testar_lexer():
     # Código de exemplo em PiLang
@@ -65,6 +74,254 @@ def testar_lexer_com_erros():
     for token in tokens:
         print(token)
 
+def _comparar_motores(codigo):
+    tokens_esperados, erros_esperados = Lexer(codigo).tokenizar()
+    tokens, erros = LexerRegex(codigo).tokenizar()
+    assert [(t.tipo, t.lexema, t.linha, t.coluna) for t in tokens] == \
+        [(t.tipo, t.lexema, t.linha, t.coluna) for t in tokens_esperados]
+    assert erros == erros_esperados
+
+def testar_lexer_regex_equivalente():
+    """O motor de padrão mestre produz os mesmos tokens e erros que o Lexer"""
+    for arquivo in glob.glob("exemplos/*"):
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            _comparar_motores(f.read())
+
+    casos = [
+        "",
+        "x = 12.;",
+        "x = 12.5 / 3 // comentário\n  y = 1 / 2;",
+        'Ator DIZ "aberta\nx = 1;',
+        'Ator DIZ "sem fim',
+        "ação = x²1 + ½ @ # $ '",
+        "CENA A:\r\n\tLEIA a;\0 ignorado",
+    ]
+    for codigo in casos:
+        _comparar_motores(codigo)
+
+def _tokenizar_cabecalho(motor, linhas):
+    """Tokeniza um script precedido por um cabeçalho de comentários e confere a trivia"""
+    codigo = "// linha de cabeçalho gerada\n" * linhas + "CENA Fim: FIM_CENA"
+    tokens, erros = motor(codigo, manter_comentarios=True).tokenizar()
+
+    assert not erros
+    assert [t.tipo for t in tokens] == ["CENA", "IDENTIFICADOR", "DOIS_PONTOS", "FIM_CENA", "EOF"]
+    assert len(tokens[0].trivia) == linhas
+    inicio_ultimo, fim_ultimo = tokens[0].trivia[-1]
+    assert codigo[inicio_ultimo:fim_ultimo] == "// linha de cabeçalho gerada"
+    assert tokens[1].trivia is None
+    return codigo
+
+def _profundidade_da_pilha():
+    quadro, profundidade = sys._getframe(), 0
+    while quadro is not None:
+        quadro, profundidade = quadro.f_back, profundidade + 1
+    return profundidade
+
+def testar_comentarios_longos_sem_recursao():
+    """100 mil linhas de comentário não estouram a pilha, mesmo com um limite de
+    recursão apertado, e o Lexer avança uma única vez por caractere (o tempo
+    é medido em benchmark.py comentarios)"""
+    class LexerContado(Lexer):
+        avancos = 0
+
+        def avancar(self):
+            LexerContado.avancos += 1
+            super().avancar()
+
+    limite = sys.getrecursionlimit()
+    sys.setrecursionlimit(_profundidade_da_pilha() + 50)
+    try:
+        for motor in (LexerContado, LexerRegex):
+            codigo = _tokenizar_cabecalho(motor, 100_000)
+    finally:
+        sys.setrecursionlimit(limite)
+    assert LexerContado.avancos <= len(codigo)
+
+def testar_comentarios_descartados_por_padrao():
+    """Sem manter_comentarios, nenhum token recebe trivia e '/' isolado continua sendo divisão"""
+    codigo = "// comentário\nx = a / b; // fim"
+    for motor in (Lexer, LexerRegex):
+        tokens, erros = motor(codigo).tokenizar()
+        assert not erros
+        assert [t.lexema for t in tokens] == ["x", "=", "a", "/", "b", ";", ""]
+        assert all(t.trivia is None for t in tokens)
+
+        tokens, _ = motor(codigo, manter_comentarios=True).tokenizar()
+        assert tokens[0].trivia == ((0, 13),)
+        assert codigo[slice(*tokens[-1].trivia[0])] == "// fim"
+
+def testar_iter_tokens_em_blocos():
+    """iter_tokens lê a fonte em blocos e mantém linha/coluna corretas entre eles"""
+    codigos = ['x = 1;\n"aberta\ny = 2.;\0 ignorado']
+    for arquivo in glob.glob("exemplos/*"):
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            codigos.append(f.read())
+
+    for codigo in codigos:
+        tokens_esperados, erros_esperados = Lexer(codigo, manter_comentarios=True).tokenizar()
+        esperado = [(t.tipo, t.lexema, t.linha, t.coluna, t.trivia) for t in tokens_esperados]
+        for tamanho_bloco in (1, 7, 64, 65536):
+            erros = []
+            fluxo = Lexer.iter_tokens(io.StringIO(codigo), erros, tamanho_bloco, manter_comentarios=True)
+            assert [(t.tipo, t.lexema, t.linha, t.coluna, t.trivia) for t in fluxo] == esperado
+            assert erros == erros_esperados
+
+def testar_iter_tokens_preguicoso():
+    """Os tokens são gerados antes de a fonte inteira ser lida"""
+    fonte = io.StringIO("LEIA a;\n" * 10_000)
+    fluxo = Lexer.iter_tokens(fonte, tamanho_bloco=64)
+    assert [next(fluxo).lexema for _ in range(3)] == ["LEIA", "a", ";"]
+    assert fonte.tell() < 1024
+
+def testar_token_buffer_equivalente():
+    """TokenBuffer expõe os mesmos tokens (via TokenView) que a lista de Token"""
+    for arquivo in glob.glob("exemplos/*"):
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            codigo = f.read()
+        lexer = LexerRegex(codigo, manter_comentarios=True)
+        tokens, erros_esperados = lexer.tokenizar()
+        buffer, erros = LexerRegex(codigo, manter_comentarios=True).tokenizar_buffer()
+
+        assert erros == erros_esperados
+        assert len(buffer) == len(tokens)
+        assert [(t.tipo, t.lexema, t.linha, t.coluna, t.trivia) for t in buffer] == \
+            [(t.tipo, t.lexema, t.linha, t.coluna, t.trivia) for t in tokens]
+        assert str(buffer[-1]) == str(tokens[-1])
+        assert buffer[0].lexema == tokens[0].lexema
+
+def _visao(tokens):
+    return [(t.tipo, t.lexema, t.linha, t.coluna, t.trivia) for t in tokens]
+
+def testar_relexar_equivale_a_tokenizar():
+    """Edições aleatórias reanalisadas incrementalmente dão o mesmo resultado que do zero"""
+    pedacos = ["x", "1", "2.", " ", "\n", "// nota\n", '"abc', '"', "@", ";", "=", "CENA"]
+    aleatorio = random.Random(42)
+    for _ in range(300):
+        codigo = "".join(aleatorio.choice(pedacos) for _ in range(aleatorio.randint(0, 25)))
+        manter = aleatorio.random() < 0.5
+        buffer, _ = LexerRegex(codigo, manter).tokenizar_buffer()
+        for _ in range(5):
+            posicao = aleatorio.randint(0, len(buffer.fonte))
+            removidos = aleatorio.randint(0, len(buffer.fonte) - posicao)
+            inseridos = "".join(aleatorio.choice(pedacos) for _ in range(aleatorio.randint(0, 3)))
+            buffer, erros = relexar(buffer, posicao, removidos, inseridos)
+
+            esperado, erros_esperados = LexerRegex(buffer.fonte, manter).tokenizar_buffer()
+            assert _visao(buffer) == _visao(esperado)
+            assert erros == erros_esperados
+
+def testar_relexar_reaproveita_tokens_seguintes():
+    """Só a linha editada é reanalisada; o resto é deslocado"""
+    codigo = "".join(f"v{i} = {i};\n" for i in range(2000))
+    buffer, _ = LexerRegex(codigo).tokenizar_buffer()
+    posicao = codigo.index("v1000 =") + 1
+    ultima_linha = buffer[-1].linha
+    novo, erros = relexar(buffer, posicao, 4, "abc\nw")
+    assert not erros
+    assert novo.fonte == codigo[:posicao] + "abc\nw" + codigo[posicao + 4:]
+    assert _visao(novo) == _visao(LexerRegex(novo.fonte).tokenizar_buffer()[0])
+    assert novo[-1].linha == ultima_linha + 1
+
+def testar_calcular_edicao():
+    """calcular_edicao encontra a menor edição entre dois documentos"""
+    antigo = "CENA A:\n" + "LEIA x;\n" * 5000 + "FIM_CENA"
+    novo = antigo.replace("LEIA x;\n", "LEIA y;\n", 1)
+    posicao, removidos, inseridos = calcular_edicao(antigo, novo)
+    assert (posicao, removidos, inseridos) == (len("CENA A:\nLEIA "), 1, "y")
+    assert calcular_edicao(antigo, antigo) == (len(antigo), 0, "")
+    assert calcular_edicao("", "abc") == (0, 0, "abc")
+
+def testar_tokenizar_paralelo_equivalente():
+    """Trechos tokenizados em processos separados são costurados com posições globais"""
+    codigo = "".join(
+        f"// bloco {i}\nv{i} = {i}.5 @ \"texto {i}\n  w ^ 12. ção;\n\n" for i in range(300))
+    for manter in (False, True):
+        esperado, erros_esperados = LexerRegex(codigo, manter).tokenizar_buffer()
+        for workers in (1, 3):
+            buffer, erros = tokenizar_paralelo(codigo, workers, manter)
+            assert _visao(buffer) == _visao(esperado)
+            assert erros == erros_esperados
+
+def testar_indice_linhas():
+    """IndiceLinhas dá a mesma linha/coluna que a contagem caractere a caractere"""
+    aleatorio = random.Random(7)
+    for _ in range(50):
+        fonte = "".join(aleatorio.choice("ab \n\n") for _ in range(aleatorio.randint(0, 40)))
+        mapa = IndiceLinhas(fonte)
+        em_blocos = IndiceLinhas()
+        base = 0
+        for trecho in fonte.splitlines(keepends=True):
+            em_blocos.estender(trecho, base)
+            base += len(trecho)
+        assert em_blocos.inicios == mapa.inicios
+
+        linha, coluna = 1, 1
+        for posicao, char in enumerate(fonte + "\0"):
+            assert mapa.linha_coluna(posicao) == (linha, coluna)
+            linha, coluna = (linha + 1, 1) if char == "\n" else (linha, coluna + 1)
+
+def testar_erros_lexicos_agrupados_e_limitados():
+    """Caracteres inválidos seguidos viram um só erro; max_erros resume o excedente"""
+    codigo = 'x = @@@ ;\ny = 1 # #\nz = $ 2 "abc'
+    for motor in (Lexer, LexerRegex):
+        _, erros = motor(codigo).tokenizar()
+        assert [str(e) for e in erros] == [
+            "Erro léxico na linha 1, colunas 5-7: 3 caracteres inválidos '@@@'",
+            "Erro léxico na linha 2, colunas 7-9: 2 caracteres inválidos '# #'",
+            "Erro léxico na linha 3, coluna 5: caractere inválido '$'",
+            "Erro léxico na linha 3, coluna 9: caractere inválido '\"abc'",
+        ]
+        assert isinstance(erros[0], ErroLexico)
+        assert (erros[0].posicao, erros[0].fim, erros[0].quantidade) == (4, 7, 3)
+
+    lixo = "§" * 100000
+    _, erros = LexerRegex(lixo).tokenizar()
+    assert len(erros) == 1 and erros[0].quantidade == 100000 and len(erros[0].lexema) < 100
+
+    codigo = "x @\n" * 1000
+    _, esperados = Lexer(codigo, max_erros=10).tokenizar()
+    assert len(esperados) == 11 and esperados[-1] == ErrosOmitidos(990)
+    assert str(esperados[-1]) == "... e mais 990 erro(s) léxico(s)"
+    assert LexerRegex(codigo, max_erros=10).tokenizar()[1] == esperados
+    assert LexerRegex(codigo, max_erros=10).tokenizar_buffer()[1] == esperados
+    erros = []
+    list(Lexer.iter_tokens(codigo, erros, tamanho_bloco=64, max_erros=10))
+    assert erros == esperados
+
+def testar_tokenizar_arquivo_mapeado():
+    codigo = ('CENA Ação:\n  PERSONAGEM Zé:\n    MEMORIA:\n      título: VARCHAR;\n    FIM_MEMORIA\n'
+              '  título = "coração" + 1.5; // comentário ç\n  x = § @ # 2;\n  y = 12.;\nFIM_CENA\n')
+    with tempfile.NamedTemporaryFile('w', suffix='.dramatica', delete=False, encoding='utf-8') as f:
+        f.write(codigo)
+    try:
+        esperados, erros_esperados = LexerRegex(codigo).tokenizar()
+        tokens, erros = tokenizar_arquivo(f.name)
+        assert [(t.tipo, t.lexema, t.linha, t.coluna) for t in tokens] == \
+               [(t.tipo, t.lexema, t.linha, t.coluna) for t in esperados]
+        assert list(map(str, erros)) == list(map(str, erros_esperados))
+        try:
+            relexar(tokens, 0, 0, "// ")
+            assert False, "esperado TypeError"
+        except TypeError as e:
+            assert "TokenBuffer em memória" in str(e)
+        tokens.fechar()
+    finally:
+        os.remove(f.name)
+
 if __name__ == "__main__":
     testar_lexer()
     testar_lexer_com_erros()
+    testar_lexer_regex_equivalente()
+    testar_comentarios_longos_sem_recursao()
+    testar_comentarios_descartados_por_padrao()
+    testar_iter_tokens_em_blocos()
+    testar_iter_tokens_preguicoso()
+    testar_token_buffer_equivalente()
+    testar_relexar_equivale_a_tokenizar()
+    testar_relexar_reaproveita_tokens_seguintes()
+    testar_calcular_edicao()
+    testar_tokenizar_paralelo_equivalente()
+    testar_indice_linhas()
+    testar_erros_lexicos_agrupados_e_limitados()
+    testar_tokenizar_arquivo_mapeado()
@@ -1,5 +1,20 @@
-from lexer import Lexer
-from parser import Parser
+import contextlib
+import glob
+import importlib.util
+import io
+import os
+import random
+import tempfile
+
+from arena import ParserArena, ProgramaArena
+from cache import CacheAnalise, caminho_do_cache, carregar_programa
+from lexer import Lexer, LexerRegex
+from interpreter import InterpretadorPiLang
+from tokens import IndiceLinhas, Token
+from slr import EPSILON, Grammar, ParserSLR, SLRAnalyzer, TabelasLR, impressao_digital
+from parser import (Parser, ParserIncremental, ErroSintatico, ErroSemantico, Binario, Nome, Literal,
+                    Programa, Personagem, Declaracao, ComandoLeitura, ComandoAtribuicao, ComandoEscrita,
+                    ExpressaoSimples, Termo, Fator, Elemento, compactar_ast, expandir_ast, compactar_expressao, expandir_expressao)
 
 def testar_parser():
     # Código de exemplo em PiLang
@@ -122,7 +137,814 @@ def testar_parser_com_erros():
     else:
         print("\nFalha na análise sintática!")
 
+def _estrutura(no):
+    """Converte um nó da AST em tuplas aninhadas, para comparação"""
+    if isinstance(no, (list, tuple)):
+        return tuple(_estrutura(item) for item in no)
+    if hasattr(no, '__dict__'):
+        return (type(no).__name__,) + tuple(
+            (nome, _estrutura(valor)) for nome, valor in sorted(vars(no).items()))
+    if getattr(no, '__slots__', None):
+        return (type(no).__name__,) + tuple(
+            (nome, _estrutura(getattr(no, nome))) for nome in sorted(no.__slots__))
+    return no
+
+def _exemplos_validos():
+    for arquivo in sorted(glob.glob("exemplos/*.dramatica")):
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            codigo = f.read()
+        tokens, erros = Lexer(codigo).tokenizar()
+        if erros:
+            continue
+        try:
+            Parser(tokens).parse()
+        except Exception:
+            continue
+        yield codigo
+
+def testar_parser_com_fluxo_de_tokens():
+    """O Parser consome tokens de Lexer.iter_tokens e gera a mesma AST"""
+    for codigo in _exemplos_validos():
+        tokens, _ = Lexer(codigo).tokenizar()
+        esperado = Parser(tokens).parse()
+
+        erros = []
+        fluxo = Lexer.iter_tokens(io.StringIO(codigo), erros, tamanho_bloco=16)
+        assert _estrutura(Parser(fluxo).parse()) == _estrutura(esperado)
+        assert erros == []
+
+def testar_parser_com_token_buffer():
+    """O Parser aceita um TokenBuffer no lugar da lista de tokens"""
+    for codigo in _exemplos_validos():
+        tokens, _ = Lexer(codigo).tokenizar()
+        buffer, _ = LexerRegex(codigo).tokenizar_buffer()
+        assert _estrutura(Parser(buffer).parse()) == _estrutura(Parser(tokens).parse())
+
+def testar_parser_com_fluxo_reporta_posicao():
+    """Erros sintáticos em fluxo trazem a mesma linha/coluna da lista de tokens"""
+    codigo = "CENA A:\n  PERSONAGEM A:\n  A DIZ 1\nFIM_CENA"
+    try:
+        Parser(Lexer.iter_tokens(codigo)).parse()
+        assert False, "esperado ErroSintatico"
+    except ErroSintatico as e:
+        assert (e.linha, e.coluna) == (4, 1)
+
+def testar_erro_localizado_sob_demanda():
+    """Erros guardam a posição na fonte; linha/coluna são calculadas ao serem lidas"""
+    codigo = "CENA A:\n  PERSONAGEM A:\n  LEIA x;\nFIM_CENA"
+    tokens, _ = Lexer(codigo).tokenizar()
+    try:
+        Parser(tokens).parse()
+        assert False, "esperado ErroSemantico"
+    except ErroSemantico as e:
+        assert e.posicao == codigo.index("x;")
+        assert e._linha is None
+        assert (e.linha, e.coluna) == (3, 8)
+        assert str(e) == "Erro semântico na linha 3, coluna 8: " + e.mensagem
+
+    # Linha e coluna explícitas continuam aceitas
+    assert str(ErroSintatico("falta ';'", 2, 5)) == "Erro sintático na linha 2, coluna 5: falta ';'"
+
+def _analisar_expressao(expressao, metodo):
+    """Resultado de um método de expressão do Parser: AST (como tuplas) ou erro"""
+    tokens, _ = LexerRegex(expressao + " ;").tokenizar()
+    parser = Parser(tokens)
+    try:
+        return _estrutura(getattr(parser, metodo)()), parser.posicao
+    except ErroSintatico as e:
+        return str(e), parser.posicao
+
+def testar_expressao_iterativa_equivale_a_recursiva():
+    """parser_expressao (pilha explícita) gera a mesma AST e os mesmos erros da descida recursiva"""
+    expressoes = [
+        "1", "a + b - c", "a * b / c + d", "2 ^ 3 ^ 2", "a + b * c ^ d - e",
+        "(a + b) * (c - d)", "((1))", "a ^ (b + c) ^ 2 * 3", '"x" + 1.5',
+        "a +", "(a + b", "a + * b", "()", "a b", ") a", "((a) + (b * (c ^ d)))",
+    ]
+    for expressao in expressoes:
+        assert (_analisar_expressao(expressao, "parser_expressao") ==
+                _analisar_expressao(expressao, "parser_expressao_simples")), expressao
+
+def testar_expressao_profundamente_aninhada():
+    """Parênteses aninhados muito além do limite de recursão são analisados e validados"""
+    profundidade = 10000
+    codigo = ("CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n    FIM_MEMORIA\n"
+              "  x = " + "(" * profundidade + "x + 1" + ")" * profundidade + ";\nFIM_CENA")
+    tokens, _ = LexerRegex(codigo).tokenizar()
+    expressao = Parser(tokens).parse().comandos[0].expressao
+    niveis = 0
+    while expressao.termos[0][1].fatores[0][1].elementos[0][1].tipo == "EXPRESSAO":
+        expressao = expressao.termos[0][1].fatores[0][1].elementos[0][1].valor
+        niveis += 1
+    assert niveis == profundidade
+
+    # A validação percorre a árvore sem recursão
+    tokens, _ = LexerRegex(codigo.replace("x + 1", "y + 1")).tokenizar()
+    try:
+        Parser(tokens).parse()
+        assert False, "esperado ErroSemantico"
+    except ErroSemantico as e:
+        assert "'y'" in e.mensagem
+
+def testar_ast_compacta():
+    """A AST compacta segue a precedência/associatividade da tradicional e os adaptadores convertem entre as duas"""
+    tokens, _ = LexerRegex("a - b - c * d ^ e ^ (f + 1) ;").tokenizar()
+    no = Parser(tokens, ast_compacta=True).parser_expressao()
+    esperado = Binario('-', Binario('-', Nome('a', 0), Nome('b', 4)),
+                       Binario('*', Nome('c', 8), Binario('^', Nome('d', 12), Binario(
+                           '^', Nome('e', 16), Binario('+', Nome('f', 21), Literal(1, 'NUM_INTEIRO', 25))))))
+    assert _estrutura(no) == _estrutura(esperado)
+    tokens, _ = LexerRegex("a - b - c * d ^ e ^ (f + 1) ;").tokenizar()
+    tradicional = Parser(tokens).parser_expressao()
+    assert _estrutura(compactar_expressao(tradicional)) == _estrutura(no)
+    assert _estrutura(compactar_expressao(expandir_expressao(no))) == _estrutura(no)
+
+    for codigo in _exemplos_validos():
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        programa = Parser(tokens).parse()
+        compacto = Parser(tokens, ast_compacta=True).parse()
+        assert _estrutura(compactar_ast(programa)) == _estrutura(compacto)
+        assert _estrutura(compactar_ast(expandir_ast(compacto))) == _estrutura(compacto)
+
+def testar_interpretador_com_ast_compacta():
+    """Interpretador e validação semântica funcionam direto sobre a AST compacta"""
+    interpretador = InterpretadorPiLang()
+    interpretador.variaveis.update({'x': 3, 'nome': 'Ana'})
+    for expressao in ["2 ^ 3 ^ 2", "10 - 4 - 3", "x * (x + 1) / 2", '"Oi " + nome + x', "1 / (x - 3)", "nome - 1"]:
+        resultados = []
+        for compacta in (False, True):
+            tokens, _ = LexerRegex(expressao + ";").tokenizar()
+            try:
+                resultados.append(interpretador.avaliar_expressao(
+                    Parser(tokens, ast_compacta=compacta).parser_expressao()))
+            except Exception as e:
+                resultados.append(str(e))
+        assert resultados[0] == resultados[1], expressao
+
+    codigo = "CENA A:\n  PERSONAGEM A:\n  MEMORIA:\n    x: INT;\n  FIM_MEMORIA\n  x = x + (1 * y);\nFIM_CENA"
+    tokens, _ = LexerRegex(codigo).tokenizar()
+    try:
+        Parser(tokens, ast_compacta=True).parse()
+        assert False, "esperado ErroSemantico"
+    except ErroSemantico as e:
+        assert e.posicao == codigo.index("y)")
+
+def testar_validacao_durante_a_analise():
+    """parse() verifica as declarações sem percorrer a AST de novo; erros sintáticos têm prioridade"""
+    codigo = "CENA A:\n  PERSONAGEM A:\n  MEMORIA:\n    x: INT;\n  FIM_MEMORIA\n  x = y + 1;\n  LEIA z;\nFIM_CENA"
+    tokens, _ = LexerRegex(codigo).tokenizar()
+    parser = Parser(tokens)
+    parser.validar_semantica = None  # Não deve ser chamado por parse()
+    try:
+        parser.parse()
+        assert False, "esperado ErroSemantico"
+    except ErroSemantico as e:
+        assert e.posicao == codigo.index("y +")
+        assert e.mensagem == "Variável 'y' não foi declarada antes do uso na expressão"
+
+    tokens, _ = LexerRegex(codigo.replace("LEIA z;", "LEIA z")).tokenizar()
+    try:
+        Parser(tokens).parse()
+        assert False, "esperado ErroSintatico"
+    except ErroSintatico as e:
+        assert e.mensagem == "Esperado ';' após comando LEIA"
+
+    # O validador independente continua disponível para ASTs montadas de outra forma
+    tokens, _ = LexerRegex(codigo.replace("y", "x").replace("z", "x")).tokenizar()
+    parser = Parser(tokens)
+    programa = parser.parse()
+    programa.comandos[1].variavel = "w"
+    try:
+        parser.validar_semantica(programa)
+        assert False, "esperado ErroSemantico"
+    except ErroSemantico as e:
+        assert "'w'" in e.mensagem
+
+def testar_recuperacao_de_erros():
+    """No modo de recuperação o parser reporta todos os erros e devolve uma AST parcial"""
+    codigo = ("CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n      y INT;\n      z: FLOAT;\n"
+              "    FIM_MEMORIA\n  LEIA x;\n  B DIZ x;\n  x = (x + 1;\n  A DIZ z + q;\n  x = 2;\nFIM_CENA")
+    tokens, _ = LexerRegex(codigo).tokenizar()
+    parser = Parser(tokens, recuperar_erros=True)
+    programa = parser.parse()
+    assert [(type(e).__name__, e.linha, e.coluna) for e in parser.erros] == [
+        ("ErroSintatico", 5, 9), ("ErroSemantico", 9, 3), ("ErroSintatico", 10, 13), ("ErroSemantico", 11, 13)]
+    assert [d.nome for d in programa.personagem.declaracoes] == ["x", "z"]
+    assert len(programa.comandos) == 3  # LEIA x, A DIZ z + q e x = 2
+
+    # O erro principal é o mesmo que parse() lança sem recuperação
+    try:
+        Parser(tokens).parse()
+        assert False, "esperado ErroSintatico"
+    except ErroSintatico as e:
+        assert (e.mensagem, e.posicao) == (parser.erro_principal.mensagem, parser.erro_principal.posicao)
+
+    # Sem erros, a AST é a mesma da análise normal
+    for codigo in _exemplos_validos():
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        parser = Parser(tokens, recuperar_erros=True)
+        assert _estrutura(parser.parse()) == _estrutura(Parser(tokens).parse())
+        assert parser.erros == [] and parser.erro_principal is None
+
+def testar_parser_incremental():
+    """Após cada edição, ParserIncremental dá o mesmo resultado que a análise completa
+    e reaproveita os comandos não atingidos"""
+    codigo = ("CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n      y: FLOAT;\n    FIM_MEMORIA\n"
+              + "  LEIA x;\n  y = (x + 1) * 2;\n  A DIZ y;\n" * 20 + "FIM_CENA\n")
+    incremental = ParserIncremental(codigo)
+    antes = incremental.parse().comandos
+    posicao = codigo.index("2;", len(codigo) // 2)
+    incremental.editar(posicao, 1, "3")
+    depois = incremental.parse().comandos
+    assert incremental.comandos_reanalisados == 1
+    assert sum(a is not b for a, b in zip(antes, depois)) == 1
+    assert depois[0] is antes[0] and depois[-1] is antes[-1]
+
+    # Remover a declaração de y só verifica de novo os comandos que usam y
+    incremental.editar(codigo.index("      y: FLOAT;"), len("      y: FLOAT;\n"), "")
+    erro = incremental.erro
+    assert isinstance(erro, ErroSemantico) and (erro.linha, erro.coluna) == (7, 3)
+    assert erro.mensagem == "Variável 'y' não foi declarada antes do uso na atribuição"
+
+    gerador = random.Random(14)
+    pedacos = ["x", "y", " ", "\n", ";", "=", "(", ")", "+", "1", "LEIA ", "A DIZ ", "FIM_CENA", "MEMORIA", "\""]
+    for codigo in list(_exemplos_validos())[:4]:
+        for compacta in (False, True):
+            incremental = ParserIncremental(codigo, ast_compacta=compacta)
+            for _ in range(60):
+                posicao = gerador.randint(0, len(codigo))
+                removidos = min(gerador.choice((0, 0, 1, 3)), len(codigo) - posicao)
+                inseridos = "".join(gerador.choice(pedacos) for _ in range(gerador.randint(0, 2)))
+                codigo = codigo[:posicao] + inseridos + codigo[posicao + removidos:]
+                incremental.editar(posicao, removidos, inseridos)
+                try:
+                    esperado = _estrutura(Parser(LexerRegex(codigo).tokenizar()[0], compacta).parse())
+                except (ErroSintatico, ErroSemantico) as e:
+                    esperado = str(e)
+                try:
+                    obtido = _estrutura(incremental.parse())
+                except (ErroSintatico, ErroSemantico) as e:
+                    obtido = str(e)
+                assert obtido == esperado, (codigo, obtido, esperado)
+
+def testar_cache_de_analise():
+    """O cache devolve os mesmos objetos para a mesma fonte e respeita os limites"""
+    cache = CacheAnalise(max_entradas=2)
+    codigo = next(_exemplos_validos())
+    programa, erro = cache.sintatico(codigo)
+    assert erro is None
+    assert cache.sintatico(codigo)[0] is programa
+    assert cache.lexico(codigo)[0] is cache.lexico(codigo)[0]
+    assert (cache.acertos, cache.falhas) == (3, 1)  # os tokens vieram com a AST
+
+    com_erro = codigo.replace("FIM_CENA", "")
+    programa_com_erro, erro = cache.sintatico(com_erro)
+    assert programa_com_erro is None and isinstance(erro, ErroSintatico)
+    assert erro.__traceback__ is None
+    erros, principal = cache.recuperado(com_erro)
+    assert principal.mensagem == erro.mensagem and len(erros) == 1
+
+    # Terceira fonte: a menos usada recentemente (a primeira) é descartada
+    cache.lexico(codigo + " ")
+    assert cache.estatisticas()['entradas'] == 2 and cache.descartes == 1
+    falhas = cache.falhas
+    assert cache.sintatico(codigo)[0] is not programa
+    assert cache.falhas == falhas + 1
+
+    # Limite em bytes: uma fonte grande demais fica sozinha no cache
+    cache = CacheAnalise(max_bytes=len(codigo) * 20)
+    cache.lexico(codigo)
+    cache.lexico(codigo * 30)
+    assert cache.estatisticas()['entradas'] == 1
+
+def testar_cache_em_disco():
+    """carregar_programa grava a AST validada e a reaproveita enquanto a fonte não mudar"""
+    codigo = next(_exemplos_validos())
+    esperado = _estrutura(Parser(LexerRegex(codigo).tokenizar()[0]).parse())
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "cena.dramatica")
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(codigo)
+        programa, erros = carregar_programa(caminho)
+        arquivo_cache = caminho_do_cache(caminho)
+        assert os.path.exists(arquivo_cache) and erros == []
+        assert _estrutura(programa) == esperado
+        assert _estrutura(carregar_programa(caminho)[0]) == esperado
+
+        # Só o mtime mudou: o hash confirma o cache, que passa a ter o novo mtime
+        gravado = os.stat(arquivo_cache).st_mtime_ns
+        os.utime(caminho, ns=(0, 10 ** 9))
+        assert _estrutura(carregar_programa(caminho)[0]) == esperado
+        assert os.stat(arquivo_cache).st_mtime_ns != gravado
+
+        # Conteúdo novo é analisado de novo; um erro é lançado e não vai para o cache
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(codigo.replace("FIM_CENA", ""))
+        try:
+            carregar_programa(caminho)
+            assert False, "esperado ErroSintatico"
+        except ErroSintatico:
+            pass
+        with tempfile.TemporaryDirectory() as outro:
+            try:
+                carregar_programa(caminho, outro)
+                assert False, "esperado ErroSintatico"
+            except ErroSintatico:
+                pass
+            assert os.listdir(outro) == []
+
+        # Cache danificado é ignorado
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(codigo)
+        carregar_programa(caminho)
+        with open(arquivo_cache, "r+b") as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"\xff\xff\xff")
+        assert _estrutura(carregar_programa(caminho)[0]) == esperado
+
+def testar_ast_em_arena():
+    """ParserArena gera a mesma AST (vista pelas NoArena/ComandoArena), os mesmos erros,
+    e o interpretador executa a arena com a mesma saída"""
+    tokens, _ = LexerRegex("a - b - c * d ^ e ^ (f + 1) ;").tokenizar()
+    arena = ParserArena(tokens)
+    raiz = arena.arena.no(arena.parser_expressao())
+    assert (raiz.tipo, raiz.operador, raiz.valor) == ('BINARIO', '-', None)
+    assert (raiz.direita.tipo, raiz.direita.operador, raiz.direita.esquerda.valor) == ('BINARIO', '*', 'c')
+    assert (raiz.esquerda.esquerda.tipo, raiz.esquerda.esquerda.posicao) == ('IDENTIFICADOR', 0)
+    assert raiz.esquerda.esquerda.esquerda is None
+    tokens, _ = LexerRegex("a - b - c * d ^ e ^ (f + 1) ;").tokenizar()
+    assert _estrutura(raiz.para_compacta()) == _estrutura(Parser(tokens, ast_compacta=True).parser_expressao())
+
+    tipos = {'ComandoLeitura': 'LEIA', 'ComandoEscrita': 'DIZ', 'ComandoAtribuicao': 'ATRIBUICAO'}
+    for codigo in _exemplos_validos():
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        compacto = Parser(tokens, ast_compacta=True).parse()
+        programa = ParserArena(tokens).parse()
+        assert _estrutura(programa.para_programa()) == _estrutura(compacto)
+        assert _estrutura(ProgramaArena.de_programa(Parser(tokens).parse()).para_programa()) == _estrutura(compacto)
+        assert [(c.tipo, c.nome, c.posicao) for c in programa.comandos()] == [
+            (tipos[type(c).__name__], getattr(c, 'variavel', getattr(c, 'personagem', None)), getattr(c, 'posicao', None))
+            for c in compacto.comandos]
+        saidas = []
+        for ast in (compacto, programa):
+            interpretador = InterpretadorPiLang()
+            interpretador.definir_entrada(["7", "3"])
+            with contextlib.redirect_stdout(io.StringIO()) as saida:
+                interpretador.executar_programa(ast)
+            saidas.append(saida.getvalue())
+        assert saidas[0] == saidas[1]
+
+    # Constantes e nomes repetidos ficam uma vez nas tabelas
+    codigo = "CENA A:\n  PERSONAGEM A:\n  MEMORIA:\n    x: INT;\n  FIM_MEMORIA\n  x = 1 + 1.0 + x;\n  x = 1 / x;\nFIM_CENA"
+    tokens, _ = LexerRegex(codigo).tokenizar()
+    programa = ParserArena(tokens).parse()
+    assert (programa.constantes, programa.nomes, programa.total_comandos) == ([1, 1.0], ['x'], 2)
+
+    # Erros: os mesmos de Parser; na recuperação os nós do comando com erro são descartados
+    codigo = ("CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n    FIM_MEMORIA\n"
+              "  x = (x + 1;\n  A DIZ x * (2 + q);\n  B DIZ 1;\n  x = 2;\nFIM_CENA")
+    tokens, _ = LexerRegex(codigo).tokenizar()
+    for recuperar in (False, True):
+        esperado, obtido = Parser(tokens, recuperar_erros=recuperar), ParserArena(tokens, recuperar_erros=recuperar)
+        resultados = []
+        for parser in (esperado, obtido):
+            try:
+                resultados.append(parser.parse())
+            except (ErroSintatico, ErroSemantico) as e:
+                resultados.append(str(e))
+        if recuperar:
+            assert [str(e) for e in obtido.erros] == [str(e) for e in esperado.erros]
+            assert _estrutura(resultados[1].para_programa()) == _estrutura(compactar_ast(resultados[0]))
+            assert len(resultados[1]) == 6  # x * (2 + q) e 2; os nós de (x + 1 foram descartados
+        else:
+            assert resultados[0] == resultados[1]
+
+def testar_parser_slr():
+    """ParserSLR monta a mesma AST e lança os mesmos erros que o Parser recursivo"""
+    for codigo in _exemplos_validos():
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        assert _estrutura(ParserSLR(tokens).parse()) == _estrutura(Parser(tokens).parse())
+        buffer, _ = LexerRegex(codigo).tokenizar_buffer()
+        assert _estrutura(ParserSLR(buffer).parse()) == _estrutura(Parser(tokens).parse())
+        assert SLRAnalyzer().analisar(tokens)["sucesso"]
+
+    cabecalho = "CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n    FIM_MEMORIA\n"
+    casos = [
+        "A: PERSONAGEM A: FIM_CENA",
+        cabecalho + "  LEIA x\nFIM_CENA",
+        cabecalho + "  x = (x + 1;\nFIM_CENA",
+        cabecalho + "  x = 1 2;\nFIM_CENA",
+        cabecalho + "  x 1;\nFIM_CENA",
+        cabecalho + "  B DIZ );\nFIM_CENA",
+        cabecalho + "  DIZ x;\nFIM_CENA",
+        cabecalho + "  MEMORIA:\nFIM_CENA",
+        cabecalho + "  x = y + z;\n  LEIA w;\nFIM_CENA",
+        cabecalho + "  w = x + y;\nFIM_CENA",
+        "CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n      x: ;\n    FIM_MEMORIA\nFIM_CENA",
+        cabecalho + "  x = 2;\n",
+        cabecalho + "  x = 2;\nFIM_CENA x = ;",  # O que vem depois de FIM_CENA é ignorado
+    ]
+    for codigo in casos:
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        resultados = []
+        for classe in (Parser, ParserSLR):
+            try:
+                resultados.append(_estrutura(classe(tokens).parse()))
+            except (ErroSintatico, ErroSemantico) as e:
+                resultados.append((type(e).__name__, e.mensagem, e.posicao))
+        assert resultados[0] == resultados[1], codigo
+
+def testar_automato_lr0():
+    """O autômato LR(0) tem estados distintos e as mesmas transições do goto ingênuo
+    (fecho e goto recalculados varrendo todas as produções e todos os símbolos)"""
+    analisador = SLRAnalyzer()
+    producoes = analisador.grammar.productions
+
+    def fecho(itens):
+        itens = set(itens)
+        while True:
+            novos = {(idx, 0) for p, ponto in itens if ponto < len(producoes[p][1])
+                     for idx, (cabeca, _) in enumerate(producoes) if cabeca == producoes[p][1][ponto]}
+            if novos <= itens:
+                return frozenset(itens)
+            itens |= novos
+
+    assert len(set(analisador.states)) == len(analisador.states)
+    assert analisador.states[0] == fecho({(0, 0)})
+    simbolos = analisador.grammar.terminals + analisador.grammar.nonterminals
+    for indice, estado in enumerate(analisador.states):
+        assert fecho(estado) == estado
+        for simbolo in simbolos:
+            kernel = {(p, ponto + 1) for p, ponto in estado
+                      if ponto < len(producoes[p][1]) and producoes[p][1][ponto] == simbolo}
+            destino = analisador.transitions.get((indice, simbolo))
+            if kernel:
+                assert analisador.states[destino] == fecho(kernel)
+            else:
+                assert destino is None
+
+def testar_first_follow():
+    """FIRST/FOLLOW por bitsets e lista de trabalho, com anuláveis encadeados"""
+    class Gramatica(Grammar):
+        def __init__(self):
+            self.start_symbol = "S"
+            self.nonterminals = ["S'", "S", "A", "B", "C"]
+            self.terminals = ["a", "b", "c", "EOF"]
+            self.productions = [("S'", ["S"]), ("S", ["A", "C", "a"]), ("S", ["S", "B"]), ("A", []),
+                                ("A", ["B", "C"]), ("B", ["b"]), ("B", []), ("C", ["B", "B"]), ("C", ["c", "S"])]
+
+    analisador = SLRAnalyzer.__new__(SLRAnalyzer)
+    analisador.grammar = Gramatica()
+    first, follow = analisador._compute_first(), analisador._compute_follow()
+    assert first == {"S'": set(), "S": {"a", "b", "c"}, "A": {"b", "c", EPSILON},
+                     "B": {"b", EPSILON}, "C": {"b", "c", EPSILON}}
+    assert follow == {"S'": set(), "S": {"a", "b", "c", "EOF"}, "A": {"a", "b", "c"},
+                      "B": {"a", "b", "c", "EOF"}, "C": {"a", "b", "c"}}
+    assert analisador.nullable == {"A", "B", "C"}
+
+    # Gramática DRAMATICA: só MEMORIA, as listas e Comandos são anuláveis
+    analisador = SLRAnalyzer()
+    assert analisador.nullable == {"Memoria", "Declaracoes", "Comandos"}
+    assert analisador.follow["Comandos"] == {"FIM_CENA", "LEIA", "IDENTIFICADOR"}
+    assert analisador.follow["Elemento"] == {"OP_POTENCIACAO", "OP_MULTIPLICACAO", "OP_DIVISAO", "OP_ADICAO",
+                                             "OP_SUBTRACAO", "PONTO_VIRGULA", "PARENTESE_DIR"}
+
+def testar_tabelas_compiladas():
+    """ACTION/GOTO em inteiros (densa e comprimida) equivalem às tabelas em dicionários"""
+    densa, comprimida = SLRAnalyzer(forma="densa"), SLRAnalyzer(forma="comprimida")
+    assert comprimida.tabelas.tamanho < densa.tabelas.tamanho
+    outro = len(densa.grammar.terminals)
+    for analisador in (densa, comprimida):
+        tabelas = analisador.tabelas
+        for estado in range(len(analisador.states)):
+            reducao = analisador.default_reductions.get(estado)
+            padrao = 0 if reducao is None else ~reducao
+            for terminal, coluna in analisador.terminal_index.items():
+                acao = analisador.action_table[estado].get(terminal)
+                if acao is None:
+                    esperado = padrao
+                elif acao[0] == "shift":
+                    esperado = acao[1] + 1
+                else:
+                    esperado = ~acao[1] if acao[0] == "reduce" else ~0
+                assert tabelas.acao(estado, coluna) == esperado
+            assert tabelas.acao(estado, outro) == padrao
+            for nao_terminal, destino in analisador.goto_table[estado].items():
+                assert tabelas.desvio(estado, analisador.nonterminal_index[nao_terminal]) == destino
+
+    # contar_passos chega ao mesmo veredito, no mesmo número de passos, que analisar
+    cabecalho = "CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n    FIM_MEMORIA\n"
+    codigos = list(_exemplos_validos()) + [cabecalho + "  x = (x + 1;\nFIM_CENA", cabecalho + "  @ x;\nFIM_CENA"]
+    for codigo in codigos:
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        resultado = densa.analisar(tokens, trace="compact")
+        esperado = (resultado["sucesso"], resultado["passos"])
+        assert comprimida.analisar(tokens)["passos"] == resultado["passos"]
+        assert densa.contar_passos(tokens) == esperado
+        assert comprimida.contar_passos([token.tipo for token in tokens]) == esperado
+        if resultado["sucesso"]:
+            assert _estrutura(ParserSLR(tokens, comprimida).parse()) == _estrutura(Parser(tokens).parse())
+
+def testar_tabelas_persistidas():
+    """SLRAnalyzer.carregar e do_modulo refazem o analisador a partir das tabelas
+    guardadas, chaveadas pela impressão digital da gramática"""
+    construido = SLRAnalyzer()
+    with tempfile.TemporaryDirectory() as diretorio:
+        primeiro = SLRAnalyzer.carregar(diretorio=diretorio)
+        assert "carga" not in primeiro.build_times and len(os.listdir(diretorio)) == 1
+        carregado = SLRAnalyzer.carregar(diretorio=diretorio)
+        assert "carga" in carregado.build_times and "lr0" not in carregado.build_times
+
+        caminho = os.path.join(diretorio, "tabelas_geradas.py")
+        construido.gerar_modulo(caminho)
+        especificacao = importlib.util.spec_from_file_location("tabelas_geradas", caminho)
+        modulo = importlib.util.module_from_spec(especificacao)
+        especificacao.loader.exec_module(modulo)
+        do_modulo = SLRAnalyzer.do_modulo(modulo)
+
+        for analisador in (carregado, do_modulo):
+            for campo in TabelasLR.__slots__:
+                assert getattr(analisador.tabelas, campo) == getattr(construido.tabelas, campo)
+            assert analisador.state_error_messages == construido.state_error_messages
+            for codigo in _exemplos_validos():
+                tokens, _ = LexerRegex(codigo).tokenizar()
+                assert _estrutura(ParserSLR(tokens, analisador).parse()) == _estrutura(Parser(tokens).parse())
+            try:
+                ParserSLR(LexerRegex("CENA A: FIM_CENA").tokenizar()[0], analisador).parse()
+                assert False, "esperado ErroSintatico"
+            except ErroSintatico as e:
+                assert e.mensagem == "Esperado 'PERSONAGEM'"
+        # O que só a construção calcula é refeito quando pedido
+        assert carregado.action_table == construido.action_table
+
+        # Outra gramática tem outra impressão digital: não usa as tabelas guardadas
+        class Gramatica(Grammar):
+            def _build_productions(self):
+                super()._build_productions()
+                self._add("Elemento", ["OP_SUBTRACAO", "Elemento"])
+
+        assert impressao_digital(Gramatica()) != impressao_digital(Grammar())
+        try:
+            SLRAnalyzer.do_modulo(modulo, Gramatica())
+            assert False, "esperado ValueError"
+        except ValueError:
+            pass
+        assert "carga" not in SLRAnalyzer.carregar(Gramatica(), diretorio=diretorio).build_times
+
+        # Cache danificado é ignorado e regravado
+        arquivo, = glob.glob(os.path.join(diretorio, f"slr-*-{impressao_digital(Grammar()).hex()}-slr-auto.dmt"))
+        with open(arquivo, "r+b") as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"\xff\xff\xff")
+        assert "carga" not in SLRAnalyzer.carregar(diretorio=diretorio).build_times
+        assert "carga" in SLRAnalyzer.carregar(diretorio=diretorio).build_times
+
+        # Arquivos de outra versão de slr.py são apagados quando um novo é gravado
+        antigo = os.path.join(diretorio, "slr-0000000000000000-" + "0" * 32 + "-slr-auto.dmt")
+        with open(antigo, "wb") as f:
+            f.write(b"DRMT")
+        SLRAnalyzer.carregar(diretorio=diretorio, forma="densa")
+        assert not os.path.exists(antigo) and os.path.exists(arquivo)
+
+def testar_tabelas_lalr():
+    """LALR(1) sobre o autômato LR(0): resolve o conflito SLR clássico e, na DRAMATICA,
+    gera as mesmas tabelas que o SLR"""
+    class Gramatica(Grammar):
+        # S -> L = R | R; L -> * R | id; R -> L: LALR(1), mas não SLR
+        def __init__(self):
+            self.start_symbol = "S"
+            self.nonterminals = ["S'", "S", "L", "R"]
+            self.terminals = ["=", "*", "id", "EOF"]
+            self.productions, self.actions, self.error_messages = [], [], {}
+            for cabeca, corpo in [("S'", ["S"]), ("S", ["L", "=", "R"]), ("S", ["R"]),
+                                  ("L", ["*", "R"]), ("L", ["id"]), ("R", ["L"])]:
+                self._add(cabeca, corpo)
+
+    try:
+        SLRAnalyzer(Gramatica())
+        assert False, "esperado ValueError"
+    except ValueError as e:
+        assert "Conflito na tabela SLR para símbolo '='" in str(e)
+    slr = SLRAnalyzer(Gramatica(), tolerar_conflitos=True)
+    assert [(simbolo, mantida[0], descartada[0]) for _, simbolo, mantida, descartada in slr.conflicts] == [
+        ("=", "shift", "reduce")]
+    lalr = SLRAnalyzer(Gramatica(), algoritmo="lalr")
+    assert lalr.conflicts == [] and len(lalr.states) == len(slr.states)
+    # R -> L . ao lado de S -> L . = R só é reduzido no fim; no estado de * R e = R, também antes de '='
+    lookaheads = [lalr._decode_bits(bits) for (_, producao), bits in lalr.lookaheads.items() if producao == 5]
+    assert sorted(map(sorted, lookaheads)) == [["=", "EOF"], ["EOF"]]
+    for entrada, aceita in [("id = * id", True), ("* * id", True), ("id = id = id", False), ("= id", False)]:
+        assert lalr.contar_passos(entrada.split())[0] == aceita
+
+    dramatica = SLRAnalyzer(algoritmo="lalr")
+    assert dramatica.conflicts == [] and dramatica.action_table == SLRAnalyzer().action_table
+    for codigo in _exemplos_validos():
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        assert _estrutura(ParserSLR(tokens, dramatica).parse()) == _estrutura(Parser(tokens).parse())
+
+def testar_cadeias_unitarias():
+    """Os atalhos das reduções unitárias aceitam a mesma linguagem com menos passos,
+    e o traço expandido reproduz o do analisador sem atalhos"""
+    cena = "CENA A:\n PERSONAGEM B:\n MEMORIA:\n x: INT;\n FIM_MEMORIA\n x = {};\nFIM_CENA"
+    sem_cadeias = SLRAnalyzer(eliminar_cadeias=False)
+    assert not any(sem_cadeias.tabelas.cadeia_estados)
+    for forma in ("densa", "comprimida"):
+        com_cadeias = SLRAnalyzer(forma=forma)
+        assert com_cadeias.action_table == sem_cadeias.action_table
+        for codigo in [*_exemplos_validos(), cena.format("(y + 1"), cena.format("y z"), cena.format("")]:
+            tokens, _ = LexerRegex(codigo).tokenizar()
+            tipos = [token.tipo for token in tokens]
+            sucesso, passos = com_cadeias.contar_passos(tipos)
+            assert sucesso == sem_cadeias.contar_passos(tipos)[0]
+            if sucesso:
+                assert passos < sem_cadeias.contar_passos(tipos)[1]
+            resumo = com_cadeias.analisar(tokens, trace="compact")
+            expandido = com_cadeias.analisar(tokens, trace="compact", expandir_cadeias=True)
+            original = sem_cadeias.analisar(tokens, trace="compact")
+            assert (resumo["sucesso"], resumo["passos"]) == (sucesso, passos)
+            assert [(p["pilha"], p["acao"]) for p in expandido["passos_realizados"]] == \
+                [(p["pilha"], p["acao"]) for p in original["passos_realizados"]]
+            assert expandido["passos"] - resumo["passos"] == \
+                sum(1 for p in expandido["passos_realizados"] if p.get("colapsado"))
+            if sucesso:
+                assert _estrutura(ParserSLR(tokens, com_cadeias).parse()) == _estrutura(Parser(tokens).parse())
+
+    # Elemento -> Fator -> Termo -> ExpressaoSimples -> Expressao vira um só passo
+    tokens, _ = LexerRegex(cena.format("y")).tokenizar()
+    reducoes = [p for p in SLRAnalyzer().analisar(tokens, trace="compact")["passos_realizados"] if "cadeia" in p]
+    assert any(len(p["cadeia"]) >= 3 for p in reducoes)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        SLRAnalyzer.carregar(diretorio=diretorio)
+        carregado = SLRAnalyzer.carregar(diretorio=diretorio)
+        assert carregado.tabelas.cadeia_estados == SLRAnalyzer().tabelas.cadeia_estados
+        assert carregado.tabelas.atalho_valores == SLRAnalyzer().tabelas.atalho_valores
+        sem = SLRAnalyzer.carregar(diretorio=diretorio, eliminar_cadeias=False)
+        assert not any(sem.tabelas.cadeia_estados)
+
+def testar_modos_de_rastro():
+    """analisar com trace "off", "compact" e "stream": mesmo veredito, e os passos
+    do rastro compacto, percorrido ou consultado fora de ordem, iguais aos do gerador"""
+    analisador = SLRAnalyzer()
+    cabecalho = "CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n    FIM_MEMORIA\n"
+    codigos = [*_exemplos_validos(), cabecalho + "  x = (x + 1;\nFIM_CENA", cabecalho + "  @ x;\nFIM_CENA"]
+    for codigo in codigos:
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        for expandir in (False, True):
+            off = analisador.analisar(tokens, expandir_cadeias=expandir)
+            compacto = analisador.analisar(tokens, trace="compact", expandir_cadeias=expandir)
+            fluxo = analisador.analisar(tokens, trace="stream", expandir_cadeias=expandir)
+            passos = []
+            try:
+                while True:
+                    passos.append(next(fluxo))
+            except StopIteration as fim:
+                veredito = fim.value
+            rastro = compacto.pop("passos_realizados")
+            assert "passos_realizados" not in off and veredito == compacto
+            assert off["sucesso"] == veredito["sucesso"] and off["mensagem"] == veredito["mensagem"]
+            assert len(rastro) == len(passos) == veredito["passos"]
+            assert list(rastro) == passos
+            ordem = list(range(len(passos)))
+            random.Random(len(passos)).shuffle(ordem)
+            for indice in ordem:
+                assert rastro[indice] == passos[indice]
+                assert rastro.pilha(indice) == passos[indice]["pilha"]
+            assert rastro[-1] == passos[-1] and rastro[1:4] == passos[1:4]
+            if veredito["sucesso"]:
+                assert passos[-1]["acao"] == "accept" and passos[-1]["lookahead"] == "EOF"
+            # Cada passo parte da pilha deixada pelo anterior
+            for anterior, passo, saidas, empilhado in zip(passos, passos[1:], rastro.desempilhados,
+                                                          rastro.empilhados):
+                assert passo["pilha"] == anterior["pilha"][:len(anterior["pilha"]) - saidas] + [empilhado]
+
+    try:
+        analisador.analisar([], trace="completo")
+        assert False, "esperado ValueError"
+    except ValueError as e:
+        assert "Modo de rastro desconhecido" in str(e)
+
+def testar_parser_incremental_preserva_programas_anteriores():
+    """Um Programa devolvido por parse() não muda com as edições seguintes: os
+    comandos deslocados por uma edição são cópias, e os anteriores mantêm as
+    posições da fonte antiga"""
+    codigo = ("CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n    FIM_MEMORIA\n"
+              + "  LEIA x;\n  x = (x + 1) * 2;\n  A DIZ x;\n" * 5 + "FIM_CENA\n")
+    for compacta in (False, True):
+        incremental = ParserIncremental(codigo, compacta)
+        primeiro = incremental.parse()
+        estrutura = _estrutura(primeiro)
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        assert estrutura == _estrutura(Parser(tokens, compacta).parse())
+
+        # Uma linha nova no meio desloca os comandos seguintes
+        posicao = codigo.index("  A DIZ x;", len(codigo) // 2)
+        editado = codigo[:posicao] + "  LEIA x;\n" + codigo[posicao:]
+        incremental.editar(posicao, 0, "  LEIA x;\n")
+        segundo = incremental.parse()
+        tokens, _ = LexerRegex(editado).tokenizar()
+        assert _estrutura(segundo) == _estrutura(Parser(tokens, compacta).parse())
+        assert _estrutura(primeiro) == estrutura
+        assert primeiro.comandos[0] is segundo.comandos[0]
+        assert primeiro.comandos[-1] is not segundo.comandos[-1]
+
+        # O segundo Programa também fica como está depois de outra edição
+        estrutura = _estrutura(segundo)
+        incremental.editar(0, 0, "\n")
+        terceiro = incremental.parse()
+        tokens, _ = LexerRegex("\n" + editado).tokenizar()
+        assert _estrutura(terceiro) == _estrutura(Parser(tokens, compacta).parse())
+        assert _estrutura(segundo) == estrutura
+
+def testar_tokens_na_forma_antiga():
+    """Token(tipo, lexema, linha, coluna), sem a fonte, ainda funciona: o Parser
+    dá os mesmos erros, nas mesmas linhas e colunas, que com os tokens do lexer"""
+    token = Token("IDENTIFICADOR", "x", 3, 5)
+    assert (token.linha, token.coluna) == (3, 5)
+    nomeado = Token("IDENTIFICADOR", "x", linha=3, coluna=5)
+    assert (nomeado.linha, nomeado.coluna, nomeado.posicao) == (3, 5, token.posicao)
+    cabecalho = "CENA A:\n  PERSONAGEM A:\n    MEMORIA:\n      x: INT;\n"
+    codigos = [*_exemplos_validos(), cabecalho + "    FIM_MEMORIA\n  x = y + 1;\nFIM_CENA",
+               cabecalho + "    FIM_MEMORIA\n  x = (1 + ;\nFIM_CENA", cabecalho + "      x: INT;\n    FIM_MEMORIA\nFIM_CENA"]
+    for codigo in codigos:
+        tokens, _ = LexerRegex(codigo).tokenizar()
+        antigos = [Token(t.tipo, t.lexema, t.linha, t.coluna) for t in tokens]
+        resultados = []
+        for lista in (tokens, antigos):
+            try:
+                resultados.append(len(Parser(lista).parse().comandos))
+            except (ErroSintatico, ErroSemantico) as e:
+                resultados.append(str(e))
+        assert resultados[0] == resultados[1]
+
+def testar_nos_na_forma_antiga():
+    """Os nós da AST ainda aceitam linha=/coluna= e expõem linha e coluna, e os
+    erros semânticos sobre eles saem na linha e coluna dadas, sem mapa_linhas"""
+    leitura = ComandoLeitura("x", linha=3, coluna=5)
+    atribuicao = ComandoAtribuicao("x", Nome("y"), linha=4, coluna=1)
+    elemento = Elemento("w", "IDENTIFICADOR", linha=7, coluna=13)
+    assert (leitura.linha, leitura.coluna) == (3, 5)
+    assert (atribuicao.linha, atribuicao.coluna) == (4, 1)
+    assert (elemento.linha, elemento.coluna) == (7, 13)
+    # Nós com deslocamento na fonte não têm linha/coluna sem o IndiceLinhas
+    assert (ComandoLeitura("x", 42).linha, ComandoLeitura("x", 42).coluna) == (None, None)
+
+    programa = Programa("A", Personagem("A", [Declaracao("x", "INT")]),
+                        [leitura, ComandoEscrita("A", ExpressaoSimples([("", Termo([("", Fator([("", elemento)]))]))]))])
+    try:
+        Parser([]).validar_semantica(programa)
+        assert False, "esperado ErroSemantico"
+    except ErroSemantico as e:
+        assert (e.linha, e.coluna) == (7, 13)
+        assert str(e).startswith("Erro semântico na linha 7, coluna 13")
+
+def testar_validar_semantica_em_ast_montada():
+    """validar_semantica num Programa montado à mão: com Parser([]) o erro sai sem
+    linha e coluna; com o mapa_linhas da fonte do programa, na posição certa"""
+    fonte = "CENA A:\n  PERSONAGEM A:\n  MEMORIA:\n    x: INT;\n  FIM_MEMORIA\n  LEIA x;\n  A DIZ x + w;\nFIM_CENA"
+    posicao = fonte.index("w;")
+    tradicional = ExpressaoSimples([("", Termo([("", Fator([("", Elemento("x", "IDENTIFICADOR", posicao - 4))]))])),
+                                    ("+", Termo([("", Fator([("", Elemento("w", "IDENTIFICADOR", posicao))]))]))])
+    compacta = Binario("+", Nome("x", posicao - 4), Nome("w", posicao))
+    for expressao in (tradicional, compacta):
+        programa = Programa("A", Personagem("A", [Declaracao("x", "INT")]),
+                            [ComandoLeitura("x", fonte.index("LEIA")), ComandoEscrita("A", expressao)])
+        for mapa_linhas, esperado in ((None, (None, None)), (IndiceLinhas(fonte), (7, 13))):
+            try:
+                Parser([]).validar_semantica(programa, mapa_linhas)
+                assert False, "esperado ErroSemantico"
+            except ErroSemantico as e:
+                assert e.mensagem == "Variável 'w' não foi declarada antes do uso na expressão"
+                assert (e.linha, e.coluna) == esperado
+                assert str(e).startswith("Erro semântico")
+
 if __name__ == "__main__":
     testar_parser()
     testar_parser_com_expressoes_complexas()
     testar_parser_com_erros()
+    testar_parser_com_fluxo_de_tokens()
+    testar_parser_com_token_buffer()
+    testar_parser_com_fluxo_reporta_posicao()
+    testar_erro_localizado_sob_demanda()
+    testar_expressao_iterativa_equivale_a_recursiva()
+    testar_expressao_profundamente_aninhada()
+    testar_ast_compacta()
+    testar_interpretador_com_ast_compacta()
+    testar_validacao_durante_a_analise()
+    testar_validar_semantica_em_ast_montada()
+    testar_recuperacao_de_erros()
+    testar_parser_incremental()
+    testar_parser_incremental_preserva_programas_anteriores()
+    testar_cache_de_analise()
+    testar_cache_em_disco()
+    testar_ast_em_arena()
+    testar_parser_slr()
+    testar_automato_lr0()
+    testar_first_follow()
+    testar_tabelas_compiladas()
+    testar_tabelas_persistidas()
+    testar_tabelas_lalr()
+    testar_cadeias_unitarias()
+    testar_modos_de_rastro()
+    testar_tokens_na_forma_antiga()
+    testar_nos_na_forma_antiga()
@@ -1,5 +1,5 @@
 import os
-from lexer import Lexer
+from lexer import tokenizar_arquivo
 from parser import Parser
 
 def testar_arquivo_pi(nome_arquivo):
@@ -7,17 +7,13 @@ def testar_arquivo_pi(nome_arquivo):
     print(f"\n=== Testando arquivo: {nome_arquivo} ===")
     
     try:
-        # Lê o arquivo
-        with open(nome_arquivo, 'r', encoding='utf-8') as f:
-            codigo = f.read()
+        # Análise léxica direto do arquivo mapeado em memória
+        tokens, erros_lexicos = tokenizar_arquivo(nome_arquivo)
         
         print("Código fonte:")
-        print(codigo)
+        print(tokens.texto(0, len(tokens.fonte)))
         
-        # Análise léxica
         print("\nTokens gerados:")
-        lexer = Lexer(codigo)
-        tokens, erros_lexicos = lexer.tokenizar()
         
         if erros_lexicos:
             print("\nErros léxicos encontrados:")
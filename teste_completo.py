@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """Teste completo do compilador DRAMATICA"""
 
-from lexer import Lexer
+from lexer import Lexer, tokenizar_arquivo
 from parser import Parser, ErroSintatico
 from interpreter import InterpretadorPiLang
 
@@ -173,11 +173,7 @@ def teste_exemplo_simples():
     print("=" * 60)
     
     try:
-        with open("exemplos/exemplo_simples.dramatica", "r", encoding="utf-8") as f:
-            codigo = f.read()
-        
-        lexer = Lexer(codigo)
-        tokens, erros = lexer.tokenizar()
+        tokens, erros = tokenizar_arquivo("exemplos/exemplo_simples.dramatica")
         
         if erros:
             print(f"[ERRO] Erros lexicos: {erros}")
@@ -1,3 +1,8 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+
 class TipoToken:
     """Representa os tipos de tokens sem depender de Enum."""
 
@@ -53,14 +58,110 @@ class TipoToken:
     ERRO = "ERRO"
 
 
+class IndiceLinhas:
+    """Posições de início de cada linha de uma fonte, construído uma única vez.
+
+    Tokens e nós da AST guardam apenas a posição (deslocamento) na fonte; linha
+    e coluna são obtidas por busca binária aqui, só quando alguém as lê.
+    """
+
+    __slots__ = ('inicios',)
+
+    def __init__(self, fonte=''):
+        self.inicios = array('i', [0])
+        self.estender(fonte, 0)
+
+    def estender(self, texto, base):
+        """Registra as quebras de linha de um trecho que começa no início de uma
+        linha, na posição `base` da fonte (leitura em blocos)"""
+        partes = texto.split('\n')
+        # Cada linha completa ocupa len(parte) + 1 caracteres
+        inicios = accumulate(map((1).__add__, map(len, partes[:-1])), initial=base)
+        next(inicios)
+        self.inicios.extend(inicios)
+
+    def linha_coluna(self, posicao):
+        linha = bisect_right(self.inicios, posicao)
+        return linha, posicao - self.inicios[linha - 1] + 1
+
+
+class IndiceLinhasBytes(IndiceLinhas):
+    """IndiceLinhas de uma fonte em bytes UTF-8 (arquivo mapeado): as posições
+    são em bytes, mas a coluna é contada em caracteres, como na fonte decodificada."""
+
+    __slots__ = ('dados',)
+
+    def __init__(self, dados):
+        self.dados = dados
+        self.inicios = array('i', [0])
+        quebra = dados.find(b'\n')
+        while quebra >= 0:
+            self.inicios.append(quebra + 1)
+            quebra = dados.find(b'\n', quebra + 1)
+
+    def linha_coluna(self, posicao):
+        linha = bisect_right(self.inicios, posicao)
+        prefixo = self.dados[self.inicios[linha - 1]:posicao]
+        return linha, len(prefixo.decode('utf-8', 'surrogateescape')) + 1
+
+
+class _LinhaColuna:
+    """Mapa de linhas dos tokens criados na forma antiga, com linha e coluna e
+    sem a fonte: a posição guarda as duas como (linha << 32) | coluna, o que
+    mantém a ordem das posições e o deslocamento dentro da linha."""
+
+    __slots__ = ()
+
+    def linha_coluna(self, posicao):
+        return posicao >> 32, posicao & 0xFFFFFFFF
+
+
+_MAPA_LINHA_COLUNA = _LinhaColuna()
+
+
+def posicao_de_linha_coluna(linha, coluna):
+    """Posição de um token ou nó criado na forma antiga, com linha e coluna"""
+    return (linha << 32) | (coluna or 0)
+
+
+def linha_coluna_de_posicao(posicao):
+    """(linha, coluna) de uma posição criada com posicao_de_linha_coluna;
+    (None, None) para um deslocamento na fonte, que precisa do IndiceLinhas"""
+    if posicao is None or posicao < 1 << 32:
+        return None, None
+    return _MAPA_LINHA_COLUNA.linha_coluna(posicao)
+
+
 class Token:
-    """Estrutura simples de token."""
+    """Estrutura simples de token.
 
-    def __init__(self, tipo, lexema, linha, coluna):
+    Token(tipo, lexema, posicao, mapa_linhas) é a forma do lexer. A forma
+    antiga, Token(tipo, lexema, linha, coluna) ou com linha=/coluna= nomeados,
+    continua aceita: a posição passa a codificar a linha e a coluna."""
+
+    __slots__ = ('tipo', 'lexema', 'posicao', 'mapa_linhas', 'trivia')
+
+    def __init__(self, tipo, lexema, posicao=None, mapa_linhas=None, trivia=None, *, linha=None, coluna=None):
+        if type(mapa_linhas) is int or linha is not None:
+            # Forma antiga: Token(tipo, lexema, linha, coluna)
+            if linha is None:
+                linha, coluna = posicao, mapa_linhas
+            posicao, mapa_linhas = posicao_de_linha_coluna(linha, coluna), _MAPA_LINHA_COLUNA
         self.tipo = tipo
         self.lexema = lexema
-        self.linha = linha
-        self.coluna = coluna
+        # Deslocamento do lexema na fonte; linha e coluna vêm de mapa_linhas (IndiceLinhas)
+        self.posicao = posicao
+        self.mapa_linhas = mapa_linhas
+        # Comentários que precedem o token, como intervalos (inicio, fim) da fonte
+        self.trivia = trivia
+
+    @property
+    def linha(self):
+        return self.mapa_linhas.linha_coluna(self.posicao)[0]
+
+    @property
+    def coluna(self):
+        return self.mapa_linhas.linha_coluna(self.posicao)[1]
 
     def __str__(self):
         return f"Token({self.tipo}, '{self.lexema}', linha={self.linha}, coluna={self.coluna})"
@@ -88,3 +189,216 @@ PALAVRAS_RESERVADAS = {
     # Comandos
     'LEIA': TipoToken.LEIA
 }
+
+
+# Códigos numéricos pequenos para os tipos de token, na ordem de TipoToken
+TIPOS_POR_CODIGO = [valor for nome, valor in vars(TipoToken).items() if not nome.startswith('_')]
+CODIGO_DO_TIPO = {tipo: codigo for codigo, tipo in enumerate(TIPOS_POR_CODIGO)}
+
+
+class TokenView:
+    """Visão de um token armazenado em um TokenBuffer, com a interface de Token."""
+
+    __slots__ = ('buffer', 'indice', 'tipo')
+
+    def __init__(self, buffer, indice):
+        self.buffer = buffer
+        self.indice = indice
+        # O tipo é consultado várias vezes por token no Parser: resolvido uma vez
+        self.tipo = TIPOS_POR_CODIGO[buffer.tipos[indice]]
+
+    @property
+    def lexema(self):
+        return self.buffer.lexema(self.indice)
+
+    @property
+    def posicao(self):
+        return self.buffer.inicio(self.indice)
+
+    @property
+    def mapa_linhas(self):
+        return self.buffer.mapa_linhas
+
+    @property
+    def linha(self):
+        return self.buffer.linha(self.indice)
+
+    @property
+    def coluna(self):
+        return self.buffer.coluna(self.indice)
+
+    @property
+    def trivia(self):
+        return self.buffer.trivias.get(self.indice)
+
+    def __str__(self):
+        return f"Token({self.tipo}, '{self.lexema}', linha={self.linha}, coluna={self.coluna})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class TokenBuffer:
+    """Armazenamento colunar de tokens.
+
+    Cada token ocupa uma posição nos arrays `tipos` (código pequeno do tipo),
+    `inicios`/`fins` (deslocamentos do lexema na fonte) e `linhas`. O lexema e a
+    coluna são calculados a partir da fonte apenas quando solicitados. A trivia
+    (comentários) fica em um dicionário esparso indexado pela posição do token.
+    Lexemas inválidos não viram tokens: ficam nos arrays `erros_inicios`,
+    `erros_fins`, `erros_linhas` e `erros_quantidades` (caracteres inválidos
+    seguidos na mesma linha ocupam uma única entrada).
+    Indexar o buffer retorna um TokenView, compatível com Token.
+
+    Após uma edição (ver lexer.relexar), os tokens a partir de `_corte` ainda
+    guardam as posições antigas: `_delta` e `_delta_linhas` são somados na
+    leitura. Por isso as posições devem ser lidas por inicio(), fim() e linha().
+    """
+
+    __slots__ = ('fonte', 'tipos', 'inicios', 'fins', 'linhas', 'trivias', 'manter_comentarios',
+                 'erros_inicios', 'erros_fins', 'erros_linhas', 'erros_quantidades',
+                 '_corte', '_delta', '_delta_linhas', '_mapa_linhas')
+
+    def __init__(self, fonte, manter_comentarios=False):
+        self.fonte = fonte
+        self.tipos = array('B')
+        self.inicios = array('i')
+        self.fins = array('i')
+        self.linhas = array('i')
+        self.trivias = {}
+        self.erros_inicios = array('i')
+        self.erros_fins = array('i')
+        self.erros_linhas = array('i')
+        self.erros_quantidades = array('i')
+        self.manter_comentarios = manter_comentarios
+        self._corte = 0
+        self._delta = 0
+        self._delta_linhas = 0
+        self._mapa_linhas = None
+
+    @property
+    def mapa_linhas(self):
+        """IndiceLinhas da fonte, construído na primeira consulta"""
+        if self._mapa_linhas is None:
+            self._mapa_linhas = IndiceLinhas(self.fonte)
+        return self._mapa_linhas
+
+    def adicionar(self, tipo, inicio, fim, linha, trivia=None):
+        """Acrescenta um token; `tipo` é o nome em TipoToken"""
+        if trivia:
+            self.trivias[len(self.tipos)] = trivia
+        self.tipos.append(CODIGO_DO_TIPO[tipo])
+        self.inicios.append(inicio)
+        self.fins.append(fim)
+        self.linhas.append(linha)
+
+    def inicio(self, indice):
+        valor = self.inicios[indice]
+        return valor + self._delta if indice >= self._corte else valor
+
+    def fim(self, indice):
+        valor = self.fins[indice]
+        return valor + self._delta if indice >= self._corte else valor
+
+    def linha(self, indice):
+        valor = self.linhas[indice]
+        return valor + self._delta_linhas if indice >= self._corte else valor
+
+    def lexema(self, indice):
+        if indice >= self._corte:
+            return self.fonte[self.inicios[indice] + self._delta:self.fins[indice] + self._delta]
+        return self.fonte[self.inicios[indice]:self.fins[indice]]
+
+    def coluna(self, indice):
+        return self.coluna_em(self.inicio(indice))
+
+    def coluna_em(self, posicao):
+        return posicao - self.fonte.rfind('\n', 0, posicao)
+
+    def texto(self, inicio, fim):
+        """Trecho da fonte entre duas posições, como str"""
+        return self.fonte[inicio:fim]
+
+    def localizar(self, posicao, primeiro=0):
+        """Índice do primeiro token, a partir de `primeiro`, que começa em `posicao` ou depois"""
+        corte = self._corte
+        if primeiro < corte:
+            indice = bisect_left(self.inicios, posicao, primeiro, corte)
+            if indice < corte:
+                return indice
+            primeiro = corte
+        return bisect_left(self.inicios, posicao - self._delta, primeiro)
+
+    def substituir(self, inicio, fim, regiao, delta, delta_linhas):
+        """Troca os tokens [inicio, fim) pelos de `regiao` e desloca os seguintes.
+
+        O deslocamento dos tokens seguintes não é aplicado: só os tokens entre o
+        corte anterior e `fim` são ajustados, então edições próximas umas das
+        outras custam o tamanho da edição e não o tamanho do buffer.
+        """
+        self._mover_corte(fim)
+        self.tipos[inicio:fim] = regiao.tipos
+        self.inicios[inicio:fim] = regiao.inicios
+        self.fins[inicio:fim] = regiao.fins
+        self.linhas[inicio:fim] = regiao.linhas
+        self._corte = inicio + len(regiao.tipos)
+        self._delta += delta
+        self._delta_linhas += delta_linhas
+
+    def _mover_corte(self, indice):
+        corte = self._corte
+        if indice > corte:
+            trecho = slice(corte, indice)
+            delta, delta_linhas = self._delta, self._delta_linhas
+        else:
+            trecho = slice(indice, corte)
+            delta, delta_linhas = -self._delta, -self._delta_linhas
+        if delta:
+            self.inicios[trecho] = array('i', [v + delta for v in self.inicios[trecho]])
+            self.fins[trecho] = array('i', [v + delta for v in self.fins[trecho]])
+        if delta_linhas:
+            self.linhas[trecho] = array('i', [v + delta_linhas for v in self.linhas[trecho]])
+        self._corte = indice
+
+    def __len__(self):
+        return len(self.tipos)
+
+    def __getitem__(self, indice):
+        if indice < 0:
+            indice += len(self.tipos)
+        if not 0 <= indice < len(self.tipos):
+            raise IndexError("índice de token fora do buffer")
+        return TokenView(self, indice)
+
+    def __iter__(self):
+        for indice in range(len(self.tipos)):
+            yield TokenView(self, indice)
+
+
+class TokenBufferMapeado(TokenBuffer):
+    """TokenBuffer cuja fonte são os bytes UTF-8 de um arquivo mapeado em memória
+    (ver lexer.tokenizar_arquivo). Posições, intervalos de trivia e `posicao`
+    dos tokens são em bytes; lexemas são decodificados só quando pedidos e a
+    coluna é contada em caracteres. Não suporta relexar."""
+
+    __slots__ = ()
+
+    @property
+    def mapa_linhas(self):
+        if self._mapa_linhas is None:
+            self._mapa_linhas = IndiceLinhasBytes(self.fonte)
+        return self._mapa_linhas
+
+    def lexema(self, indice):
+        return self.texto(self.inicio(indice), self.fim(indice))
+
+    def coluna_em(self, posicao):
+        inicio_linha = self.fonte.rfind(b'\n', 0, posicao) + 1
+        return len(self.fonte[inicio_linha:posicao].decode('utf-8', 'surrogateescape')) + 1
+
+    def texto(self, inicio, fim):
+        return self.fonte[inicio:fim].decode('utf-8', 'replace')
+
+    def fechar(self):
+        """Libera o mapeamento do arquivo; o buffer deixa de ser utilizável"""
+        self.fonte.close()